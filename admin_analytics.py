@@ -0,0 +1,103 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics_rollup
+import history_archive
+import history_store
+
+# Statistiques de l'établissement (tous utilisateurs confondus) pour les administrateurs.
+# Les agrégats par utilisateur et globaux sont mis en cache dans la base ; une actualisation ne
+# rescanne, en parallèle, que les utilisateurs dont l'historique a changé depuis le dernier passage.
+
+# --- Constants ---
+MAX_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS admin_scans (
+    username TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+"""
+
+
+def _connection():
+    conn = history_store.get_connection()
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _scan_user(username):
+    # Exécuté dans un thread du pool : connexion SQLite propre au thread (lecteurs concurrents en mode WAL)
+    conn = history_store.get_connection()
+    generation = history_store.get_generation(username)
+    rows = analytics_rollup.scan_user_rows(conn, username) + history_archive.rollup_rows(username)
+    return username, generation, rows
+
+
+def stale_users():
+    """Utilisateurs dont la version d'historique diffère de celle du dernier scan."""
+    conn = _connection()
+    return [row[0] for row in conn.execute(
+        "SELECT g.username FROM generations g LEFT JOIN admin_scans s ON s.username = g.username "
+        "WHERE s.generation IS NULL OR s.generation != g.generation"
+    )]
+
+
+def refresh(max_workers=MAX_WORKERS, full=False):
+    """Rescanne en parallèle les utilisateurs modifiés (ou tous si `full`) et met à jour leurs agrégats.
+
+    Retourne {'scanned': nombre d'utilisateurs rescannés, 'seconds': durée}.
+    """
+    start = time.perf_counter()
+    conn = _connection()
+    # Les anciens fichiers `<username>_history.json` pas encore migrés sont importés (une seule fois)
+    for history_file in glob.glob("*_history.json"):
+        history_store.import_json_history(os.path.basename(history_file)[:-len("_history.json")], history_file)
+    users = [row[0] for row in conn.execute("SELECT username FROM generations")] if full else stale_users()
+    if users:
+        # Threads plutôt que processus : le scan est fait de lectures SQLite et de décompression gzip,
+        # qui libèrent le GIL, et un pool de processus relancerait la page Streamlit dans chaque worker
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(users))) as executor:
+            for username, generation, rows in executor.map(_scan_user, users):
+                analytics_rollup.replace_user_rows(conn, username, rows)
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO admin_scans (username, generation, scanned_at) VALUES (?, ?, ?)",
+                        (username, generation, time.time())
+                    )
+    return {"scanned": len(users), "seconds": time.perf_counter() - start}
+
+
+def global_summary():
+    """Agrégats globaux : total, par type, par maladie, par résultat et nombre d'utilisateurs actifs."""
+    conn = _connection()
+    scope = analytics_rollup.GLOBAL_SCOPE
+    return {
+        "total": analytics_rollup.get_total(conn, scope) or 0,
+        "users": len(analytics_rollup.get_counts(conn, scope, analytics_rollup.USER)),
+        "by_type": analytics_rollup.get_counts(conn, scope, analytics_rollup.TYPE),
+        "by_disease": analytics_rollup.get_counts(conn, scope, analytics_rollup.DISEASE),
+        "by_outcome": analytics_rollup.get_counts(conn, scope, analytics_rollup.OUTCOME),
+    }
+
+
+def user_summaries():
+    """Une ligne par utilisateur : total, nombre par type d'analyse et dernier jour d'activité."""
+    conn = _connection()
+    summaries = {}
+    for scope, dimension, key, count in conn.execute(
+        "SELECT scope, dimension, key, count FROM rollups "
+        "WHERE scope != ? AND dimension IN (?, ?, ?) AND count > 0",
+        (analytics_rollup.GLOBAL_SCOPE, analytics_rollup.TOTAL, analytics_rollup.TYPE, analytics_rollup.DAY)
+    ):
+        summary = summaries.setdefault(scope, {"username": scope, "total": 0, "last_day": ""})
+        if dimension == analytics_rollup.TOTAL:
+            summary["total"] = count
+        elif dimension == analytics_rollup.TYPE:
+            summary[key] = count
+        else:
+            summary["last_day"] = max(summary["last_day"], key)
+    return sorted(summaries.values(), key=lambda s: s["total"], reverse=True)
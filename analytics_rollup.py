@@ -0,0 +1,117 @@
+# Agrégats analytiques maintenus de façon incrémentale dans la base d'historique.
+# Chaque insertion met à jour, dans la même transaction, des compteurs par utilisateur
+# et globaux (portée GLOBAL_SCOPE) : par type, maladie prédite, résultat, jour et utilisateur.
+
+# --- Constants ---
+GLOBAL_SCOPE = "*"
+TOTAL = "total"
+TYPE = "type"
+DISEASE = "disease"
+OUTCOME = "outcome"
+DAY = "day"
+DAY_DISEASE = "day_disease"  # clé "AAAA-MM-JJ|maladie"
+USER = "user"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    scope TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, dimension, key)
+);
+"""
+
+RADIO_TYPE = "Analyse Radiographique"
+
+
+def _keys_for(entry_type, timestamp, predicted_class):
+    """Liste des (dimension, clé) incrémentés par une entrée."""
+    keys = [(TOTAL, ""), (TYPE, entry_type), (DAY, timestamp[:10])]
+    if entry_type == RADIO_TYPE:
+        keys.append((DISEASE, predicted_class or "Inconnu"))
+        keys.append((DAY_DISEASE, f"{timestamp[:10]}|{predicted_class or 'Inconnu'}"))
+    elif predicted_class:
+        keys.append((OUTCOME, predicted_class))
+    return keys
+
+
+def _add(conn, scope, dimension, key, delta):
+    conn.execute(
+        "INSERT INTO rollups (scope, dimension, key, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(scope, dimension, key) DO UPDATE SET count = count + excluded.count",
+        (scope, dimension, key, delta)
+    )
+
+
+def record(conn, username, rows):
+    """Ajoute des entrées (type, timestamp ISO, classe prédite) aux agrégats. À appeler dans la transaction d'insertion."""
+    for entry_type, timestamp, predicted_class in rows:
+        for dimension, key in _keys_for(entry_type, timestamp, predicted_class):
+            _add(conn, username, dimension, key, 1)
+            _add(conn, GLOBAL_SCOPE, dimension, key, 1)
+        _add(conn, GLOBAL_SCOPE, USER, username, 1)
+
+
+def forget(conn, username):
+    """Retire tous les compteurs d'un utilisateur, y compris sa contribution aux agrégats globaux."""
+    user_rows = conn.execute(
+        "SELECT dimension, key, count FROM rollups WHERE scope = ?", (username,)
+    ).fetchall()
+    for dimension, key, count in user_rows:
+        _add(conn, GLOBAL_SCOPE, dimension, key, -count)
+    conn.execute("DELETE FROM rollups WHERE scope = ?", (username,))
+    conn.execute("DELETE FROM rollups WHERE scope = ? AND dimension = ? AND key = ?",
+                 (GLOBAL_SCOPE, USER, username))
+    conn.execute("DELETE FROM rollups WHERE scope = ? AND count <= 0", (GLOBAL_SCOPE,))
+
+
+def replace_user_rows(conn, username, rows):
+    """Remplace les compteurs d'un utilisateur par des lignes (type, jour, classe prédite, nombre) précalculées."""
+    with conn:
+        forget(conn, username)
+        for entry_type, day, predicted_class, count in rows:
+            for dimension, key in _keys_for(entry_type, day, predicted_class):
+                _add(conn, username, dimension, key, count)
+                _add(conn, GLOBAL_SCOPE, dimension, key, count)
+            _add(conn, GLOBAL_SCOPE, USER, username, count)
+
+
+def scan_user_rows(conn, username):
+    """Lignes (type, jour, classe prédite, nombre) calculées directement sur la table d'historique."""
+    return [tuple(row) for row in conn.execute(
+        "SELECT type, substr(timestamp, 1, 10), predicted_class, COUNT(*) FROM history "
+        "WHERE username = ? GROUP BY 1, 2, 3",
+        (username,)
+    )]
+
+
+def rebuild(conn, username, archived_rows=()):
+    """Recalcule entièrement les compteurs d'un utilisateur à partir de la table d'historique.
+
+    `archived_rows` : lignes (type, jour, classe prédite, nombre) des entrées déjà archivées.
+    """
+    replace_user_rows(conn, username, scan_user_rows(conn, username) + list(archived_rows))
+
+
+def get_counts(conn, scope, dimension):
+    """Retourne {clé: nombre} pour une dimension, en une lecture indexée."""
+    rows = conn.execute(
+        "SELECT key, count FROM rollups WHERE scope = ? AND dimension = ? AND count > 0",
+        (scope, dimension)
+    ).fetchall()
+    return {key: count for key, count in rows}
+
+
+def get_total(conn, scope):
+    """Nombre total d'analyses agrégées pour une portée, ou None si aucun agrégat n'existe."""
+    row = conn.execute(
+        "SELECT count FROM rollups WHERE scope = ? AND dimension = ? AND key = ''", (scope, TOTAL)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def is_consistent(conn, username, archived_count=0):
+    """Vérifie que le total agrégé correspond au nombre réel d'entrées (en base et archivées) de l'utilisateur."""
+    actual = conn.execute("SELECT COUNT(*) FROM history WHERE username = ?", (username,)).fetchone()[0] + archived_count
+    return (get_total(conn, username) or 0) == actual
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+import analytics_rollup
+import history_archive
+import history_store
+
+# Séries temporelles du tableau de bord, calculées côté serveur avec pandas/NumPy puis
+# ramenées à un nombre fixe de points : la taille envoyée au navigateur ne dépend pas de l'historique.
+
+# --- Constants ---
+MAX_POINTS = 200
+CONFIDENCE_BINS = history_archive.PROBABILITY_BINS  # les histogrammes archivés ont cette résolution
+HEART_ROLLING_DAYS = 7
+
+
+def downsample(frame, max_points=MAX_POINTS, date_column='date', group_column=None, how='sum'):
+    """Regroupe les dates en au plus `max_points` intervalles égaux (par groupe si `group_column`).
+
+    Chaque intervalle est représenté par sa date de début ; les valeurs sont sommées ou moyennées.
+    """
+    if frame.empty:
+        return frame
+    dates = frame[date_column]
+    span = (dates.max() - dates.min()).total_seconds()
+    if dates.nunique() <= max_points or span == 0:
+        return frame
+    # Indice d'intervalle vectorisé à partir des secondes écoulées depuis la première date
+    elapsed = (dates - dates.min()).dt.total_seconds().to_numpy()
+    bucket = np.minimum((elapsed / span * max_points).astype(int), max_points - 1)
+    bucket_starts = dates.min() + pd.to_timedelta(bucket * span / max_points, unit='s')
+    keys = [bucket_starts.rename(date_column)]
+    if group_column:
+        keys.append(frame[group_column])
+    value_columns = [c for c in frame.columns if c not in (date_column, group_column)]
+    return frame[value_columns].groupby(keys).agg(how).reset_index()
+
+
+def daily_counts_by_disease(conn, username, max_points=MAX_POINTS):
+    """Nombre d'analyses radiographiques par jour et par maladie, lu dans les agrégats."""
+    counts = analytics_rollup.get_counts(conn, username, analytics_rollup.DAY_DISEASE)
+    if not counts:
+        return pd.DataFrame(columns=['date', 'disease', 'count'])
+    keys = pd.Series(list(counts.keys())).str.split('|', n=1, expand=True)
+    frame = pd.DataFrame({
+        'date': pd.to_datetime(keys[0]),
+        'disease': keys[1],
+        'count': list(counts.values()),
+    }).sort_values('date')
+    return downsample(frame, max_points, group_column='disease', how='sum')
+
+
+def _probability_frame(username, entry_type):
+    # Niveau chaud seulement : les entrées archivées sont lues via leurs résumés dans le manifeste
+    rows = history_store.query_probabilities(username, entry_type)
+    if not rows:
+        return pd.DataFrame(columns=['timestamp', 'probability'])
+    timestamps, probabilities = zip(*rows)
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(pd.Series(timestamps), format='ISO8601'),
+        'probability': np.asarray(probabilities, dtype=float),
+    })
+
+
+def heart_risk_trend(username, window_days=HEART_ROLLING_DAYS, max_points=MAX_POINTS):
+    """Probabilité moyenne quotidienne de maladie cardiaque et sa moyenne mobile sur `window_days` jours."""
+    frame = _probability_frame(username, history_store.TYPE_HEART)
+    parts = []
+    if not frame.empty:
+        parts.append(frame.set_index('timestamp')['probability'].resample('D').agg(['sum', 'count']))
+    archived_days, _ = history_archive.probability_summary(username, history_store.TYPE_HEART)
+    if archived_days:
+        parts.append(pd.DataFrame(
+            list(archived_days.values()), columns=['sum', 'count'], index=pd.to_datetime(list(archived_days.keys()))
+        ))
+    if not parts:
+        return pd.DataFrame(columns=['date', 'daily_mean', 'rolling_mean'])
+    grouped = pd.concat(parts).groupby(level=0).sum()
+    grouped = grouped[grouped['count'] > 0]
+    # Jours sans prédiction : NaN, ignorés par la moyenne mobile
+    daily = (grouped['sum'] / grouped['count']).asfreq('D')
+    trend = pd.DataFrame({
+        'daily_mean': daily,
+        'rolling_mean': daily.rolling(f"{window_days}D", min_periods=1).mean(),
+    }).dropna(subset=['rolling_mean']).rename_axis('date').reset_index()
+    return downsample(trend, max_points, how='mean')
+
+
+def confidence_distribution(username):
+    """Histogramme de la confiance des prédictions (radiographie et cardiaque), CONFIDENCE_BINS classes sur [0, 1].
+
+    Confiance : probabilité de la classe prédite, soit max(p, 1 - p) pour la prédiction cardiaque
+    (qui stocke la probabilité de maladie).
+    """
+    edges = np.linspace(0.0, 1.0, CONFIDENCE_BINS + 1)
+    frames = []
+    for entry_type in (history_store.TYPE_RADIO, history_store.TYPE_HEART):
+        probabilities = _probability_frame(username, entry_type)['probability'].to_numpy()
+        counts, _ = np.histogram(history_archive.prediction_confidence(entry_type, probabilities), bins=edges)
+        _, archived_counts = history_archive.probability_summary(username, entry_type)
+        counts = counts + np.asarray(archived_counts)
+        if counts.sum() == 0:
+            continue
+        frames.append(pd.DataFrame({'type': entry_type, 'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts}))
+    if not frames:
+        return pd.DataFrame(columns=['type', 'bin_start', 'bin_end', 'count'])
+    return pd.concat(frames, ignore_index=True)
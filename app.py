@@ -1,9 +1,19 @@
 import streamlit as st
 import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
-from history_manager import load_history, save_history
+from app_shell import RerunTimer, load_css, load_config, show_image, timing_stats
+import credential_store
+import metrics
+from history_manager import load_history, save_history, flush_history, on_logout
 from locales import TEXTS
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# Mesure du coût de la coquille (CSS, config, authentification, barre latérale) séparément de la page
+rerun_timer = RerunTimer()
+# Point d'accès Prometheus GET /metrics (démarré une seule fois par processus)
+metrics.start_http_server()
 
 # --- PAGE CONFIG (doit être la première commande st) ---
 st.set_page_config(
@@ -12,9 +22,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- Inject custom CSS ---
-with open('style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# --- Inject custom CSS (mis en cache, relu seulement si style.css change) ---
+st.markdown(f'<style>{load_css()}</style>', unsafe_allow_html=True)
 
 # Initialisation de l'état de la session (doit être au début du script principal)
 if 'lang' not in st.session_state:
@@ -33,16 +42,24 @@ def get_text_unauthenticated(key):
     return TEXTS[lang][key]
 T_unauthenticated = get_text_unauthenticated
 
-# --- AUTHENTICATION ---
-with open('config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
+def is_admin():
+    """Vrai si l'utilisateur connecté a le rôle 'admin' (champ `roles` du compte, voir credential_store.py)."""
+    return 'admin' in (st.session_state.get('roles') or [])
 
-authenticator = stauth.Authenticate(
-    config['credentials'],
+# --- AUTHENTICATION ---
+# config.yaml analysé une seule fois par version du fichier ; l'authentificateur est reconstruit
+# à chaque rerun car son gestionnaire de cookies est un composant qui doit être rendu à chaque fois
+config = load_config()
+
+# Les comptes sont dans credentials.db (lus à la demande, une ligne écrite par modification) ;
+# les utilisateurs encore présents seulement dans config.yaml y sont importés
+credential_store.import_config_users()
+authenticator = credential_store.attach(stauth.Authenticate(
+    {'usernames': {}},
     config['cookie']['name'],
     config['cookie']['key'],
     config['cookie']['expiry_days']
-)
+))
 
 # Check if user is already logged in
 if st.session_state.get("authentication_status"):
@@ -60,17 +77,30 @@ if st.session_state.get("authentication_status"):
     # Charger l'historique une fois l'utilisateur authentifié
     if not st.session_state['history']: # Charger seulement si l'historique est vide ou n'a pas été chargé pour cet user
         st.session_state['history'] = load_history()
+        if st.session_state.pop('history_flush_failed', False):
+            st.warning(T("history_flush_warning"))
 
     # Sidebar
     st.sidebar.title(f"{T('sidebar_welcome')} {name}")
-    authenticator.logout(T('sidebar_logout'), 'sidebar')
+    # Les sauvegardes en attente sont écrites et les exports temporaires supprimés avant la déconnexion
+    authenticator.logout(T('sidebar_logout'), 'sidebar', callback=lambda _: on_logout())
     st.sidebar.markdown("---")
     st.sidebar.title(T("sidebar_title"))
     st.sidebar.markdown(T("sidebar_intro"))
     st.sidebar.info(T("sidebar_warning"))
+    if is_admin():
+        shell_stats = timing_stats()
+        if "shell" in shell_stats:
+            st.sidebar.caption(T("shell_timing_stats").format(
+                shell_ms=shell_stats["shell"]["mean_ms"],
+                shell_p95_ms=shell_stats["shell"]["p95_ms"],
+                page_ms=shell_stats.get("page", {}).get("mean_ms", 0.0),
+                count=shell_stats["shell"]["count"]
+            ))
+    rerun_timer.lap("shell")
 
     # Main page - Enhanced Welcome Layout
-    st.image('im_1.jpeg', width=500)
+    show_image('im_1.jpeg', width=500)
     st.markdown(f'<div class="main-welcome-section"><h1>{T("welcome_title")}</h1><p>{T("welcome_message")}</p></div>', unsafe_allow_html=True)
 
     st.markdown("---")
@@ -80,7 +110,7 @@ if st.session_state.get("authentication_status"):
     # Feature 1: Radiography Analysis
     col_img1, col_desc1 = st.columns([0.3, 0.7])
     with col_img1:
-        st.image('im_2.jpeg', width=150)
+        show_image('im_2.jpeg', width=150)
     with col_desc1:
         st.subheader(f"🩻 {T('welcome_feature_radio_title')}")
         st.markdown(T('welcome_feature_radio_desc'))
@@ -92,7 +122,7 @@ if st.session_state.get("authentication_status"):
         st.subheader(f"📝 {T('welcome_feature_symptom_title')}")
         st.markdown(T('welcome_feature_symptom_desc'))
     with col_img2:
-        st.image('img_2.jpg', width=150)
+        show_image('img_2.jpg', width=150)
     st.markdown("---")
 
     # Feature 3: History Tracking & Reports
@@ -112,9 +142,12 @@ if st.session_state.get("authentication_status"):
         st.subheader(T('welcome_feature_xai_title'))
         st.markdown(T('welcome_feature_xai_desc'))
     st.markdown("---")
+    rerun_timer.lap("page")
 
 
 else:
+    rerun_timer.lap("shell")
+
     # --- LANGUAGE SELECTION (for login/register screen) ---
     st.sidebar.selectbox(T_unauthenticated("language_select_label"), options=['fr', 'en'], key='lang_unauthenticated')
 
@@ -134,6 +167,7 @@ else:
         login_result = authenticator.login('main')
         if login_result:
             name, authentication_status, username = login_result
+            metrics.inc("login_attempts_total", result={True: "success", False: "failure"}.get(authentication_status, "pending"))
             if authentication_status == False:
                 st.error(T_unauthenticated('login_error'))
             elif authentication_status == None:
@@ -147,10 +181,7 @@ else:
             email_of_registered_user, username_of_registered_user, name_of_registered_user = authenticator.register_user('main', password_hint=False)
             if email_of_registered_user:
                 st.success(T_unauthenticated('register_success_message'))
-                # Save the updated config
-                with open('config.yaml', 'w') as file:
-                    yaml.dump(config, file, default_flow_style=False)
-                
+
                 # Automatically log in the user
                 st.session_state["authentication_status"] = True
                 st.session_state["name"] = name_of_registered_user
@@ -168,9 +199,6 @@ else:
             if username_of_forgotten_password:
                 st.success(T_unauthenticated('forgot_password_success_message'))
                 st.info(f"{T_unauthenticated('forgot_password_new_password_message')} **{random_password}**")
-                # Save the updated config
-                with open('config.yaml', 'w') as file:
-                    yaml.dump(config, file, default_flow_style=False)
             elif not username_of_forgotten_password:
                 st.error(T_unauthenticated('forgot_password_error'))
         except Exception as e:
@@ -181,8 +209,5 @@ if st.session_state.get("authentication_status"):
     try:
         if authenticator.reset_password(st.session_state["username"], 'sidebar'):
             st.sidebar.success(T('reset_password_success'))
-            # Save the updated config
-            with open('config.yaml', 'w') as file:
-                yaml.dump(config, file, default_flow_style=False)
     except Exception as e:
         st.sidebar.error(e)
\ No newline at end of file
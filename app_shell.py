@@ -0,0 +1,160 @@
+import copy
+import functools
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+import streamlit as st
+import yaml
+from yaml.loader import SafeLoader
+from PIL import Image
+
+import metrics
+
+# Ressources de la coquille de l'application (CSS, config.yaml, images d'accueil) mises en cache
+# pour tout le processus et invalidées sur la date de modification du fichier, plus la mesure
+# du coût de la coquille à chaque rerun (séparé du travail propre à la page).
+
+# --- Constants ---
+CONFIG_PATH = 'config.yaml'
+CSS_PATH = 'style.css'
+STATIC_DIR = 'static'
+STATIC_URL = 'app/static'
+IMAGE_SCALE = 2  # images pré-réduites à 2x la largeur affichée (écrans haute densité)
+IMAGE_QUALITY = 85
+TIMING_WINDOW = 200  # nombre de reruns conservés pour les statistiques
+
+_file_cache = {}  # chemin -> ((mtime_ns, taille), valeur analysée)
+_file_cache_lock = threading.Lock()
+_timings = {}  # phase -> deque des durées (secondes)
+_timings_lock = threading.Lock()
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_cached(path, parse):
+    version = _file_version(path)
+    with _file_cache_lock:
+        cached = _file_cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+    with open(path, encoding='utf-8') as f:
+        value = parse(f)
+    with _file_cache_lock:
+        _file_cache[path] = (version, value)
+    return value
+
+
+def load_css(path=CSS_PATH):
+    """Contenu de la feuille de style, relu seulement si le fichier a changé."""
+    return _read_cached(path, lambda f: f.read())
+
+
+def load_config(path=CONFIG_PATH):
+    """config.yaml analysé, relu seulement si le fichier a changé.
+
+    Retourne une copie : la version en cache reste celle du fichier et n'est pas partagée entre sessions.
+    """
+    return copy.deepcopy(_read_cached(path, lambda f: yaml.load(f, Loader=SafeLoader)))
+
+
+def _resized_image_path(source, width):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(STATIC_DIR, f"{stem}_{width}w.jpg")
+
+
+def prepare_static_image(source, width):
+    """Crée (une fois) une copie JPEG de `source` réduite pour un affichage à `width` pixels."""
+    target = _resized_image_path(source, width)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return target
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    # Écriture atomique : une autre session ou un autre processus peut servir le fichier pendant ce temps
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with Image.open(source) as image:
+        if image.format == 'JPEG' and image.width <= width * IMAGE_SCALE:
+            # Déjà assez petite : recompresser ne ferait que grossir le fichier
+            shutil.copyfile(source, tmp_path)
+        else:
+            image = image.convert('RGB')
+            image.thumbnail((width * IMAGE_SCALE, width * IMAGE_SCALE * 4))
+            image.save(tmp_path, format='JPEG', quality=IMAGE_QUALITY, optimize=True)
+    os.replace(tmp_path, target)
+    return target
+
+
+def show_image(source, width):
+    """Affiche une image statique pré-réduite.
+
+    Avec `server.enableStaticServing`, le navigateur la charge directement depuis /app/static
+    (mise en cache HTTP, rien ne transite par la session) ; sinon repli sur st.image avec la copie réduite.
+    """
+    path = prepare_static_image(source, width)
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<img src="{STATIC_URL}/{os.path.basename(path)}" width="{width}">', unsafe_allow_html=True)
+    else:
+        st.image(path, width=width)
+
+
+def record_timing(phase, seconds):
+    """Enregistre la durée d'une phase du rerun ('shell', 'page', ...)."""
+    with _timings_lock:
+        _timings.setdefault(phase, deque(maxlen=TIMING_WINDOW)).append(seconds)
+
+
+def timing_stats():
+    """Par phase : nombre de reruns mesurés, durée moyenne et 95e centile (millisecondes)."""
+    with _timings_lock:
+        samples = {phase: sorted(values) for phase, values in _timings.items() if values}
+    return {
+        phase: {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+        }
+        for phase, values in samples.items()
+    }
+
+
+def reset_timings():
+    """Oublie les durées mesurées (load_test.py --interactions : une mesure par interaction)."""
+    with _timings_lock:
+        _timings.clear()
+
+
+class RerunTimer:
+    """Mesure un rerun en phases successives : `lap('shell')` puis `lap('page')`."""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        record_timing(phase, now - self._last)
+        metrics.observe("rerun_phase_seconds", now - self._last, phase=phase)
+        self._last = now
+
+
+def timed_fragment(name):
+    """`st.fragment` dont chaque exécution est mesurée sous la phase 'fragment:<name>'.
+
+    Une interaction dans le fragment ne relance que lui : sa durée se compare à celle du rerun
+    complet de la page ('page:<nom>'), mesurée par RerunTimer.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                record_timing(f"fragment:{name}", seconds)
+                metrics.observe("rerun_phase_seconds", seconds, phase=f"fragment:{name}")
+        return st.fragment(wrapper)
+    return decorator
@@ -0,0 +1,294 @@
+import argparse
+import getpass
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import yaml
+from yaml.loader import SafeLoader
+from streamlit_authenticator.models import authentication_model
+from streamlit_authenticator.utilities import Hasher
+
+import metrics
+
+# Identifiants des utilisateurs dans SQLite (une ligne par utilisateur) au lieu de config.yaml :
+# chaque inscription / réinitialisation ne modifie qu'une ligne, sans réécrire ni relire tous les comptes.
+# config.yaml ne garde que la configuration du cookie ; ses utilisateurs sont importés dans la base.
+# Usage (remplace temp_hash_generator.py) :
+#   python credential_store.py migrate
+#   python credential_store.py add-user <username> --email <email> --name "<nom>" [--role admin]
+#   python credential_store.py set-password <username>
+
+# --- Constants ---
+DB_PATH = "credentials.db"
+CONFIG_PATH = "config.yaml"
+BCRYPT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+COLUMN_FIELDS = ('email', 'password')  # champs stockés en colonnes, les autres dans `data` (JSON)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    password TEXT,
+    data TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+# bcrypt est volontairement lent : un pool borné évite qu'une rafale de connexions occupe tous les cœurs
+_hash_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+
+def get_connection():
+    """Retourne la connexion SQLite du thread courant."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+# --- Password hashing ---
+def hash_password(password):
+    """Hache un mot de passe avec bcrypt dans le pool dédié."""
+    with metrics.track("password_hash"):
+        return _hash_pool.submit(lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()).result()
+
+
+def check_password(password, hashed_password):
+    """Vérifie un mot de passe contre son hachage bcrypt dans le pool dédié."""
+    with metrics.track("password_check"):
+        return _hash_pool.submit(bcrypt.checkpw, password.encode(), hashed_password.encode()).result()
+
+
+class PooledHasher(Hasher):
+    """Hasher de streamlit_authenticator dont les opérations bcrypt passent par le pool borné."""
+
+    @classmethod
+    def check_pw(cls, password, hashed_password):
+        return check_password(password, hashed_password)
+
+    @classmethod
+    def hash(cls, password):
+        return hash_password(password)
+
+
+# streamlit_authenticator (0.4.2, version figée dans requirements.txt) appelle Hasher depuis ce module
+authentication_model.Hasher = PooledHasher
+
+
+# --- Row helpers ---
+def normalize_username(username):
+    """Clé d'un compte : minuscules, sans espaces autour (comme streamlit_authenticator)."""
+    return username.lower().strip()
+
+
+def _row_to_fields(row):
+    fields = json.loads(row['data'])
+    fields['email'] = row['email']
+    fields['password'] = row['password']
+    return fields
+
+
+def _set_field(username, key, value):
+    conn = get_connection()
+    with conn:
+        if key in COLUMN_FIELDS:
+            conn.execute(f"UPDATE users SET {key} = ? WHERE username = ?", (value, username))
+        else:
+            # Mise à jour d'un seul champ JSON, atomique côté SQLite
+            conn.execute(
+                "UPDATE users SET data = json_set(data, ?, json(?)) WHERE username = ?",
+                (f'$."{key}"', json.dumps(value), username)
+            )
+
+
+def _delete_field(username, key):
+    conn = get_connection()
+    with conn:
+        if key in COLUMN_FIELDS:
+            conn.execute(f"UPDATE users SET {key} = NULL WHERE username = ?", (username,))
+        else:
+            conn.execute("UPDATE users SET data = json_remove(data, ?) WHERE username = ?", (f'$."{key}"', username))
+
+
+def save_user(conn, username, fields, replace=True):
+    """Insère (ou remplace) un utilisateur ; les mots de passe en clair sont hachés."""
+    fields = dict(fields)
+    password = fields.pop('password', None)
+    if password and not Hasher.is_hash(password):
+        password = hash_password(password)
+    email = fields.pop('email', None)
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    cursor = conn.execute(
+        f"{verb} INTO users (username, email, password, data) VALUES (?, ?, ?, ?)",
+        (normalize_username(username), email, password, json.dumps(fields))
+    )
+    return cursor.rowcount
+
+
+class UserRecord(MutableMapping):
+    """Un utilisateur ; chaque modification est écrite immédiatement dans sa ligne."""
+
+    def __init__(self, username, fields):
+        self.username = username
+        self._fields = fields
+
+    def __getitem__(self, key):
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        _set_field(self.username, key, value)
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        del self._fields[key]
+        _delete_field(self.username, key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+
+class UserDirectory(MutableMapping):
+    """`credentials['usernames']` de streamlit_authenticator, lu à la demande dans la base."""
+
+    def __getitem__(self, username):
+        key = normalize_username(username)
+        row = get_connection().execute(
+            "SELECT email, password, data FROM users WHERE username = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return UserRecord(key, _row_to_fields(row))
+
+    def __setitem__(self, username, fields):
+        conn = get_connection()
+        with conn:
+            save_user(conn, username, fields)
+
+    def __delitem__(self, username):
+        conn = get_connection()
+        with conn:
+            if conn.execute("DELETE FROM users WHERE username = ?", (normalize_username(username),)).rowcount == 0:
+                raise KeyError(username)
+
+    def __contains__(self, username):
+        return get_connection().execute(
+            "SELECT 1 FROM users WHERE username = ?", (normalize_username(username),)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in get_connection().execute("SELECT username FROM users ORDER BY username"))
+
+    def __len__(self):
+        return get_connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def contains_value(self, value):
+        """Nom d'utilisateur ou e-mail déjà pris (requête indexée au lieu d'un parcours de tous les comptes)."""
+        return get_connection().execute(
+            "SELECT 1 FROM users WHERE username = ? OR email = ? LIMIT 1", (normalize_username(value), value)
+        ).fetchone() is not None
+
+
+def attach(authenticator):
+    """Branche la base d'identifiants sur un `stauth.Authenticate` créé avec des identifiants vides."""
+    model = authenticator.authentication_controller.authentication_model
+    users = UserDirectory()
+    model.credentials['usernames'] = users
+    model._credentials_contains_value = users.contains_value
+    return authenticator
+
+
+# --- Migration from config.yaml ---
+def import_config_users(config_path=CONFIG_PATH):
+    """Importe les utilisateurs de config.yaml absents de la base.
+
+    Relancé seulement quand le fichier change : un compte ajouté à la main dans config.yaml
+    (ancienne procédure) est donc toujours repris, mais la base fait foi pour les comptes existants.
+    Retourne le nombre d'utilisateurs importés.
+    """
+    if not os.path.exists(config_path):
+        return 0
+    stat = os.stat(config_path)
+    version = f"{stat.st_mtime_ns}:{stat.st_size}"
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'config_import_version'").fetchone()
+    if row and row['value'] == version:
+        return 0
+    with open(config_path) as file:
+        config = yaml.load(file, Loader=SafeLoader) or {}
+    users = (config.get('credentials') or {}).get('usernames') or {}
+    imported = 0
+    with conn:
+        for username, fields in users.items():
+            imported += save_user(conn, username, fields or {}, replace=False)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('config_import_version', ?)", (version,)
+        )
+    return imported
+
+
+# --- CLI ---
+def _prompt_password():
+    password = getpass.getpass("Mot de passe : ")
+    if password != getpass.getpass("Confirmation : "):
+        raise SystemExit("Les mots de passe ne correspondent pas.")
+    return password
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gestion des identifiants des utilisateurs (credentials.db).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Importer les utilisateurs de config.yaml")
+    migrate_parser.add_argument("--config", default=CONFIG_PATH)
+
+    add_parser = subparsers.add_parser("add-user", help="Créer ou remplacer un utilisateur")
+    add_parser.add_argument("username")
+    add_parser.add_argument("--email", required=True)
+    add_parser.add_argument("--name", required=True)
+    add_parser.add_argument("--role", action="append", dest="roles", help="Rôle (répétable), ex. admin")
+
+    password_parser = subparsers.add_parser("set-password", help="Changer le mot de passe d'un utilisateur")
+    password_parser.add_argument("username")
+
+    subparsers.add_parser("list", help="Lister les utilisateurs")
+
+    args = parser.parse_args(argv)
+    users = UserDirectory()
+    if args.command == "migrate":
+        print(f"{import_config_users(args.config)} utilisateur(s) importé(s) depuis {args.config}")
+    elif args.command == "add-user":
+        users[args.username] = {
+            'email': args.email, 'name': args.name, 'roles': args.roles,
+            'logged_in': False, 'password': hash_password(_prompt_password()),
+        }
+        print(f"Utilisateur {normalize_username(args.username)} enregistré.")
+    elif args.command == "set-password":
+        if args.username not in users:
+            raise SystemExit(f"Utilisateur inconnu : {args.username}")
+        users[args.username]['password'] = hash_password(_prompt_password())
+        print("Mot de passe mis à jour.")
+    else:
+        for username in users:
+            user = users[username]
+            print(f"{username}\t{user.get('email') or ''}\t{','.join(user.get('roles') or [])}")
+
+
+if __name__ == "__main__":
+    main()
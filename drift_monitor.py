@@ -0,0 +1,459 @@
+import argparse
+import bisect
+import datetime
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import history_store
+import metrics
+
+# Surveillance de la dérive des entrées et des prédictions.
+# Chaque prédiction met à jour, dans une transaction par lot, des esquisses de taille constante rangées
+# par jour dans la table `drift_counts` de history.db :
+#   - caractéristiques numériques : histogramme sur la grille des quantiles (5 %, 10 %, ..., 95 %)
+#     du jeu d'entraînement, d'où les quantiles courants et la fonction de répartition ;
+#   - caractéristiques catégorielles et classes radiographiques : table de comptes ;
+#   - probabilité de maladie cardiaque : histogramme à PROBABILITY_BINS classes sur [0, 1].
+# Le profil de référence est calculé au déploiement depuis heart_disease_uci.csv, avec le modèle chargé
+# (`python drift_monitor.py reference`, écrit dans REFERENCE_PATH) ; tant qu'il n'existe pas, les
+# prédictions cardiaques ne sont pas comptées : il n'est jamais calculé sur le chemin d'une requête.
+# Le rapport compare la fenêtre courante à la référence (PSI, et KS pour les grandeurs ordonnées)
+# sans jamais relire l'historique ; sans référence (classes radiographiques, probabilités si le modèle
+# n'était pas disponible lors du calcul du profil), la fenêtre précédente de même durée sert de base.
+# Les comptes sont anonymes : ils ne sont pas retirés quand un utilisateur efface son historique.
+# Usage : python drift_monitor.py reference | report --days 30
+
+# --- Constants ---
+ENABLED = os.environ.get("MEDAPP_DRIFT", "1") != "0"
+REFERENCE_CSV = "heart_disease_uci.csv"
+REFERENCE_PATH = "drift_reference.json"
+NUMERIC_FEATURES = ['age', 'trestbps', 'chol', 'thalch', 'oldpeak', 'ca']  # comme model_trainer.py
+CATEGORICAL_FEATURES = ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'thal']
+ZERO_AS_MISSING = ['trestbps', 'chol']  # 0 code une mesure absente dans heart_disease_uci.csv
+QUANTILE_LEVELS = [i / 20 for i in range(1, 20)]
+PROBABILITY_BINS = 10
+HEART_PROBABILITY = "heart_probability"
+RADIO_CLASS = "radio_class"
+WINDOW_DAYS = int(os.environ.get("MEDAPP_DRIFT_WINDOW_DAYS", "30"))
+RETENTION_DAYS = 2 * WINDOW_DAYS  # fenêtre courante + fenêtre précédente
+MIN_SAMPLES = 30
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+PSI_EPSILON = 1e-4  # proportion plancher : une classe vide ne rend pas le PSI infini
+KS_ALPHA_FACTOR = 1.36  # valeur critique de KS à 5 % : 1.36 * sqrt((n + m) / (n * m))
+
+STATUS_STABLE = "stable"
+STATUS_MODERATE = "moderate"
+STATUS_SIGNIFICANT = "significant"
+STATUS_INSUFFICIENT = "insufficient"
+BASELINE_REFERENCE = "reference"
+BASELINE_PREVIOUS = "previous"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drift_counts (
+    day TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    bin TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, sketch, reference, bin)
+);
+"""
+
+_local = threading.local()
+_reference_lock = threading.Lock()
+_reference = {"mtime": None, "profile": None}
+_pruned_day = {"day": None}
+
+
+def get_connection():
+    """Connexion à history.db du thread courant, avec la table des esquisses."""
+    conn = history_store.get_connection()
+    if getattr(_local, "conn", None) is not conn:
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+# --- Binning ---
+def probability_edges():
+    return [i / PROBABILITY_BINS for i in range(1, PROBABILITY_BINS)]
+
+
+def bin_index(edges, value):
+    """Classe d'une valeur : 0 pour value <= edges[0], len(edges) au-delà du dernier bord."""
+    return bisect.bisect_left(edges, value)
+
+
+def bin_labels(edges):
+    """Libellés lisibles des len(edges) + 1 classes d'une grille."""
+    if not edges:
+        return ["*"]
+    labels = [f"≤ {edges[0]:g}"]
+    labels += [f"{low:g} – {high:g}" for low, high in zip(edges, edges[1:])]
+    labels.append(f"> {edges[-1]:g}")
+    return labels
+
+
+def category(value):
+    """Clé de comptage d'une valeur catégorielle (les booléens du CSV et du formulaire coïncident)."""
+    return str(value)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _numeric_value(name, value):
+    """Valeur numérique d'une caractéristique, ou None si elle est manquante (y compris 0 codant l'absence)."""
+    if _is_missing(value):
+        return None
+    value = float(value)
+    if math.isnan(value) or (name in ZERO_AS_MISSING and value == 0):
+        return None
+    return value
+
+
+# --- Reference profile ---
+def build_reference(csv_path=REFERENCE_CSV, model=None):
+    """Profil de référence du jeu d'entraînement : grilles, comptes par classe et taux de valeurs manquantes.
+
+    Les valeurs manquantes ('?', vides, ou 0 pour ZERO_AS_MISSING) sont exclues des distributions ;
+    le formulaire n'en produit pas.
+    Avec `model`, ajoute l'histogramme des probabilités prédites sur ce même jeu.
+    """
+    df = pd.read_csv(csv_path).replace('?', np.nan)
+    features = {}
+    for name in NUMERIC_FEATURES:
+        values = pd.to_numeric(df[name], errors='coerce')
+        if name in ZERO_AS_MISSING:
+            values = values.mask(values == 0)
+        present = values.dropna().to_numpy(dtype=float)
+        edges = [float(edge) for edge in np.unique(np.quantile(present, QUANTILE_LEVELS))]
+        counts = np.bincount(np.searchsorted(edges, present, side='left'), minlength=len(edges) + 1)
+        features[name] = {
+            "kind": "numeric",
+            "edges": edges,
+            "counts": {str(i): int(count) for i, count in enumerate(counts)},
+            "missing_rate": float(values.isna().mean()),
+        }
+    for name in CATEGORICAL_FEATURES:
+        present = df[name].dropna()
+        features[name] = {
+            "kind": "categorical",
+            "counts": {category(value): int(count) for value, count in present.value_counts().items()},
+            "missing_rate": float(df[name].isna().mean()),
+        }
+    grids = {name: spec.get("edges") for name, spec in features.items()}
+    profile = {
+        "source": os.path.basename(csv_path),
+        "rows": len(df),
+        "created_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        # Les classes numériques dépendent des grilles : les esquisses sont rangées par version
+        "version": hashlib.sha1(json.dumps(grids, sort_keys=True).encode('utf-8')).hexdigest()[:12],
+        "features": features,
+        "heart_probability": None,
+    }
+    if model is not None:
+        import inference
+        probabilities = model.predict_proba(inference.heart_frame(df[inference.HEART_FEATURES].to_dict('records')))[:, 1]
+        counts = np.bincount(np.searchsorted(probability_edges(), probabilities, side='left'), minlength=PROBABILITY_BINS)
+        profile["heart_probability"] = {str(i): int(count) for i, count in enumerate(counts)}
+    return profile
+
+
+def save_reference(profile, path=None):
+    path = path or REFERENCE_PATH
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_reference():
+    """Profil de référence, relu seulement s'il change sur disque ; None tant qu'il n'a pas été calculé."""
+    with _reference_lock:
+        try:
+            mtime = os.path.getmtime(REFERENCE_PATH)
+        except FileNotFoundError:
+            _reference.update(mtime=None, profile=None)
+            return None
+        if _reference["mtime"] != mtime:
+            with open(REFERENCE_PATH, encoding='utf-8') as f:
+                _reference.update(mtime=mtime, profile=json.load(f))
+        return _reference["profile"]
+
+
+def _require_reference():
+    reference = load_reference()
+    if reference is None:
+        raise FileNotFoundError(f"{REFERENCE_PATH} absent : lancer `python drift_monitor.py reference`")
+    return reference
+
+
+# --- Streaming updates ---
+def _day(entry):
+    timestamp = entry.get("timestamp")
+    return timestamp.date().isoformat() if isinstance(timestamp, datetime.datetime) else datetime.date.today().isoformat()
+
+
+def heart_deltas(reference, entries):
+    """Incréments (jour, esquisse, version de référence, classe) d'un lot de prédictions cardiaques."""
+    deltas = Counter()
+    features = reference["features"]
+    for entry in entries:
+        day = _day(entry)
+        values = entry.get("input_features", {})
+        for name in NUMERIC_FEATURES:
+            value = _numeric_value(name, values.get(name))
+            if value is not None:
+                deltas[(day, name, reference["version"], str(bin_index(features[name]["edges"], value)))] += 1
+        for name in CATEGORICAL_FEATURES:
+            value = values.get(name)
+            if not _is_missing(value):
+                deltas[(day, name, "", category(value))] += 1
+        probability = entry.get("prediction_probability_positive")
+        if probability is not None:
+            deltas[(day, HEART_PROBABILITY, "", str(bin_index(probability_edges(), probability)))] += 1
+    return deltas
+
+
+def radio_deltas(entries):
+    """Incréments d'un lot d'analyses radiographiques (classe prédite, rejets compris)."""
+    return Counter((_day(entry), RADIO_CLASS, "", entry.get("predicted_disease") or "Unknown") for entry in entries)
+
+
+def _apply(deltas):
+    if not deltas:
+        return
+    conn = get_connection()
+    today = datetime.date.today().isoformat()
+    with conn:
+        conn.executemany(
+            "INSERT INTO drift_counts (day, sketch, reference, bin, count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(day, sketch, reference, bin) DO UPDATE SET count = count + excluded.count",
+            [(*key, count) for key, count in deltas.items()]
+        )
+        # Une purge par jour et par processus : la table reste bornée à RETENTION_DAYS jours
+        if _pruned_day["day"] != today:
+            cutoff = (datetime.date.today() - datetime.timedelta(days=RETENTION_DAYS)).isoformat()
+            conn.execute("DELETE FROM drift_counts WHERE day <= ?", (cutoff,))
+            _pruned_day["day"] = today
+
+
+def _record(deltas_for):
+    if not ENABLED:
+        return
+    # La surveillance ne doit jamais faire échouer une prédiction (base, référence illisible, valeur invalide...)
+    try:
+        with metrics.track("drift_record"):
+            _apply(deltas_for())
+    except Exception:
+        metrics.inc("drift_record_failures_total")
+
+
+def record_heart(entries):
+    """Ajoute un lot de prédictions cardiaques (entrées de predict_heart) aux esquisses du jour."""
+    def deltas():
+        reference = load_reference()
+        if reference is None:
+            metrics.inc("drift_reference_missing_total")
+            return Counter()
+        return heart_deltas(reference, entries)
+    _record(deltas)
+
+
+def record_radiographs(entries):
+    """Ajoute un lot d'analyses radiographiques (entrées de predict_radiographs) aux esquisses du jour."""
+    _record(lambda: radio_deltas(entries))
+
+
+# --- Comparison ---
+def psi(expected, actual):
+    """Population Stability Index entre deux vecteurs de comptes alignés."""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    e = np.maximum(expected / expected.sum(), PSI_EPSILON)
+    a = np.maximum(actual / actual.sum(), PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected, actual):
+    """Statistique de Kolmogorov-Smirnov sur les bords de classes (minorant de la statistique exacte)."""
+    expected = np.cumsum(np.asarray(expected, dtype=float))
+    actual = np.cumsum(np.asarray(actual, dtype=float))
+    return float(np.max(np.abs(expected / expected[-1] - actual / actual[-1])))
+
+
+def ks_critical(n, m):
+    return KS_ALPHA_FACTOR * math.sqrt((n + m) / (n * m))
+
+
+def status(value, n, baseline_n):
+    if n < MIN_SAMPLES or baseline_n < MIN_SAMPLES:
+        return STATUS_INSUFFICIENT
+    if value >= PSI_SIGNIFICANT:
+        return STATUS_SIGNIFICANT
+    if value >= PSI_MODERATE:
+        return STATUS_MODERATE
+    return STATUS_STABLE
+
+
+def window_counts(conn, start, end, version):
+    """Comptes fusionnés par esquisse sur les jours [start, end) : {esquisse: {classe: nombre}}."""
+    rows = conn.execute(
+        "SELECT sketch, bin, SUM(count) FROM drift_counts "
+        "WHERE day >= ? AND day < ? AND reference IN ('', ?) GROUP BY sketch, bin",
+        (start.isoformat(), end.isoformat(), version)
+    ).fetchall()
+    counts = {}
+    for sketch, bin_key, count in rows:
+        counts.setdefault(sketch, {})[bin_key] = count
+    return counts
+
+
+def compare(name, kind, labels, keys, baseline_counts, current_counts, baseline):
+    """Ligne de rapport : PSI, KS (grandeurs ordonnées) et proportions par classe."""
+    expected = [baseline_counts.get(key, 0) for key in keys]
+    actual = [current_counts.get(key, 0) for key in keys]
+    n, baseline_n = sum(actual), sum(expected)
+    item = {
+        "sketch": name, "kind": kind, "baseline": baseline,
+        "samples": n, "baseline_samples": baseline_n,
+        "psi": None, "ks": None, "ks_critical": None, "status": STATUS_INSUFFICIENT,
+        "bins": [
+            {"bin": label,
+             "baseline": count / baseline_n if baseline_n else 0.0,
+             "current": current / n if n else 0.0}
+            for label, count, current in zip(labels, expected, actual)
+        ],
+    }
+    if n and baseline_n:
+        item["psi"] = psi(expected, actual)
+        if kind != "categorical":
+            item["ks"] = ks(expected, actual)
+            item["ks_critical"] = ks_critical(n, baseline_n)
+        item["status"] = status(item["psi"], n, baseline_n)
+    return item
+
+
+def report(window_days=WINDOW_DAYS, today=None):
+    """Dérive de la fenêtre des `window_days` derniers jours, calculée uniquement depuis les esquisses.
+
+    Lève FileNotFoundError si le profil de référence n'a pas été calculé.
+    """
+    reference = _require_reference()
+    today = today or datetime.date.today()
+    end = today + datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=window_days)
+    previous_start = start - datetime.timedelta(days=window_days)
+    conn = get_connection()
+    current = window_counts(conn, start, end, reference["version"])
+    previous = window_counts(conn, previous_start, start, reference["version"])
+
+    items = []
+    for name in NUMERIC_FEATURES + CATEGORICAL_FEATURES:
+        spec = reference["features"][name]
+        if spec["kind"] == "numeric":
+            keys = [str(i) for i in range(len(spec["edges"]) + 1)]
+            labels = bin_labels(spec["edges"])
+        else:
+            keys = sorted(set(spec["counts"]) | set(current.get(name, {})))
+            labels = keys
+        items.append(compare(name, spec["kind"], labels, keys, spec["counts"], current.get(name, {}), BASELINE_REFERENCE))
+
+    probability_keys = [str(i) for i in range(PROBABILITY_BINS)]
+    if reference.get("heart_probability"):
+        probability_baseline, baseline = reference["heart_probability"], BASELINE_REFERENCE
+    else:
+        probability_baseline, baseline = previous.get(HEART_PROBABILITY, {}), BASELINE_PREVIOUS
+    items.append(compare(HEART_PROBABILITY, "probability", bin_labels(probability_edges()), probability_keys,
+                         probability_baseline, current.get(HEART_PROBABILITY, {}), baseline))
+
+    radio_keys = sorted(set(current.get(RADIO_CLASS, {})) | set(previous.get(RADIO_CLASS, {})))
+    items.append(compare(RADIO_CLASS, "categorical", radio_keys, radio_keys,
+                         previous.get(RADIO_CLASS, {}), current.get(RADIO_CLASS, {}), BASELINE_PREVIOUS))
+
+    for item in items:
+        if item["psi"] is not None:
+            metrics.set_gauge("drift_psi", item["psi"], sketch=item["sketch"])
+    return {
+        "start": start, "end": today, "window_days": window_days,
+        "reference_source": reference["source"], "reference_rows": reference["rows"],
+        "items": items,
+    }
+
+
+def quantiles(name, levels=(0.25, 0.5, 0.75), window_days=WINDOW_DAYS, today=None):
+    """Quantiles courants d'une caractéristique numérique, interpolés dans son esquisse."""
+    reference = _require_reference()
+    edges = reference["features"][name]["edges"]
+    today = today or datetime.date.today()
+    end = today + datetime.timedelta(days=1)
+    counts = window_counts(get_connection(), end - datetime.timedelta(days=window_days), end, reference["version"]).get(name, {})
+    cumulative = np.cumsum([counts.get(str(i), 0) for i in range(len(edges) + 1)], dtype=float)
+    if not cumulative[-1]:
+        return {}
+    cumulative /= cumulative[-1]
+    # Les classes extrêmes sont ouvertes : leurs quantiles sont ramenés au bord de grille
+    bounds = [edges[0]] + edges + [edges[-1]]
+    result = {}
+    for level in levels:
+        i = int(np.searchsorted(cumulative, level, side='left'))
+        low_cdf = cumulative[i - 1] if i else 0.0
+        fraction = (level - low_cdf) / (cumulative[i] - low_cdf) if cumulative[i] > low_cdf else 0.0
+        result[level] = bounds[i] + fraction * (bounds[i + 1] - bounds[i])
+    return result
+
+
+def reset():
+    """Vide les esquisses (après un changement de modèle ou de population de référence)."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM drift_counts")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surveillance de la dérive des entrées et des prédictions.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reference_parser = subparsers.add_parser("reference", help="Recalculer le profil de référence depuis le CSV")
+    reference_parser.add_argument("--csv", default=REFERENCE_CSV)
+    reference_parser.add_argument("--no-model", action="store_true", help="Sans l'histogramme des probabilités prédites")
+    report_parser = subparsers.add_parser("report", help="Afficher la dérive de la fenêtre courante")
+    report_parser.add_argument("--days", type=int, default=WINDOW_DAYS)
+    subparsers.add_parser("reset", help="Vider les esquisses")
+    args = parser.parse_args(argv)
+
+    if args.command == "reference":
+        model = None
+        if not args.no_model:
+            try:
+                import inference
+                model = inference.load_heart_model()
+            except (ImportError, OSError) as e:
+                print(f"Modèle indisponible ({e}) : profil sans probabilités prédites.")
+        profile = build_reference(args.csv, model)
+        save_reference(profile)
+        print(f"Profil {profile['version']} écrit dans {REFERENCE_PATH} ({profile['rows']} lignes).")
+    elif args.command == "report":
+        result = report(args.days)
+        print(f"Fenêtre {result['start']} → {result['end']} ; référence {result['reference_source']} ({result['reference_rows']} lignes)")
+        for item in result["items"]:
+            psi_text = f"{item['psi']:.3f}" if item["psi"] is not None else "-"
+            ks_text = f"{item['ks']:.3f} (seuil {item['ks_critical']:.3f})" if item["ks"] is not None else "-"
+            print(f"{item['sketch']:<18} n={item['samples']:<6} base={item['baseline']:<9} "
+                  f"PSI={psi_text:<7} KS={ks_text:<22} {item['status']}")
+    else:
+        reset()
+        print("Esquisses vidées.")
+
+
+if __name__ == "__main__":
+    main()
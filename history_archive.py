@@ -0,0 +1,320 @@
+import base64
+import datetime
+import functools
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import history_store
+import history_search
+from history_writer import InterProcessLock
+from prediction_codec import encode_vector, decode_vector
+
+# Archivage par niveaux : les entrées plus anciennes que ARCHIVE_AFTER_DAYS quittent la base
+# (niveau « chaud ») pour des segments gzip immuables, un par mois, décrits par un petit manifeste.
+# L'archivage d'un utilisateur est sérialisé entre sessions et processus par un verrou fichier ;
+# un segment reste « pending » dans le manifeste tant que ses entrées n'ont pas quitté la base,
+# ce qui rend la reprise après une interruption idempotente.
+
+# --- Constants ---
+ARCHIVE_DIR = "history_archive"
+ARCHIVE_AFTER_DAYS = 180
+MANIFEST_NAME = "manifest.json"
+PROBABILITY_BINS = 20  # classes des histogrammes de confiance conservés dans le manifeste
+SUMMARY_TYPES = (history_store.TYPE_RADIO, history_store.TYPE_HEART)
+
+_stats_lock = threading.Lock()
+_load_timings = []  # (segment, secondes) des derniers chargements paresseux
+
+
+# --- Manifest ---
+def _user_dir(username):
+    return os.path.join(ARCHIVE_DIR, username)
+
+
+def load_manifest(username):
+    """Retourne la liste des segments de l'utilisateur : {file, start, end, count, bytes}."""
+    try:
+        with open(os.path.join(_user_dir(username), MANIFEST_NAME), 'r') as f:
+            return json.load(f)['segments']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return []
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _save_manifest(username, segments):
+    data = json.dumps({"version": 1, "segments": segments}, indent=2).encode('utf-8')
+    _write_atomic(os.path.join(_user_dir(username), MANIFEST_NAME), data)
+
+
+# --- Archival ---
+def _encode_line(entry):
+    data = history_store.serialize_entry(entry)
+    data['id'] = entry['id']
+    predictions = data.pop('all_predictions', None)
+    if predictions is not None:
+        data['predictions_b64'] = base64.b64encode(encode_vector(predictions)).decode('ascii')
+    return json.dumps(data, separators=(',', ':'))
+
+
+def prediction_confidence(entry_type, probabilities):
+    """Probabilité de la classe prédite : max(p, 1 - p) pour la prédiction cardiaque (qui stocke P(maladie))."""
+    probabilities = np.asarray(probabilities, dtype=float)
+    if entry_type == history_store.TYPE_HEART:
+        return np.maximum(probabilities, 1.0 - probabilities)
+    return probabilities
+
+
+def _probability_summary(entries):
+    """Résumé d'un segment par type : sommes/nombres quotidiens des probabilités et histogramme de confiance.
+
+    Le tableau de bord lit ce résumé dans le manifeste au lieu de décompresser les segments.
+    """
+    summary = {}
+    edges = np.linspace(0.0, 1.0, PROBABILITY_BINS + 1)
+    for entry_type in SUMMARY_TYPES:
+        days = {}
+        probabilities = []
+        for entry in entries:
+            if entry['type'] != entry_type:
+                continue
+            _, probability = history_store.summarize_entry(entry)
+            if probability is None:
+                continue
+            day = days.setdefault(entry['timestamp'].isoformat()[:10], [0.0, 0])
+            day[0] += float(probability)
+            day[1] += 1
+            probabilities.append(probability)
+        counts, _ = np.histogram(prediction_confidence(entry_type, probabilities), bins=edges)
+        summary[entry_type] = {"days": days, "confidence_bins": counts.tolist()}
+    return summary
+
+
+def _lock_path(username):
+    return os.path.join(ARCHIVE_DIR, f"{username}.lock")
+
+
+def _complete_pending(username, segments):
+    """Termine les segments interrompus entre l'écriture du manifeste et la suppression en base."""
+    for segment in segments:
+        if segment.get('pending'):
+            entries = _load_segment(os.path.join(_user_dir(username), segment['file']))
+            history_store.remove_archived_entries(username, [entry['id'] for entry in entries])
+            segment.pop('pending')
+            _save_manifest(username, segments)
+
+
+def archive_old_entries(username, max_age_days=ARCHIVE_AFTER_DAYS, now=None):
+    """Déplace les entrées plus anciennes que `max_age_days` vers des segments mensuels. Retourne le nombre archivé."""
+    cutoff = (now or datetime.datetime.now()) - datetime.timedelta(days=max_age_days)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with InterProcessLock(_lock_path(username)):
+        segments = load_manifest(username)
+        _complete_pending(username, segments)
+        # Relu sous le verrou : une autre session a pu archiver ces mois entre-temps
+        months = [row[0] for row in history_store.get_connection().execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) FROM history WHERE username = ? AND timestamp < ? ORDER BY 1",
+            (username, cutoff.isoformat())
+        )]
+        if not months:
+            return 0
+
+        os.makedirs(_user_dir(username), exist_ok=True)
+        archived = 0
+        for month in months:
+            month_start = datetime.datetime.strptime(month, "%Y-%m")
+            next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+            entries = history_store.query_entries(username, order="asc", start=month_start, end=min(next_month, cutoff))
+            if not entries:
+                continue
+
+            # Les segments sont immuables : un mois déjà archivé reçoit un segment supplémentaire
+            part = 1 + sum(1 for segment in segments if segment['file'].startswith(month))
+            file_name = f"{month}-{part}.jsonl.gz"
+            payload = gzip.compress("\n".join(_encode_line(entry) for entry in entries).encode('utf-8'))
+            _write_atomic(os.path.join(_user_dir(username), file_name), payload)
+
+            # Manifeste (segment en attente), suppression en base, puis confirmation : dans cet ordre
+            segment = {
+                "file": file_name,
+                "start": entries[0]['timestamp'].isoformat(),
+                "end": entries[-1]['timestamp'].isoformat(),
+                "count": len(entries),
+                "bytes": len(payload),
+                "probabilities": _probability_summary(entries),
+                "pending": True,
+            }
+            segments.append(segment)
+            _save_manifest(username, segments)
+            history_store.remove_archived_entries(username, [entry['id'] for entry in entries])
+            segment.pop('pending')
+            _save_manifest(username, segments)
+            archived += len(entries)
+        return archived
+
+
+def complete_segments(username):
+    """Segments dont les entrées ont quitté la base (les segments en attente y sont encore lisibles)."""
+    return [segment for segment in load_manifest(username) if not segment.get('pending')]
+
+
+# --- Lazy loading ---
+def _load_segment(path):
+    # Version du fichier dans la clé : un segment supprimé puis réécrit sous le même nom (après un
+    # effacement de l'historique, éventuellement par un autre processus) n'est jamais servi depuis le cache
+    stat = os.stat(path)
+    return _read_segment(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_segment(path, mtime_ns, size):
+    start = time.perf_counter()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        entries = []
+        for line in f:
+            data = json.loads(line)
+            blob = data.pop('predictions_b64', None)
+            if blob is not None:
+                data['all_predictions'] = decode_vector(base64.b64decode(blob))
+            entries.append(history_store.deserialize_entry(data))
+    with _stats_lock:
+        _load_timings.append((os.path.basename(path), time.perf_counter() - start))
+        del _load_timings[:-20]
+    return tuple(entries)
+
+
+def _matches(entry, types=None, predicted_class=None, text=None, min_probability=None, max_probability=None):
+    if types and entry['type'] not in types:
+        return False
+    entry_class, probability = history_store.summarize_entry(entry)
+    if predicted_class is not None and entry_class != predicted_class:
+        return False
+    if min_probability is not None and (probability is None or probability < min_probability):
+        return False
+    if max_probability is not None and (probability is None or probability > max_probability):
+        return False
+    if text:
+        terms = history_search.entry_terms(entry)
+        return all(any(term.startswith(query) for term in terms) for query in history_search.tokenize(text))
+    return True
+
+
+def load_archived_entries(username, start=None, end=None, **filters):
+    """Charge (à la demande) les entrées archivées dans [start, end), les plus récentes d'abord.
+
+    Seuls les segments dont la période recoupe l'intervalle sont ouverts ; les autres filtres
+    sont ceux de `history_store.query_entries`.
+    """
+    results = []
+    for segment in complete_segments(username):
+        if end is not None and datetime.datetime.fromisoformat(segment['start']) >= end:
+            continue
+        if start is not None and datetime.datetime.fromisoformat(segment['end']) < start:
+            continue
+        for entry in _load_segment(os.path.join(_user_dir(username), segment['file'])):
+            if start is not None and entry['timestamp'] < start:
+                continue
+            if end is not None and entry['timestamp'] >= end:
+                continue
+            if _matches(entry, **filters):
+                results.append(dict(entry))
+    results.sort(key=lambda entry: entry['timestamp'], reverse=True)
+    return results
+
+
+def archived_range(username):
+    """Retourne (date la plus ancienne, date la plus récente) des archives, ou None."""
+    segments = complete_segments(username)
+    if not segments:
+        return None
+    return (min(datetime.datetime.fromisoformat(s['start']) for s in segments),
+            max(datetime.datetime.fromisoformat(s['end']) for s in segments))
+
+
+def iter_archived_chunks(username):
+    """Générateur des entrées archivées, un segment (ordre chronologique) à la fois."""
+    for segment in sorted(complete_segments(username), key=lambda segment: segment['start']):
+        yield [dict(entry) for entry in _load_segment(os.path.join(_user_dir(username), segment['file']))]
+
+
+def _ensure_probability_summaries(username):
+    """Complète une seule fois les résumés absents des segments archivés avant leur introduction."""
+    if all('probabilities' in segment for segment in load_manifest(username)):
+        return
+    with InterProcessLock(_lock_path(username)):
+        segments = load_manifest(username)
+        missing = [segment for segment in segments if 'probabilities' not in segment]
+        for segment in missing:
+            segment['probabilities'] = _probability_summary(_load_segment(os.path.join(_user_dir(username), segment['file'])))
+        if missing:
+            _save_manifest(username, segments)
+
+
+def probability_summary(username, entry_type):
+    """Résumé des entrées archivées d'un type, lu dans le manifeste sans ouvrir les segments.
+
+    Retourne ({jour ISO: [somme des probabilités, nombre]}, histogramme de confiance en PROBABILITY_BINS classes).
+    """
+    _ensure_probability_summaries(username)
+    days = {}
+    bins = [0] * PROBABILITY_BINS
+    for segment in complete_segments(username):
+        summary = segment['probabilities'].get(entry_type)
+        if not summary:
+            continue
+        for day, (total, count) in summary['days'].items():
+            day_totals = days.setdefault(day, [0.0, 0])
+            day_totals[0] += total
+            day_totals[1] += count
+        bins = [a + b for a, b in zip(bins, summary['confidence_bins'])]
+    return days, bins
+
+
+def rollup_rows(username):
+    """Lignes (type, jour, classe prédite, nombre) des entrées archivées, pour reconstruire les agrégats."""
+    counts = {}
+    for chunk in iter_archived_chunks(username):
+        for entry in chunk:
+            predicted_class, _ = history_store.summarize_entry(entry)
+            key = (entry['type'], entry['timestamp'].isoformat()[:10], predicted_class)
+            counts[key] = counts.get(key, 0) + 1
+    return [(*key, count) for key, count in counts.items()]
+
+
+def delete_archives(username):
+    """Supprime tous les segments archivés d'un utilisateur."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with InterProcessLock(_lock_path(username)):
+        shutil.rmtree(_user_dir(username), ignore_errors=True)
+        _read_segment.cache_clear()
+
+
+# --- Reporting ---
+def archive_stats(username):
+    """Tailles des niveaux chaud et archivé, et durées des derniers chargements de segments."""
+    segments = complete_segments(username)
+    hot = history_store.get_connection().execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(payload) + COALESCE(length(predictions), 0)), 0) "
+        "FROM history WHERE username = ?", (username,)
+    ).fetchone()
+    with _stats_lock:
+        timings = list(_load_timings)
+    return {
+        "hot_entries": hot[0],
+        "hot_bytes": hot[1],
+        "archived_entries": sum(s['count'] for s in segments),
+        "archived_bytes": sum(s['bytes'] for s in segments),
+        "segments": len(segments),
+        "lazy_load_timings": timings,
+    }
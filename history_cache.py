@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import OrderedDict
+
+import history_store
+
+# Cache de l'historique partagé par toutes les sessions et tous les onglets du processus.
+# Chaque utilisateur a une seule copie décodée, validée par le compteur de version de la base :
+# on ne relit l'historique que s'il a réellement changé (y compris depuis un autre processus).
+# Le cache est borné (LRU) en nombre d'utilisateurs et en nombre total d'entrées.
+
+# --- Constants ---
+MAX_USERS = int(os.environ.get("MEDAPP_HISTORY_CACHE_USERS", "64"))
+MAX_ENTRIES = int(os.environ.get("MEDAPP_HISTORY_CACHE_ENTRIES", "200000"))
+
+_cache = OrderedDict()  # username -> (generation, tuple d'entrées), du moins au plus récemment utilisé
+_cache_lock = threading.Lock()
+_user_locks = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _user_lock(username):
+    with _cache_lock:
+        return _user_locks.setdefault(username, threading.Lock())
+
+
+def _evict():
+    """Retire les utilisateurs les moins récemment servis au-delà des limites (appelé sous _cache_lock)."""
+    total = sum(len(entries) for _, entries in _cache.values())
+    while _cache and (len(_cache) > MAX_USERS or total > MAX_ENTRIES):
+        username, (_, entries) = _cache.popitem(last=False)
+        total -= len(entries)
+        _stats["evictions"] += 1
+    # Verrous des utilisateurs qui ne sont plus en cache (sauf décodage en cours)
+    for username in [name for name, lock in _user_locks.items() if name not in _cache and not lock.locked()]:
+        del _user_locks[username]
+
+
+def get_history(username):
+    """Retourne l'historique « chaud » de l'utilisateur (ordre chronologique).
+
+    La liste retournée est propre à l'appelant (copie superficielle) : la session peut y ajouter
+    des entrées sans toucher au cache. Les entrées elles-mêmes sont partagées et ne doivent pas être modifiées.
+    """
+    generation = history_store.get_generation(username)
+    with _cache_lock:
+        cached = _cache.get(username)
+        if cached and cached[0] == generation:
+            _cache.move_to_end(username)
+            _stats["hits"] += 1
+            return list(cached[1])
+
+    # Un seul décodage par utilisateur même si plusieurs sessions arrivent en même temps
+    with _user_lock(username):
+        generation = history_store.get_generation(username)
+        with _cache_lock:
+            cached = _cache.get(username)
+            if cached and cached[0] == generation:
+                _stats["hits"] += 1
+                return list(cached[1])
+        entries = tuple(history_store.query_entries(username, order="asc"))
+        with _cache_lock:
+            _cache[username] = (generation, entries)
+            _cache.move_to_end(username)
+            _stats["misses"] += 1
+            _evict()
+    return list(entries)
+
+
+def invalidate(username=None):
+    """Vide le cache d'un utilisateur (ou de tous)."""
+    with _cache_lock:
+        if username is None:
+            _cache.clear()
+        else:
+            _cache.pop(username, None)
+        _evict()
+
+
+def cache_stats():
+    """Nombre de lectures servies par le cache / relues depuis la base, et d'utilisateurs en cache."""
+    with _cache_lock:
+        return dict(_stats, users=len(_cache))
@@ -0,0 +1,242 @@
+import argparse
+import csv
+import datetime
+import sys
+
+import history_archive
+import history_store
+
+# --- Constants ---
+CHUNK_SIZE = 1000
+NUM_PREDICTIONS = 17
+HEART_FEATURES = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 'thalch', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
+
+# Schéma plat et fixe : indispensable pour écrire l'en-tête CSV / le schéma Parquet avant le premier bloc
+COLUMN_TYPES = {
+    'id': int,
+    'type': str,
+    'timestamp': str,
+    'predicted_disease': str,
+    'prediction_probability': float,
+    'prediction': int,
+    'prediction_probability_positive': float,
+    'prediction_probability_negative': float,
+    'result_message': str,
+    'age': float,
+    'weight': float,
+    'symptoms': str,
+    'found_keywords': str,
+    'recommendation': str,
+}
+COLUMN_TYPES.update({f"input_{feature}": str for feature in HEART_FEATURES})
+COLUMN_TYPES.update({f"pred_{i}": float for i in range(NUM_PREDICTIONS)})
+COLUMNS = list(COLUMN_TYPES)
+
+KNOWN_TYPES = {history_store.TYPE_RADIO, history_store.TYPE_SYMPTOMS, history_store.TYPE_HEART}
+NUMERIC_HEART_FEATURES = {'age', 'trestbps', 'chol', 'thalch', 'oldpeak', 'ca'}
+BOOLEAN_HEART_FEATURES = {'fbs', 'exang'}
+
+
+# --- Flattening ---
+def flatten_entry(entry):
+    """Transforme une entrée d'historique en ligne plate (une colonne par caractéristique / probabilité)."""
+    row = dict.fromkeys(COLUMNS)
+    for column in ('id', 'type', 'predicted_disease', 'prediction_probability', 'prediction',
+                   'prediction_probability_positive', 'prediction_probability_negative',
+                   'result_message', 'age', 'weight', 'symptoms'):
+        row[column] = entry.get(column)
+    timestamp = entry.get('timestamp')
+    row['timestamp'] = timestamp.isoformat() if isinstance(timestamp, datetime.datetime) else timestamp
+
+    analysis = entry.get('analysis') or {}
+    row['found_keywords'] = "|".join(analysis.get('found_keywords', [])) or None
+    row['recommendation'] = analysis.get('recommendation')
+
+    for feature, value in (entry.get('input_features') or {}).items():
+        if feature in HEART_FEATURES:
+            row[f"input_{feature}"] = str(value)
+
+    predictions = entry.get('all_predictions')
+    if predictions is not None:
+        for i, prob in enumerate(predictions[:NUM_PREDICTIONS]):
+            row[f"pred_{i}"] = float(prob)
+    return row
+
+
+def _parse_feature(feature, value):
+    if feature in NUMERIC_HEART_FEATURES:
+        number = float(value)
+        return int(number) if number.is_integer() and feature != 'oldpeak' else number
+    if feature in BOOLEAN_HEART_FEATURES:
+        return value in (True, 'True', 'true', '1')
+    return value
+
+
+def unflatten_row(row):
+    """Reconstruit et valide une entrée d'historique à partir d'une ligne plate. Lève ValueError si invalide."""
+    def value(column):
+        raw = row.get(column)
+        if raw is None or raw == '':
+            return None
+        return COLUMN_TYPES[column](raw)
+
+    entry_type = value('type')
+    if entry_type not in KNOWN_TYPES:
+        raise ValueError(f"type d'analyse inconnu : {entry_type!r}")
+    timestamp = datetime.datetime.fromisoformat(value('timestamp'))
+    entry = {'type': entry_type, 'timestamp': timestamp}
+
+    for column in ('prediction_probability', 'prediction_probability_positive', 'prediction_probability_negative'):
+        prob = value(column)
+        if prob is not None and not 0.0 <= prob <= 1.0:
+            raise ValueError(f"{column} hors de [0, 1] : {prob}")
+
+    if entry_type == history_store.TYPE_RADIO:
+        entry['predicted_disease'] = value('predicted_disease')
+        entry['prediction_probability'] = value('prediction_probability')
+        predictions = [value(f"pred_{i}") for i in range(NUM_PREDICTIONS)]
+        if any(p is not None for p in predictions):
+            if any(p is None for p in predictions):
+                raise ValueError("vecteur de probabilités incomplet")
+            entry['all_predictions'] = predictions
+    elif entry_type == history_store.TYPE_HEART:
+        entry['input_features'] = {
+            feature: _parse_feature(feature, row[f"input_{feature}"])
+            for feature in HEART_FEATURES
+            if row.get(f"input_{feature}") not in (None, '')
+        }
+        entry['prediction'] = value('prediction')
+        entry['prediction_probability_positive'] = value('prediction_probability_positive')
+        entry['prediction_probability_negative'] = value('prediction_probability_negative')
+        entry['result_message'] = value('result_message')
+    else:
+        entry['age'] = value('age')
+        entry['weight'] = value('weight')
+        entry['symptoms'] = value('symptoms') or ""
+        keywords = value('found_keywords')
+        entry['analysis'] = {
+            'found_keywords': keywords.split("|") if keywords else [],
+            'recommendation': value('recommendation') or "",
+        }
+    return entry
+
+
+# --- Export ---
+def iter_flat_rows(username, chunk_size=CHUNK_SIZE):
+    """Générateur de blocs de lignes plates : entrées archivées (un segment à la fois), puis niveau chaud
+    par blocs de `chunk_size`."""
+    for chunk in history_archive.iter_archived_chunks(username):
+        yield [flatten_entry(entry) for entry in chunk]
+    for chunk in history_store.iter_entry_chunks(username, chunk_size):
+        yield [flatten_entry(entry) for entry in chunk]
+
+
+def export_csv(username, output, chunk_size=CHUNK_SIZE):
+    """Écrit l'historique d'un utilisateur en CSV dans un fichier texte ouvert. Retourne le nombre de lignes."""
+    writer = csv.DictWriter(output, fieldnames=COLUMNS)
+    writer.writeheader()
+    count = 0
+    for rows in iter_flat_rows(username, chunk_size):
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string()}
+    return pa.schema([(column, arrow_types[kind]) for column, kind in COLUMN_TYPES.items()])
+
+
+def export_parquet(username, output, chunk_size=CHUNK_SIZE):
+    """Écrit l'historique en Parquet, un groupe de lignes par bloc. Retourne le nombre de lignes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    count = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for rows in iter_flat_rows(username, chunk_size):
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            count += len(rows)
+    return count
+
+
+# --- Import ---
+def _iter_csv_chunks(path, chunk_size):
+    with open(path, newline='', encoding='utf-8') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _iter_parquet_chunks(path, chunk_size):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def import_file(username, path, chunk_size=CHUNK_SIZE):
+    """Valide et importe un export CSV/Parquet par blocs, une transaction par bloc.
+
+    Retourne (nombre importé, liste des erreurs (numéro de ligne, message)).
+    """
+    chunks = _iter_parquet_chunks(path, chunk_size) if path.endswith('.parquet') else _iter_csv_chunks(path, chunk_size)
+    imported = 0
+    errors = []
+    line = 0
+    for rows in chunks:
+        valid_entries = []
+        for row in rows:
+            line += 1
+            try:
+                valid_entries.append(unflatten_row(row))
+            except (ValueError, TypeError, KeyError) as e:
+                errors.append((line, str(e)))
+        history_store.insert_entries(username, valid_entries)
+        imported += len(valid_entries)
+    return imported, errors
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export / import en masse de l'historique d'un utilisateur.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Exporter l'historique en CSV ou Parquet")
+    export_parser.add_argument("username")
+    export_parser.add_argument("output", help="Fichier de sortie (.csv ou .parquet, '-' pour la sortie standard en CSV)")
+    export_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    import_parser = subparsers.add_parser("import", help="Importer un export CSV ou Parquet")
+    import_parser.add_argument("username")
+    import_parser.add_argument("input")
+    import_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.output.endswith('.parquet'):
+            count = export_parquet(args.username, args.output, args.chunk_size)
+        elif args.output == '-':
+            count = export_csv(args.username, sys.stdout, args.chunk_size)
+        else:
+            with open(args.output, 'w', newline='', encoding='utf-8') as f:
+                count = export_csv(args.username, f, args.chunk_size)
+        print(f"{count} analyses exportées.", file=sys.stderr)
+    else:
+        imported, errors = import_file(args.username, args.input, args.chunk_size)
+        for line, message in errors:
+            print(f"Ligne {line} ignorée : {message}", file=sys.stderr)
+        print(f"{imported} analyses importées, {len(errors)} rejetées.", file=sys.stderr)
+        return 1 if errors else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,94 @@
 import streamlit as st
 import json
-import datetime
+import os
+import tempfile
+import history_store
+import history_writer
+import history_archive
+import history_cache
+import similar_cases
+import metrics
+
+# Fichiers temporaires de la session (exports, lots de rapports), supprimés au remplacement et à la déconnexion
+SESSION_FILE_KEYS = ('history_export_path', 'history_batch_path')
+
+def get_current_username():
+    """Retourne le nom de l'utilisateur connecté (ou 'anonymous')."""
+    return st.session_state.get("username") or "anonymous"
 
 def get_user_history_file():
-    """Retourne le chemin du fichier d'historique pour l'utilisateur connecté."""
-    if st.session_state.get("username"):
-        return f"{st.session_state['username']}_history.json"
-    return "anonymous_history.json" # Fallback for when no user is logged in
+    """Retourne le chemin de l'ancien fichier d'historique JSON de l'utilisateur connecté."""
+    return f"{get_current_username()}_history.json"
 
+@metrics.timed("save_history")
 def save_history():
-    """Sauvegarde l'historique de l'utilisateur dans son fichier JSON dédié."""
-    history_file = get_user_history_file()
-    if not history_file:
-        return
-        
-    history_to_save = []
-    for entry in st.session_state.get('history', []):
-        entry_copy = entry.copy()
-        if 'image' in entry_copy:
-            del entry_copy['image']
-        if 'timestamp' in entry_copy and isinstance(entry_copy['timestamp'], datetime.datetime):
-            entry_copy['timestamp'] = entry_copy['timestamp'].isoformat()
-        history_to_save.append(entry_copy)
-    
-    with open(history_file, 'w') as f:
-        json.dump(history_to_save, f, indent=4)
+    """Met en file d'écriture les entrées de l'historique de session pas encore persistées.
+
+    L'écriture réelle est faite en arrière-plan par `history_writer` ; l'entrée reçoit
+    `id = None` tant qu'elle est en attente, puis son identifiant définitif.
+    """
+    new_entries = [entry for entry in st.session_state.get('history', []) if 'id' not in entry]
+    for entry in new_entries:
+        entry['id'] = None
+    history_writer.get_writer().enqueue(get_current_username(), new_entries)
+
+def flush_history():
+    """Force l'écriture des sauvegardes en attente de l'utilisateur connecté."""
+    history_writer.get_writer().flush(get_current_username())
+
+def new_session_file(state_key, suffix):
+    """Chemin d'un nouveau fichier temporaire pour `state_key` ; le précédent est supprimé."""
+    discard_session_file(state_key)
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        st.session_state[state_key] = tmp.name
+    return tmp.name
+
+def discard_session_file(state_key):
+    path = st.session_state.pop(state_key, None)
+    if path and os.path.exists(path):
+        os.remove(path)
 
+def read_session_file(path):
+    """Contenu d'un fichier de session, lu seulement au clic sur le bouton de téléchargement."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def on_logout():
+    """Avant la déconnexion : fichiers temporaires de la session supprimés, sauvegardes écrites."""
+    for state_key in SESSION_FILE_KEYS:
+        discard_session_file(state_key)
+    flush_history()
+
+@metrics.timed("load_history")
 def load_history():
-    """Charge l'historique de l'utilisateur depuis son fichier JSON."""
-    history_file = get_user_history_file()
-    if not history_file:
-        return []
+    """Charge le niveau « chaud » de l'historique (ordre chronologique) depuis la base SQLite.
+
+    Les entrées trop anciennes sont d'abord déplacées vers les archives, lues à la demande.
+    """
+    username = get_current_username()
     try:
-        with open(history_file, 'r') as f:
-            history_from_file = json.load(f)
-            for entry in history_from_file:
-                if 'timestamp' in entry and isinstance(entry['timestamp'], str):
-                    entry['timestamp'] = datetime.datetime.fromisoformat(entry['timestamp'])
-            return history_from_file
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        flush_history()
+    except Exception:
+        # Échec passager (base verrouillée...) : les entrées restent en file, réessayées en arrière-plan
+        # puis rejetées vers le journal après MAX_ATTEMPTS ; la connexion n'échoue pas pour autant
+        metrics.inc("history_flush_failures_total")
+        st.session_state['history_flush_failed'] = True
+    history_store.import_json_history(username, get_user_history_file())
+    history_archive.archive_old_entries(username)
+    # Copie partagée entre sessions, relue seulement si l'historique a changé
+    return history_cache.get_history(username)
+
+def delete_user_history(username):
+    """Supprime tout l'historique d'un utilisateur : sauvegardes en attente, base, archives et cas similaires."""
+    history_writer.get_writer().flush(username)
+    history_store.delete_user_entries(username)
+    history_archive.delete_archives(username)
+    similar_cases.forget(username)
 
 def clear_history():
-    """Efface le fichier d'historique de l'utilisateur en y écrivant une liste vide."""
+    """Efface l'historique de l'utilisateur dans la base (et vide l'ancien fichier JSON s'il existe)."""
+    delete_user_history(get_current_username())
     history_file = get_user_history_file()
-    if not history_file:
-        return
-    
-    with open(history_file, 'w') as f:
-        json.dump([], f)
-
+    if os.path.exists(history_file):
+        with open(history_file, 'w') as f:
+            json.dump([], f)
@@ -0,0 +1,80 @@
+import re
+import unicodedata
+
+# Index inversé des entrées d'historique, stocké dans la base d'historique.
+# Chaque terme normalisé (minuscules, sans accents) pointe vers les entrées qui le contiennent ;
+# la clé primaire (username, term, entry_id) permet les recherches par préfixe en un parcours d'index.
+
+# --- Constants ---
+INDEX_VERSION = "1"
+MIN_TERM_LENGTH = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_terms (
+    username TEXT NOT NULL,
+    term TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (username, term, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_history_terms_entry ON history_terms(entry_id);
+CREATE INDEX IF NOT EXISTS idx_history_user_class_prob ON history(username, predicted_class, probability);
+CREATE INDEX IF NOT EXISTS idx_history_user_prob ON history(username, probability);
+"""
+
+
+def normalize(text):
+    """Met un texte en minuscules et retire les accents ('Dyspnée' -> 'dyspnee')."""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Découpe un texte en termes normalisés distincts."""
+    return {term for term in re.findall(r"[a-z0-9]+", normalize(text)) if len(term) >= MIN_TERM_LENGTH}
+
+
+def entry_terms(entry):
+    """Termes indexés pour une entrée : description des symptômes, mots-clés détectés et maladie prédite."""
+    terms = set()
+    analysis = entry.get('analysis') or {}
+    for text in [entry.get('symptoms'), entry.get('predicted_disease'), *analysis.get('found_keywords', [])]:
+        if text:
+            terms |= tokenize(text)
+    return terms
+
+
+def index_entry(conn, username, entry_id, entry):
+    """Ajoute une entrée à l'index. À appeler dans la transaction d'insertion."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO history_terms (username, term, entry_id) VALUES (?, ?, ?)",
+        [(username, term, entry_id) for term in entry_terms(entry)]
+    )
+
+
+def forget(conn, username):
+    """Retire toutes les entrées d'un utilisateur de l'index."""
+    conn.execute("DELETE FROM history_terms WHERE username = ?", (username,))
+
+
+def term_clauses(username, text):
+    """Clauses SQL (et paramètres) restreignant `history.id` aux entrées contenant chaque terme recherché.
+
+    Chaque terme est recherché comme préfixe ('dyspn' trouve 'dyspnee') par un parcours de plage sur la clé primaire.
+    """
+    clauses, params = [], []
+    for term in sorted(tokenize(text)):
+        clauses.append("id IN (SELECT entry_id FROM history_terms WHERE username = ? AND term >= ? AND term < ?)")
+        params.extend([username, term, term + '\uffff'])
+    return clauses, params
+
+
+def ensure_index(conn, load_entry):
+    """Construit l'index pour les entrées existantes lors de la première utilisation (une seule fois)."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'search_index_version'").fetchone()
+    if row and row[0] == INDEX_VERSION:
+        return
+    with conn:
+        conn.execute("DELETE FROM history_terms")
+        for row in conn.execute("SELECT id, username, payload FROM history").fetchall():
+            index_entry(conn, row['username'], row['id'], load_entry(row['payload']))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('search_index_version', ?)", (INDEX_VERSION,))
@@ -0,0 +1,306 @@
+import sqlite3
+import json
+import datetime
+import threading
+from prediction_codec import encode_vector, decode_vector
+import analytics_rollup
+import history_search
+
+# --- Constants ---
+DB_PATH = "history.db"
+
+TYPE_RADIO = "Analyse Radiographique"
+TYPE_SYMPTOMS = "Analyse de Symptômes"
+TYPE_HEART = "heart_disease_prediction"
+
+# Version du format de stockage d'une entrée :
+#   1 : tout le contenu dans `payload` (JSON), y compris `all_predictions`
+#   2 : `all_predictions` encodé en binaire compact dans la colonne `predictions`
+FORMAT_VERSION = 2
+ENTRY_COLUMNS = "id, payload, format_version, predictions"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    predicted_class TEXT,
+    probability REAL,
+    payload TEXT NOT NULL,
+    format_version INTEGER NOT NULL DEFAULT 1,
+    predictions BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_history_user_ts ON history(username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_user_type_ts ON history(username, type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_user_class ON history(username, predicted_class);
+CREATE TABLE IF NOT EXISTS generations (
+    username TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Une connexion par thread : sqlite3 interdit le partage entre threads par défaut
+_local = threading.local()
+
+
+def get_connection():
+    """Retourne la connexion SQLite du thread courant (mode WAL pour les lecteurs concurrents)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conn.executescript(analytics_rollup.SCHEMA)
+        _migrate_schema(conn)
+        conn.executescript(history_search.SCHEMA)
+        history_search.ensure_index(conn, json.loads)
+        _local.conn = conn
+    return conn
+
+
+def _migrate_schema(conn):
+    """Ajoute les colonnes apparues après la création d'une base existante."""
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(history)")}
+    with conn:
+        if 'format_version' not in columns:
+            conn.execute("ALTER TABLE history ADD COLUMN format_version INTEGER NOT NULL DEFAULT 1")
+        if 'predictions' not in columns:
+            conn.execute("ALTER TABLE history ADD COLUMN predictions BLOB")
+
+
+# --- Serialization ---
+def serialize_entry(entry):
+    """Prépare une entrée de session pour le stockage (sans image, timestamp en ISO)."""
+    entry_copy = {k: v for k, v in entry.items() if k not in ('image', 'id')}
+    if isinstance(entry_copy.get('timestamp'), datetime.datetime):
+        entry_copy['timestamp'] = entry_copy['timestamp'].isoformat()
+    elif 'timestamp' not in entry_copy:
+        entry_copy['timestamp'] = datetime.datetime.now().isoformat()
+    return entry_copy
+
+
+def deserialize_entry(data):
+    """Reconstruit une entrée de session à partir de sa forme stockée."""
+    if isinstance(data.get('timestamp'), str):
+        data['timestamp'] = datetime.datetime.fromisoformat(data['timestamp'])
+    return data
+
+
+def summarize_entry(entry):
+    """Extrait la classe prédite et la probabilité associée, utilisées pour l'indexation."""
+    entry_type = entry.get('type')
+    if entry_type == TYPE_RADIO:
+        return entry.get('predicted_disease'), entry.get('prediction_probability')
+    if entry_type == TYPE_HEART:
+        label = "heart_disease" if entry.get('prediction') == 1 else "no_heart_disease"
+        return label, entry.get('prediction_probability_positive')
+    if entry_type == TYPE_SYMPTOMS:
+        found = (entry.get('analysis') or {}).get('found_keywords')
+        return ("keywords_found" if found else "no_keywords"), None
+    return None, None
+
+
+def _row_to_entry(row):
+    entry = deserialize_entry(json.loads(row['payload']))
+    if row['format_version'] >= 2 and row['predictions'] is not None:
+        entry['all_predictions'] = decode_vector(row['predictions'])
+    entry['id'] = row['id']
+    return entry
+
+
+
+# --- Write API ---
+def _bump_generation(conn, username):
+    """Incrémente le compteur de version de l'historique d'un utilisateur (dans la transaction en cours)."""
+    conn.execute(
+        "INSERT INTO generations (username, generation) VALUES (?, 1) "
+        "ON CONFLICT(username) DO UPDATE SET generation = generation + 1",
+        (username,)
+    )
+
+
+def get_generation(username):
+    """Version courante de l'historique d'un utilisateur ; change à chaque écriture, quel que soit le processus."""
+    row = get_connection().execute("SELECT generation FROM generations WHERE username = ?", (username,)).fetchone()
+    return row[0] if row else 0
+
+
+def _insert_rows(conn, username, entries):
+    # À appeler dans une transaction ouverte : entrées, index de recherche, agrégats et version
+    ids = []
+    rollup_rows = []
+    for entry in entries:
+        data = serialize_entry(entry)
+        predicted_class, probability = summarize_entry(data)
+        predictions = data.pop('all_predictions', None)
+        blob = encode_vector(predictions) if predictions is not None else None
+        cursor = conn.execute(
+            "INSERT INTO history (username, type, timestamp, predicted_class, probability, payload, "
+            "format_version, predictions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, data.get('type', ''), data['timestamp'], predicted_class, probability,
+             json.dumps(data, separators=(',', ':')), FORMAT_VERSION, blob)
+        )
+        ids.append(cursor.lastrowid)
+        history_search.index_entry(conn, username, cursor.lastrowid, data)
+        rollup_rows.append((data.get('type', ''), data['timestamp'], predicted_class))
+    analytics_rollup.record(conn, username, rollup_rows)
+    _bump_generation(conn, username)
+    return ids
+
+
+def insert_entries(username, entries):
+    """Insère des entrées pour un utilisateur dans une seule transaction et retourne leurs ids."""
+    conn = get_connection()
+    with conn:
+        return _insert_rows(conn, username, entries)
+
+
+def delete_user_entries(username):
+    """Supprime toutes les entrées d'un utilisateur."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM history WHERE username = ?", (username,))
+        analytics_rollup.forget(conn, username)
+        history_search.forget(conn, username)
+        _bump_generation(conn, username)
+
+
+def remove_archived_entries(username, entry_ids):
+    """Retire de la base des entrées déplacées vers les archives (les agrégats continuent de les compter)."""
+    conn = get_connection()
+    with conn:
+        for entry_id in entry_ids:
+            conn.execute("DELETE FROM history WHERE username = ? AND id = ?", (username, entry_id))
+            conn.execute("DELETE FROM history_terms WHERE entry_id = ?", (entry_id,))
+        _bump_generation(conn, username)
+
+
+# --- Query API ---
+def _where_clause(username, types=None, start=None, end=None, predicted_class=None,
+                  text=None, min_probability=None, max_probability=None):
+    clauses = ["username = ?"]
+    params = [username]
+    if types:
+        clauses.append(f"type IN ({', '.join('?' for _ in types)})")
+        params.extend(types)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(end.isoformat())
+    if predicted_class is not None:
+        clauses.append("predicted_class = ?")
+        params.append(predicted_class)
+    if min_probability is not None:
+        clauses.append("probability >= ?")
+        params.append(min_probability)
+    if max_probability is not None:
+        clauses.append("probability <= ?")
+        params.append(max_probability)
+    if text:
+        term_clauses, term_params = history_search.term_clauses(username, text)
+        clauses.extend(term_clauses)
+        params.extend(term_params)
+    return " AND ".join(clauses), params
+
+
+def query_entries(username, order="desc", limit=None, offset=0, **filters):
+    """Retourne une page d'entrées filtrées, triées par date (`order` = 'asc' ou 'desc').
+
+    Filtres : types, start, end, predicted_class, text (recherche plein texte), min_probability, max_probability.
+    """
+    where, params = _where_clause(username, **filters)
+    direction = "ASC" if order == "asc" else "DESC"
+    sql = f"SELECT {ENTRY_COLUMNS} FROM history WHERE {where} ORDER BY timestamp {direction}, id {direction}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    rows = get_connection().execute(sql, params).fetchall()
+    return [_row_to_entry(row) for row in rows]
+
+
+def query_summaries(username, order="desc", limit=None, offset=0, **filters):
+    """Comme `query_entries`, mais ne lit que les colonnes indexées (sans décoder le contenu)."""
+    where, params = _where_clause(username, **filters)
+    direction = "ASC" if order == "asc" else "DESC"
+    sql = (f"SELECT id, type, timestamp, predicted_class, probability FROM history WHERE {where} "
+           f"ORDER BY timestamp {direction}, id {direction}")
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    summaries = []
+    for row in get_connection().execute(sql, params):
+        summary = dict(row)
+        summary['timestamp'] = datetime.datetime.fromisoformat(summary['timestamp'])
+        summaries.append(summary)
+    return summaries
+
+
+def iter_entry_chunks(username, chunk_size=1000):
+    """Générateur de listes d'entrées (ordre d'insertion), lues par blocs de taille bornée."""
+    last_id = 0
+    conn = get_connection()
+    while True:
+        rows = conn.execute(
+            f"SELECT {ENTRY_COLUMNS} FROM history WHERE username = ? AND id > ? ORDER BY id LIMIT ?",
+            (username, last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        yield [_row_to_entry(row) for row in rows]
+
+
+def count_entries(username, **filters):
+    """Compte les entrées correspondant aux filtres, sans les charger."""
+    where, params = _where_clause(username, **filters)
+    return get_connection().execute(f"SELECT COUNT(*) FROM history WHERE {where}", params).fetchone()[0]
+
+
+def query_probabilities(username, entry_type):
+    """Retourne [(timestamp ISO, probabilité)] d'un type d'analyse, lus depuis l'index sans décoder le contenu."""
+    return get_connection().execute(
+        "SELECT timestamp, probability FROM history WHERE username = ? AND type = ? AND probability IS NOT NULL "
+        "ORDER BY timestamp",
+        (username, entry_type)
+    ).fetchall()
+
+
+def get_entry(username, entry_id):
+    """Retourne une entrée précise de l'utilisateur, ou None."""
+    row = get_connection().execute(
+        f"SELECT {ENTRY_COLUMNS} FROM history WHERE username = ? AND id = ?", (username, entry_id)
+    ).fetchone()
+    return _row_to_entry(row) if row else None
+
+
+# --- Legacy JSON migration ---
+def import_json_history(username, history_file):
+    """Importe une seule fois l'ancien fichier `<username>_history.json` dans la base."""
+    conn = get_connection()
+    key = f"json_imported:{username}"
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+        return 0
+    try:
+        with open(history_file, 'r') as f:
+            legacy_entries = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        legacy_entries = []
+    # Vérification, import et marqueur dans une même transaction verrouillée en écriture :
+    # deux sessions ouvertes en même temps n'importent pas deux fois
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        _insert_rows(conn, username, legacy_entries)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                     (key, datetime.datetime.now().isoformat()))
+    return len(legacy_entries)
@@ -0,0 +1,215 @@
+import atexit
+import datetime
+import json
+import threading
+import time
+
+import history_store
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Constants ---
+LOCK_PATH = "history.db.lock"
+COALESCE_DELAY = 0.25  # secondes d'attente pour regrouper les sauvegardes rapprochées
+MAX_ATTEMPTS = 3  # au-delà, l'entrée part dans le journal des rejets
+DEAD_LETTER_PATH = "history_dead_letter.jsonl"
+
+
+class InterProcessLock:
+    """Verrou exclusif sur un fichier, partagé entre tous les processus du serveur."""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            # LK_LOCK réessaie pendant ~10 s avant d'abandonner : on boucle jusqu'à l'obtenir
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+def _attempt_key(entry):
+    # Pas id(entry) : CPython réutilise les identifiants d'objets libérés, le compteur passerait à une autre entrée
+    return entry.get('analysis_id') or id(entry)
+
+
+class HistoryWriter:
+    """Persistance différée : les sauvegardes sont mises en file par utilisateur et
+    écrites par un thread de fond, une transaction par utilisateur et par rafale."""
+
+    def __init__(self, coalesce_delay=COALESCE_DELAY):
+        self.coalesce_delay = coalesce_delay
+        self._queues = {}
+        self._attempts = {}  # analysis_id de l'entrée -> échecs d'écriture
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self._stats = {"writes": 0, "entries_written": 0, "errors": 0, "dead_letters": 0,
+                       "last_latency": 0.0, "total_latency": 0.0, "max_latency": 0.0}
+
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, username, entries):
+        """Ajoute des entrées à la file de l'utilisateur ; leur 'id' est renseigné après écriture."""
+        if not entries:
+            return
+        with self._condition:
+            self._queues.setdefault(username, []).extend(entries)
+            self._condition.notify()
+
+    def pending_count(self, username=None):
+        """Nombre d'entrées en attente d'écriture (pour un utilisateur ou au total)."""
+        with self._condition:
+            if username is not None:
+                return len(self._queues.get(username, []))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        """Compteurs d'écriture et latences (en secondes)."""
+        with self._condition:
+            stats = dict(self._stats)
+        stats["mean_latency"] = stats["total_latency"] / stats["writes"] if stats["writes"] else 0.0
+        stats["pending"] = self.pending_count()
+        return stats
+
+    def flush(self, username=None):
+        """Écrit immédiatement la file d'un utilisateur (ou de tous) de façon synchrone.
+
+        Relance la première erreur d'écriture rencontrée, après avoir traité toutes les files :
+        l'appelant ne doit pas continuer comme si l'historique était à jour.
+        """
+        errors = []
+        with self._flush_lock:
+            with self._condition:
+                if username is None:
+                    batches, self._queues = self._queues, {}
+                else:
+                    batches = {username: self._queues.pop(username)} if username in self._queues else {}
+            for user, entries in batches.items():
+                errors.extend(self._write(user, entries))
+        if errors:
+            raise errors[0]
+
+    def stop(self):
+        """Arrête le thread de fond après avoir vidé toutes les files."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        # Épuise les tentatives restantes : chaque entrée est écrite ou rejetée (MAX_ATTEMPTS)
+        while self.pending_count():
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queues and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+            # Laisse arriver les sauvegardes de la même rafale avant d'écrire
+            time.sleep(self.coalesce_delay)
+            try:
+                self.flush()
+            except Exception:
+                pass  # comptée dans les statistiques ; l'entrée est réessayée ou rejetée
+
+    def _write(self, username, entries):
+        """Écrit les entrées en une transaction ; en cas d'échec, une par une. Retourne les erreurs."""
+        start = time.perf_counter()
+        try:
+            with InterProcessLock():
+                ids = history_store.insert_entries(username, entries)
+        except Exception as error:
+            if len(entries) == 1:
+                return self._failed(username, entries[0], error)
+            # Une entrée invalide ne doit pas bloquer les autres
+            errors = []
+            for entry in entries:
+                errors.extend(self._write(username, [entry]))
+            return errors
+        for entry, entry_id in zip(entries, ids):
+            entry['id'] = entry_id
+        latency = time.perf_counter() - start
+        with self._condition:
+            for entry in entries:
+                self._attempts.pop(_attempt_key(entry), None)
+            self._stats["writes"] += 1
+            self._stats["entries_written"] += len(entries)
+            self._stats["last_latency"] = latency
+            self._stats["total_latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+        return []
+
+    def _failed(self, username, entry, error):
+        """Remet l'entrée en tête de file, ou la rejette après MAX_ATTEMPTS échecs."""
+        with self._condition:
+            self._stats["errors"] += 1
+            key = _attempt_key(entry)
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts < MAX_ATTEMPTS:
+                self._attempts[key] = attempts
+                self._queues[username] = [entry] + self._queues.get(username, [])
+                return [error]
+            self._attempts.pop(key, None)
+            self._stats["dead_letters"] += 1
+        write_dead_letter(username, entry, error)
+        return [error]
+
+
+def write_dead_letter(username, entry, error):
+    """Ajoute une entrée impossible à écrire au journal des rejets (une ligne JSON par entrée)."""
+    record = {
+        "rejected_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        "username": username,
+        "error": repr(error),
+        "entry": {key: value for key, value in entry.items() if key != 'image'},
+    }
+    with InterProcessLock():
+        with open(DEAD_LETTER_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=repr, ensure_ascii=False) + "\n")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Retourne le persisteur partagé par toutes les sessions du processus."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter()
+            _writer.start()
+            atexit.register(_writer.stop)
+        return _writer
@@ -0,0 +1,257 @@
+import datetime
+import functools
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import drift_monitor
+import history_store
+import metrics
+from locales import TEXTS
+
+# Chargement des modèles, prétraitement et construction des entrées d'historique, partagés par
+# les pages Streamlit (page1.py, page2.py) et le service HTTP (inference_api.py).
+# Toutes les fonctions de prédiction travaillent par lot : une seule passe de modèle pour N entrées.
+
+# --- Constants ---
+RADIO_MODEL_PATH = 'model_diagnostic_medical.h5'
+HEART_MODEL_PATH = 'heart_disease_model.pkl'
+HEART_SCREEN_MODEL_PATH = 'heart_disease_screen.pkl'  # premier étage de la cascade (model_trainer.py)
+RADIO_IMAGE_SIZE = (224, 224)
+NON_RADIOGRAPH_CLASS = "Image_Nom_radiographique"
+
+DISEASE_MAP = {
+    0: "Atelectasis", 1: "COVID19", 2: "Cardiomegaly", 3: "Consolidation",
+    4: "Edema", 5: "Effusion", 6: "Emphysema", 7: "Fibrosis", 8: NON_RADIOGRAPH_CLASS,
+    9: "Infiltration", 10: "Mass", 11: "Nodule", 12: "Normal",
+    13: "Pleural_Thickening", 14: "Pneumonia", 15: "Pneumothorax", 16: "Tuberculosis"
+}
+
+# Colonnes attendues par le préprocesseur du pipeline (voir model_trainer.py)
+HEART_FEATURES = ['age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 'thalch', 'exang', 'oldpeak', 'slope', 'ca', 'thal']
+
+
+def _cascade_band(value):
+    # "0.2,0.8" : probabilité de maladie du premier étage en dessous de laquelle / au-dessus de laquelle
+    # on répond sans la forêt ; "off" désactive la cascade
+    if value.strip().lower() in ("", "0", "off"):
+        return None
+    low, high = (float(bound) for bound in value.split(","))
+    if not 0.0 <= low <= high <= 1.0:
+        raise ValueError(f"Bande d'incertitude invalide : {value!r}")
+    return low, high
+
+
+# Désactivée par défaut : le premier étage peut contredire la forêt, la cascade n'est activée
+# qu'explicitement avec une bande validée sur le rapport d'accord de model_trainer.py (ex. "0.15,0.85")
+HEART_CASCADE_BAND = _cascade_band(os.environ.get("MEDAPP_HEART_CASCADE", "off"))
+# Threads TensorFlow (0 : valeur par défaut) ; le réglage adapté à la machine est donné par radio_benchmark.py
+TF_INTRA_THREADS = int(os.environ.get("MEDAPP_TF_INTRA_THREADS", "0"))
+TF_INTER_THREADS = int(os.environ.get("MEDAPP_TF_INTER_THREADS", "0"))
+
+
+# --- Model loading (une fois par processus) ---
+@functools.lru_cache(maxsize=None)
+def load_radiography_model():
+    """Charge le modèle Keras de radiographie (TensorFlow n'est importé qu'ici)."""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+    if TF_INTRA_THREADS or TF_INTER_THREADS:
+        # Doit précéder toute opération TensorFlow du processus
+        tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_THREADS)
+    with metrics.track("model_load", model="radiography"):
+        return load_model(RADIO_MODEL_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def load_heart_model():
+    """Charge le modèle de maladie cardiaque : la cascade si elle est activée et que son premier étage existe, sinon le pipeline seul."""
+    import joblib
+    with metrics.track("model_load", model="heart"):
+        pipeline = joblib.load(HEART_MODEL_PATH)
+        if HEART_CASCADE_BAND is None or not os.path.exists(HEART_SCREEN_MODEL_PATH):
+            return pipeline
+        return HeartCascade(pipeline, joblib.load(HEART_SCREEN_MODEL_PATH), HEART_CASCADE_BAND)
+
+
+# --- Radiography ---
+def preprocess_radiograph(image):
+    """Image PIL -> tableau (224, 224, 3) normalisé sur [0, 1]."""
+    with metrics.track("preprocess", model="radiography"):
+        return np.asarray(image.convert('RGB').resize(RADIO_IMAGE_SIZE), dtype=np.float32) / 255.0
+
+
+@functools.lru_cache(maxsize=None)
+def embedding_model(model):
+    """Même réseau avec deux sorties : l'avant-dernière couche (embedding) et la prédiction."""
+    from tensorflow.keras.models import Model
+    return Model(inputs=model.inputs, outputs=[model.layers[-2].output, model.output])
+
+
+def predict_radiographs(model, images, with_embeddings=False):
+    """Prédit un lot d'images PIL ; retourne les entrées d'historique correspondantes (avec l'image).
+
+    Avec `with_embeddings`, retourne aussi les embeddings (n, d) de l'avant-dernière couche,
+    calculés pendant la même passe (voir similar_cases.py).
+    """
+    batch = np.stack([preprocess_radiograph(image) for image in images])
+    with metrics.track("predict", model="radiography"):
+        if with_embeddings:
+            embeddings, predictions = embedding_model(model).predict(batch, verbose=0)
+            embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(images), -1)
+        else:
+            predictions = model.predict(batch, verbose=0)
+    entries = []
+    for image, scores in zip(images, predictions):
+        index = int(np.argmax(scores))
+        entries.append({
+            "analysis_id": uuid.uuid4().hex,
+            "type": history_store.TYPE_RADIO,
+            "image": image,
+            "predicted_disease": DISEASE_MAP.get(index, "Unknown"),
+            "prediction_probability": float(scores[index]),
+            "all_predictions": scores.tolist(),
+            "timestamp": datetime.datetime.now(),
+        })
+    drift_monitor.record_radiographs(entries)
+    return (entries, embeddings) if with_embeddings else entries
+
+
+# --- Heart disease ---
+class HeartCascade:
+    """Cascade à deux étages devant le pipeline complet (préprocesseur + forêt aléatoire).
+
+    Le premier étage (`screen`, modèle linéaire entraîné sur la sortie du même préprocesseur) répond
+    seul quand sa probabilité de maladie sort de la bande `band` ; seules les entrées incertaines
+    passent par la forêt. Le préprocesseur n'est appliqué qu'une fois. Même interface que le pipeline
+    (`predict`, `predict_proba`, `classes_`).
+    """
+
+    def __init__(self, pipeline, screen, band=(0.15, 0.85)):
+        self.pipeline = pipeline
+        self.preprocessor = pipeline.named_steps['preprocessor']
+        self.classifier = pipeline.named_steps['classifier']
+        self.screen = screen
+        self.band = band
+        self.classes_ = self.classifier.classes_
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "escalated": 0, "screen_seconds": 0.0, "full_seconds": 0.0}
+
+    def escalation_mask(self, screen_proba):
+        """Entrées dont la probabilité de maladie du premier étage tombe dans la bande d'incertitude."""
+        low, high = self.band
+        positive = screen_proba[:, list(self.screen.classes_).index(1)]
+        return (positive > low) & (positive < high)
+
+    def predict_proba(self, frame):
+        start = time.perf_counter()
+        features = self.preprocessor.transform(frame)
+        proba = self.screen.predict_proba(features)
+        escalate = self.escalation_mask(proba)
+        screen_seconds = time.perf_counter() - start
+        escalated = int(escalate.sum())
+        if escalated:
+            proba[escalate] = self.classifier.predict_proba(features[escalate])
+        full_seconds = time.perf_counter() - start - screen_seconds
+        with self._lock:
+            self._stats["requests"] += len(proba)
+            self._stats["escalated"] += escalated
+            self._stats["screen_seconds"] += screen_seconds
+            self._stats["full_seconds"] += full_seconds
+        metrics.inc("heart_cascade_total", len(proba) - escalated, stage="screen")
+        metrics.inc("heart_cascade_total", escalated, stage="full")
+        return proba
+
+    def predict(self, frame):
+        return self.classes_[np.argmax(self.predict_proba(frame), axis=1)]
+
+    def stats(self):
+        """Part des entrées renvoyées à la forêt et temps passé dans chaque étage depuis le chargement."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["escalation_rate"] = stats["escalated"] / stats["requests"] if stats["requests"] else None
+        return stats
+
+
+def evaluate_cascade(cascade, frame, labels=None):
+    """Compare la cascade au pipeline complet, patient par patient (comme les soumissions de page2.py).
+
+    Retourne la part d'entrées renvoyées à la forêt, l'accord des prédictions avec le pipeline seul,
+    les latences moyennes par patient et, si `labels` est fourni, la justesse de chacun.
+    """
+    full_predictions, cascade_predictions = [], []
+    full_seconds = cascade_seconds = 0.0
+    escalated_before = cascade.stats()["escalated"]
+    for i in range(len(frame)):
+        row = frame.iloc[[i]]
+        start = time.perf_counter()
+        full_predictions.append(cascade.pipeline.predict(row)[0])
+        full_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        proba = cascade.predict_proba(row)
+        cascade_seconds += time.perf_counter() - start
+        cascade_predictions.append(cascade.classes_[np.argmax(proba[0])])
+    full_predictions, cascade_predictions = np.array(full_predictions), np.array(cascade_predictions)
+    escalated = cascade.stats()["escalated"] - escalated_before
+    count = max(len(frame), 1)
+    report = {
+        "band": cascade.band,
+        "patients": len(frame),
+        "escalation_rate": escalated / count,
+        "agreement": float(np.mean(full_predictions == cascade_predictions)) if len(frame) else None,
+        "full_ms_per_patient": full_seconds / count * 1000,
+        "cascade_ms_per_patient": cascade_seconds / count * 1000,
+    }
+    report["latency_saved"] = 1 - cascade_seconds / full_seconds if full_seconds else None
+    if labels is not None:
+        labels = np.asarray(labels)
+        report["full_accuracy"] = float(np.mean(full_predictions == labels))
+        report["cascade_accuracy"] = float(np.mean(cascade_predictions == labels))
+    return report
+
+
+def heart_frame(records):
+    """Liste de dictionnaires de caractéristiques -> DataFrame dans l'ordre attendu par le pipeline.
+
+    Lève ValueError si une caractéristique manque.
+    """
+    with metrics.track("preprocess", model="heart"):
+        missing = sorted({feature for record in records for feature in HEART_FEATURES if feature not in record})
+        if missing:
+            raise ValueError(f"Caractéristiques manquantes : {', '.join(missing)}")
+        return pd.DataFrame([[record[feature] for feature in HEART_FEATURES] for record in records], columns=HEART_FEATURES)
+
+
+def _result_message(texts, prediction):
+    key = "heart_disease_positive_result" if prediction == 1 else "heart_disease_negative_result"
+    return texts.get(key, TEXTS['fr'][key])
+
+
+def predict_heart(model, records, lang='fr'):
+    """Prédit un lot de patients ; retourne les entrées d'historique correspondantes."""
+    frame = heart_frame(records)
+    with metrics.track("predict", model="heart"):
+        # Une seule passe : la classe prédite est celle de plus forte probabilité (comme model.predict)
+        probabilities = model.predict_proba(frame)
+    predictions = model.classes_[np.argmax(probabilities, axis=1)]
+    texts = TEXTS.get(lang, TEXTS['fr'])
+    entries = []
+    for record, prediction, proba in zip(records, predictions, probabilities):
+        entries.append({
+            "analysis_id": uuid.uuid4().hex,
+            "type": history_store.TYPE_HEART,
+            "timestamp": datetime.datetime.now(),
+            "input_features": {feature: record[feature] for feature in HEART_FEATURES},
+            "prediction": int(prediction),
+            "prediction_probability_positive": float(proba[1]),
+            "prediction_probability_negative": float(proba[0]),
+            "result_message": _result_message(texts, prediction),
+        })
+    # Esquisses de dérive (entrées et probabilités), voir drift_monitor.py
+    drift_monitor.record_heart(entries)
+    return entries
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.web
+from PIL import Image, UnidentifiedImageError
+
+import credential_store
+import history_store
+import history_writer
+import inference
+import metrics
+
+# Service HTTP d'inférence sans interface (intégration DPI), mêmes modèles, prétraitement et
+# historique que les pages Streamlit. Lancement : python inference_api.py --port 8600
+#   POST /predict/heart        JSON : un patient {...}, une liste [...] ou {"records": [...]}
+#                              (+ "username" pour enregistrer dans l'historique, "lang")
+#   POST /predict/radiograph   multipart : un ou plusieurs fichiers "images" (+ champ "username")
+#   GET  /health               le processus répond
+#   GET  /ready                état de chargement de chaque modèle (503 tant qu'aucun n'est prêt)
+#   GET  /metrics              métriques au format Prometheus
+# Les requêtes arrivées dans une même fenêtre de BATCH_WINDOW secondes sont regroupées en un seul
+# appel de modèle ; au-delà de MAX_PENDING requêtes admises, le service répond 503 (Retry-After).
+# Modèle de confiance : le service ne connaît pas les utilisateurs de l'application. Un "username"
+# n'est accepté (écriture dans l'historique de ce clinicien) que si MEDAPP_API_KEY est défini : le
+# détenteur de la clé (le DPI intégrateur) est responsable de l'identité qu'il transmet. Sans clé,
+# les prédictions restent possibles mais ne sont jamais enregistrées (403 si "username" est fourni).
+
+# --- Constants ---
+DEFAULT_PORT = 8600
+API_KEY = os.environ.get("MEDAPP_API_KEY")  # si défini, exigé dans l'en-tête X-API-Key
+BATCH_WINDOW = 0.01
+MAX_BATCH = {"heart": 256, "radiography": 16}
+MAX_PENDING = 64
+MAX_IMAGES_PER_REQUEST = 16
+MAX_BODY_SIZE = 64 * 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+
+# Un thread par modèle : les appels d'un même modèle sont sérialisés (et regroupés en lots)
+_executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"predict-{name}") for name in MAX_BATCH}
+_models = {}
+_model_errors = {}
+_pending = 0
+
+
+class MicroBatcher:
+    """Regroupe les requêtes arrivées dans une courte fenêtre en un seul appel de `predict(items)`."""
+
+    def __init__(self, name, predict, window=BATCH_WINDOW):
+        self.name = name
+        self.predict = predict
+        self.window = window
+        self.max_batch = MAX_BATCH[name]
+        self._batch = []  # (items, future)
+        self._size = 0
+        self._timer = None
+
+    async def submit(self, items):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((items, future))
+        self._size += len(items)
+        if self._size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch, self._size = self._batch, [], 0
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        executor = _executors[self.name]
+        items = [item for request_items, _ in batch for item in request_items]
+        metrics.inc("api_batches_total", model=self.name)
+        metrics.inc("api_batch_items_total", len(items), model=self.name)
+        try:
+            results = await loop.run_in_executor(executor, self.predict, items)
+        except Exception:
+            # Une requête invalide ne doit pas faire échouer les autres : on les rejoue séparément
+            for request_items, future in batch:
+                try:
+                    future.set_result(await loop.run_in_executor(executor, self.predict, request_items))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        offset = 0
+        for request_items, future in batch:
+            future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
+
+
+def _predict_heart(items):
+    # items : (caractéristiques, langue) ; la langue ne change que le message de résultat
+    lang = items[0][1]
+    if any(item_lang != lang for _, item_lang in items):
+        return [entry for record, item_lang in items for entry in inference.predict_heart(_models["heart"], [record], item_lang)]
+    return inference.predict_heart(_models["heart"], [record for record, _ in items], lang)
+
+
+def _predict_radiographs(images):
+    return inference.predict_radiographs(_models["radiography"], images)
+
+
+_batchers = {
+    "heart": MicroBatcher("heart", _predict_heart),
+    "radiography": MicroBatcher("radiography", _predict_radiographs),
+}
+
+
+def _load_models():
+    for name, loader in (("heart", inference.load_heart_model), ("radiography", inference.load_radiography_model)):
+        try:
+            _models[name] = loader()
+        except Exception as e:
+            _model_errors[name] = str(e)
+
+
+def _history_username(username):
+    """Utilisateur dont l'historique recevra les prédictions ; refusé si le service n'exige pas de clé.
+
+    Le nom est normalisé comme dans credential_store : "Dr.X" et "dr.x" désignent le même historique.
+    """
+    if username is not None and not isinstance(username, str):
+        raise tornado.web.HTTPError(400, reason="'username' must be a string")
+    username = credential_store.normalize_username(username) if username else None
+    if not username:
+        return None
+    if not API_KEY:
+        raise tornado.web.HTTPError(403, reason="Saving to a user's history requires MEDAPP_API_KEY on the server")
+    return username
+
+
+def _persist(username, entries):
+    if username:
+        history_writer.get_writer().enqueue(username, entries)
+
+
+def _public(entries):
+    return [history_store.serialize_entry(entry) for entry in entries]
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def prepare(self):
+        if API_KEY and self.request.headers.get("X-API-Key") != API_KEY:
+            raise tornado.web.HTTPError(401, reason="Invalid API key")
+
+    def write_error(self, status_code, **kwargs):
+        self.finish({"error": self._reason})
+
+
+class PredictHandler(BaseHandler):
+    model_name = None
+
+    def prepare(self):
+        global _pending
+        super().prepare()
+        if self.model_name not in _models:
+            raise tornado.web.HTTPError(503, reason=f"Model '{self.model_name}' not ready")
+        if _pending >= MAX_PENDING:
+            metrics.inc("api_rejected_total", model=self.model_name)
+            self.set_header("Retry-After", str(RETRY_AFTER_SECONDS))
+            raise tornado.web.HTTPError(503, reason="Too many pending requests")
+        _pending += 1
+        self._admitted = True
+        metrics.set_gauge("api_pending_requests", _pending)
+
+    def on_finish(self):
+        global _pending
+        if getattr(self, "_admitted", False):
+            _pending -= 1
+            metrics.set_gauge("api_pending_requests", _pending)
+
+
+class HeartHandler(PredictHandler):
+    model_name = "heart"
+
+    async def post(self):
+        try:
+            body = json.loads(self.request.body or b"null")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Invalid JSON body")
+        username = lang = None
+        if isinstance(body, dict) and "records" in body:
+            records, single = body["records"], False
+        elif isinstance(body, dict):
+            records, single = [body.get("features", body)], True
+        else:
+            records, single = body, False
+        if isinstance(body, dict):
+            username, lang = _history_username(body.get("username")), body.get("lang")
+        if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+            raise tornado.web.HTTPError(400, reason="Expected a patient object or a non-empty list of patient objects")
+        missing = sorted({f for record in records for f in inference.HEART_FEATURES if f not in record})
+        if missing:
+            raise tornado.web.HTTPError(400, reason=f"Missing features: {', '.join(missing)}")
+        with metrics.track("api_request", endpoint="heart"):
+            try:
+                entries = await _batchers["heart"].submit([(record, lang or 'fr') for record in records])
+            except (ValueError, TypeError) as e:
+                raise tornado.web.HTTPError(400, reason=str(e))
+        _persist(username, entries)
+        results = _public(entries)
+        self.write(results[0] if single else {"results": results})
+
+
+class RadiographHandler(PredictHandler):
+    model_name = "radiography"
+
+    async def post(self):
+        username = _history_username(self.get_argument("username", None))
+        files = self.request.files.get("images", [])
+        if not files:
+            raise tornado.web.HTTPError(400, reason="Expected one or more 'images' files (multipart/form-data)")
+        if len(files) > MAX_IMAGES_PER_REQUEST:
+            raise tornado.web.HTTPError(413, reason=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+        try:
+            # Décodage hors de la boucle d'événements
+            images = await asyncio.get_running_loop().run_in_executor(None, _decode_images, files)
+        except (UnidentifiedImageError, OSError) as e:
+            raise tornado.web.HTTPError(400, reason=f"Invalid image: {e}")
+        with metrics.track("api_request", endpoint="radiograph"):
+            entries = await _batchers["radiography"].submit(images)
+        _persist(username, entries)
+        self.write({"results": [
+            dict(result, filename=file_info["filename"]) for result, file_info in zip(_public(entries), files)
+        ]})
+
+
+def _decode_images(files):
+    images = []
+    for file_info in files:
+        image = Image.open(io.BytesIO(file_info["body"]))
+        image.load()
+        images.append(image)
+    return images
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write({"status": "ok"})
+
+
+class ReadyHandler(BaseHandler):
+    def get(self):
+        if not _models:
+            self.set_status(503)
+        self.write({
+            "ready": sorted(_models),
+            "errors": _model_errors,
+            "pending_requests": _pending,
+            # Cascade du modèle cardiaque : part des patients renvoyés à la forêt aléatoire
+            "heart_cascade": _models["heart"].stats() if isinstance(_models.get("heart"), inference.HeartCascade) else None,
+        })
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.render_prometheus())
+
+
+def make_app():
+    return tornado.web.Application([
+        (r"/predict/heart", HeartHandler),
+        (r"/predict/radiograph", RadiographHandler),
+        (r"/health", HealthHandler),
+        (r"/ready", ReadyHandler),
+        (r"/metrics", MetricsHandler),
+    ])
+
+
+async def serve(host, port):
+    make_app().listen(port, address=host, max_body_size=MAX_BODY_SIZE)
+    print(f"Service d'inférence sur http://{host}:{port}")
+    # Les modèles se chargent en arrière-plan : /health répond tout de suite, /ready une fois prêts
+    await asyncio.get_running_loop().run_in_executor(None, _load_models)
+    print(f"Modèles prêts : {', '.join(sorted(_models)) or 'aucun'}")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP d'inférence (maladie cardiaque, radiographie).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
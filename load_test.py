@@ -0,0 +1,449 @@
+import argparse
+import datetime
+import gc
+import glob
+import io
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+import streamlit as st
+from PIL import Image
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.app_test as app_test_module
+import streamlit.testing.v1.local_script_runner as local_script_runner_module
+
+import app_shell
+import credential_store
+import drift_monitor
+import history_manager
+import history_store
+import inference
+from locales import TEXTS
+
+# Test de charge : N cliniciens synthétiques en parallèle, chacun pilotant les pages sans navigateur
+# avec l'API de test de Streamlit (AppTest) : connexion, accueil, formulaire cardiaque, envoi de
+# radiographies, historique et tableau de bord. Rapport : percentiles de durée de rerun par page,
+# débit, erreurs et croissance mémoire.
+# Usage : python load_test.py --users 20 --iterations 5 [--radiographs dossier/] [--json rapport.json]
+# Avec --interactions : durée du rerun déclenché par une interaction ciblée de chaque page (XAI,
+# nouvelle prédiction, filtre de l'historique), mesurée séquentiellement pour un utilisateur dont
+# l'historique compte --history-size entrées. AppTest relance toujours le script entier : pour une
+# section en fragment, la durée du fragment est celle qu'exécute réellement le navigateur.
+# Les comptes `loadtest_<n>` et leur historique sont supprimés à la fin (sauf --keep-data).
+# Les prédictions synthétiques ne doivent pas alimenter la surveillance de dérive : elle est coupée
+# dans ce processus, comme avec MEDAPP_DRIFT=0.
+
+# --- Constants ---
+USER_PREFIX = "loadtest_"
+PASSWORD = "loadtest-password"
+UPLOAD_STATE_KEY = "_load_test_upload"
+PAGES = {
+    "home": "app.py",
+    "heart": "pages/page2.py",
+    "radiograph": "pages/page1.py",
+    "history": "pages/historique.py",
+    "dashboard": "pages/tableau_de_bord.py",
+}
+PERCENTILES = (50, 90, 95, 99)
+# Interaction mesurée -> phase du fragment qu'elle relance (voir app_shell.timed_fragment)
+INTERACTIONS = {
+    "radiograph:xai": "fragment:radio_xai",
+    "heart:new_prediction": "fragment:heart_prediction",
+    "history:filter": "fragment:history_browser",
+}
+INTERACTION_HISTORY_SIZE = 1000
+
+_results_lock = threading.Lock()
+
+
+# AppTest ne sait pas simuler st.file_uploader : dans ce processus, l'envoi renvoie le fichier
+# placé par le test dans l'état de session (None pour une session normale)
+def _session_file_uploader(label, *args, **kwargs):
+    upload = st.session_state.get(UPLOAD_STATE_KEY)
+    return io.BytesIO(upload) if upload else None
+
+
+st.file_uploader = _session_file_uploader
+drift_monitor.ENABLED = False
+
+
+class _RuntimeSlot:
+    """Reçoit les `Runtime._instance = ...` d'AppTest, qui remet le runtime à None après chaque run."""
+    _instance = None
+
+
+def _share_runtime():
+    # AppTest installe un runtime factice global le temps d'un run : des runs concurrents se
+    # l'enlèveraient mutuellement. On installe un seul runtime partagé par toutes les sessions
+    # (comme sur un vrai serveur, y compris le cache de st.cache_data/st.cache_resource),
+    # ainsi qu'un seul cache de bytecode : chaque page n'est compilée qu'une fois
+    app_test_module.Runtime = _RuntimeSlot
+    script_cache = ScriptCache()
+    app_test_module.ScriptCache = local_script_runner_module.ScriptCache = lambda: script_cache
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+
+def _sample_radiographs(directory):
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.png")) + glob.glob(os.path.join(directory, "*.jp*g")))
+        if not paths:
+            raise SystemExit(f"Aucune image .png/.jpg dans {directory}")
+        samples = []
+        for path in paths:
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        return samples
+    # Images synthétiques en niveaux de gris à la taille d'une radiographie numérisée
+    rng = np.random.default_rng(0)
+    samples = []
+    for _ in range(4):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 256, (1024, 1024), dtype=np.uint8)).save(buffer, format="PNG")
+        samples.append(buffer.getvalue())
+    return samples
+
+
+def _seed_users(count):
+    users = credential_store.UserDirectory()
+    usernames = [f"{USER_PREFIX}{i}" for i in range(count)]
+    # Ces comptes et leurs données sont supprimés en fin de test : jamais d'écrasement d'un compte existant
+    existing = [username for username in usernames if username in users]
+    if existing:
+        raise SystemExit(f"Comptes déjà présents, test annulé : {', '.join(existing)} "
+                         f"(restes d'un test lancé avec --keep-data ? supprimez-les d'abord)")
+    # Un seul hachage bcrypt pour tous les comptes synthétiques
+    hashed = credential_store.hash_password(PASSWORD)
+    for username in usernames:
+        users[username] = {'email': f"{username}@example.invalid", 'name': username, 'password': hashed, 'roles': None}
+    return usernames
+
+
+def _seed_history(username, size):
+    """Historique synthétique de radiographies sur les 90 derniers jours (en deçà de l'archivage)."""
+    rng = random.Random(0)
+    now = datetime.datetime.now()
+    entries = []
+    for _ in range(size):
+        scores = [rng.random() for _ in inference.DISEASE_MAP]
+        total = sum(scores)
+        scores = [score / total for score in scores]
+        index = max(range(len(scores)), key=scores.__getitem__)
+        entries.append({
+            "type": history_store.TYPE_RADIO,
+            "timestamp": now - datetime.timedelta(minutes=rng.randrange(90 * 24 * 60)),
+            "predicted_disease": inference.DISEASE_MAP[index],
+            "prediction_probability": scores[index],
+            "all_predictions": scores,
+        })
+    history_store.insert_entries(username, entries)
+
+
+def _button(at, label):
+    return next(button for button in at.button if button.label == label)
+
+
+def _cleanup(usernames):
+    users = credential_store.UserDirectory()
+    for username in usernames:
+        # Comme « Effacer l'historique » : file d'écriture vidée d'abord, puis base, archives et cas similaires
+        history_manager.delete_user_history(username)
+        if username in users:
+            del users[username]
+
+
+class VirtualUser:
+    """Un clinicien synthétique : une session AppTest par page, comme un onglet de navigateur."""
+
+    def __init__(self, username, radiographs, timeout, record):
+        self.username = username
+        self.radiographs = radiographs
+        self.timeout = timeout
+        self.record = record
+        self.sessions = {}
+
+    def _session(self, page):
+        at = self.sessions.get(page)
+        if at is None:
+            at = AppTest.from_file(PAGES[page], default_timeout=self.timeout)
+            state = {
+                "authentication_status": True, "username": self.username, "name": self.username,
+                "email": f"{self.username}@example.invalid", "roles": None,
+                "lang": "fr", "lang_unauthenticated": "fr", "history": [],
+                "last_radio_analysis": None, "last_symptom_analysis": None,
+            }
+            for key, value in state.items():
+                at.session_state[key] = value
+            self.sessions[page] = at
+        return at
+
+    def _timed(self, page, action):
+        start = time.perf_counter()
+        try:
+            at = action()
+            # Une erreur de compilation du script ne produit aucun élément : page vide
+            failed = bool(at.exception) or not at.main.children
+            ui_errors = len(at.error)
+        except Exception:
+            # Délai dépassé ou erreur du script
+            failed, ui_errors = True, 0
+        self.record(page, time.perf_counter() - start, failed, ui_errors)
+
+    def login(self):
+        start = time.perf_counter()
+        ok = credential_store.check_password(PASSWORD, credential_store.UserDirectory()[self.username]['password'])
+        self.record("login", time.perf_counter() - start, not ok, 0)
+
+    def iteration(self):
+        self._timed("home", lambda: self._session("home").run())
+
+        def submit_heart():
+            at = self._session("heart").run()
+            age_inputs = [w for w in at.number_input if w.label == TEXTS["fr"]["age"]]
+            if age_inputs:
+                age_inputs[0].set_value(random.randint(30, 80))
+            submit = [b for b in at.button if b.label == TEXTS["fr"]["predict_button"]]
+            return submit[0].click().run() if submit else at
+        self._timed("heart", submit_heart)
+
+        def upload_radiograph():
+            at = self._session("radiograph")
+            at.session_state[UPLOAD_STATE_KEY] = random.choice(self.radiographs)
+            return at.run()
+        self._timed("radiograph", upload_radiograph)
+
+        self._timed("history", lambda: self._session("history").run())
+        self._timed("dashboard", lambda: self._session("dashboard").run())
+
+    def interactions(self):
+        """Une interaction ciblée par page, chacune dans une session neuve."""
+        texts = TEXTS["fr"]
+
+        def prepare_radiograph():
+            at = self._new_session("radiograph")
+            at.session_state[UPLOAD_STATE_KEY] = random.choice(self.radiographs)
+            return at.run()
+        self._timed_interaction("radiograph:xai", prepare_radiograph,
+                                lambda at: _button(at, texts["radio_xai_button"]).click().run())
+
+        self._timed_interaction("heart:new_prediction",
+                                lambda: _button(self._new_session("heart").run(), texts["predict_button"]).click().run(),
+                                lambda at: _button(at, texts["perform_new_prediction"]).click().run())
+
+        self._timed_interaction("history:filter", lambda: self._new_session("history").run(),
+                                lambda at: at.selectbox(key="history_filter").set_value(
+                                    texts["dashboard_history_filter_radio"]).run())
+
+    def _new_session(self, page):
+        self.sessions.pop(page, None)
+        return self._session(page)
+
+    def _timed_interaction(self, name, prepare, interact):
+        """Prépare la page sans la mesurer, puis mesure le rerun déclenché par l'interaction."""
+        try:
+            at = prepare()
+        except Exception as e:
+            raise SystemExit(f"{name} : préparation de la page impossible ({e!r})")
+        app_shell.reset_timings()
+        self._timed(name, lambda: interact(at))
+
+
+def _percentile(values, p):
+    return float(np.percentile(values, p)) if values else None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def run(users, iterations, radiograph_dir=None, think_time=0.0, timeout=60, trace_memory=False, keep_data=False):
+    """Lance le test et retourne le rapport (dictionnaire)."""
+    _share_runtime()
+    samples = _sample_radiographs(radiograph_dir)
+    usernames = _seed_users(users)
+    timings = {}
+    failures = {}
+    ui_errors = {}
+
+    def record(page, seconds, failed, page_ui_errors):
+        with _results_lock:
+            timings.setdefault(page, []).append(seconds)
+            failures[page] = failures.get(page, 0) + int(failed)
+            ui_errors[page] = ui_errors.get(page, 0) + page_ui_errors
+
+    def scenario(username):
+        user = VirtualUser(username, samples, timeout, record)
+        user.login()
+        for _ in range(iterations):
+            user.iteration()
+            if think_time:
+                time.sleep(random.uniform(0, 2 * think_time))
+
+    # Préchauffage séquentiel (non mesuré) : imports et compilation des pages faits une seule fois,
+    # comme sur un serveur déjà démarré
+    VirtualUser(usernames[0], samples, timeout, lambda *args: None).iteration()
+
+    if trace_memory:
+        tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0] if trace_memory else None
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=users, thread_name_prefix="virtual-user") as executor:
+            list(executor.map(scenario, usernames))
+    finally:
+        elapsed = time.perf_counter() - start
+        if not keep_data:
+            _cleanup(usernames)
+
+    total_runs = sum(len(values) for page, values in timings.items() if page != "login")
+    report = {
+        "users": users,
+        "iterations": iterations,
+        "elapsed_seconds": elapsed,
+        "reruns_per_second": total_runs / elapsed if elapsed else None,
+        "pages": {
+            page: {
+                "count": len(values),
+                "error_rate": failures[page] / len(values),
+                "ui_errors": ui_errors[page],
+                **{f"p{p}_ms": _percentile(values, p) * 1000 for p in PERCENTILES},
+                "max_ms": max(values) * 1000,
+            }
+            for page, values in sorted(timings.items())
+        },
+        "peak_rss_mb_before": rss_before,
+        "peak_rss_mb_after": _peak_rss_mb(),
+    }
+    if trace_memory:
+        report["python_heap_growth_mb"] = (tracemalloc.get_traced_memory()[0] - heap_before) / (1024 * 1024)
+        tracemalloc.stop()
+    return report
+
+
+def measure_interactions(repeats, radiograph_dir=None, history_size=INTERACTION_HISTORY_SIZE, timeout=60,
+                         keep_data=False):
+    """Mesure séquentielle des interactions ciblées et retourne le rapport (dictionnaire)."""
+    _share_runtime()
+    samples = _sample_radiographs(radiograph_dir)
+    username = _seed_users(1)[0]
+    reruns, fragments, failures = {}, {}, {}
+
+    def record(name, seconds, failed, page_ui_errors):
+        reruns.setdefault(name, []).append(seconds)
+        failures[name] = failures.get(name, 0) + int(failed)
+        fragment = app_shell.timing_stats().get(INTERACTIONS[name])
+        if fragment:
+            fragments.setdefault(name, []).append(fragment["mean_ms"] / 1000)
+
+    try:
+        _seed_history(username, history_size)
+        # Préchauffage non mesuré, comme dans run()
+        VirtualUser(username, samples, timeout, lambda *args: None).interactions()
+        # Objets des modèles chargés au préchauffage exclus des collectes complètes : sinon chacune
+        # ajoute un coût constant à tous les reruns (~160 ms avec TensorFlow) et masque l'écart mesuré
+        gc.collect()
+        gc.freeze()
+        user = VirtualUser(username, samples, timeout, record)
+        for _ in range(repeats):
+            user.interactions()
+    finally:
+        if not keep_data:
+            _cleanup([username])
+
+    return {
+        "repeats": repeats,
+        "history_size": history_size,
+        "interactions": {
+            name: {
+                "count": len(values),
+                "error_rate": failures[name] / len(values),
+                **{f"rerun_p{p}_ms": _percentile(values, p) * 1000 for p in (50, 90)},
+                **{f"fragment_p{p}_ms": _percentile(fragments[name], p) * 1000 if name in fragments else None
+                   for p in (50, 90)},
+            }
+            for name, values in sorted(reruns.items())
+        },
+    }
+
+
+def _print_interactions(report):
+    print(f"{report['repeats']} mesures par interaction, historique de {report['history_size']} entrées")
+    header = f"{'interaction':<22}{'erreurs':>9}{'rerun p50':>11}{'rerun p90':>11}{'fragment p50':>14}{'fragment p90':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in report["interactions"].items():
+        fragment = (f"{stats['fragment_p50_ms']:>14.1f}{stats['fragment_p90_ms']:>14.1f}"
+                    if stats["fragment_p50_ms"] is not None else f"{'-':>14}{'-':>14}")
+        print(f"{name:<22}{stats['error_rate']:>8.1%} {stats['rerun_p50_ms']:>11.1f}{stats['rerun_p90_ms']:>11.1f}{fragment}")
+
+
+def _print_report(report):
+    print(f"{report['users']} utilisateurs x {report['iterations']} itérations en {report['elapsed_seconds']:.1f} s "
+          f"({report['reruns_per_second']:.2f} reruns/s)")
+    header = f"{'page':<12}{'n':>6}{'erreurs':>9}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for page, stats in report["pages"].items():
+        print(f"{page:<12}{stats['count']:>6}{stats['error_rate']:>8.1%} {stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    if report["peak_rss_mb_after"] is not None:
+        print(f"Mémoire (pic RSS) : {report['peak_rss_mb_before']:.0f} -> {report['peak_rss_mb_after']:.0f} Mo")
+    if "python_heap_growth_mb" in report:
+        print(f"Croissance du tas Python : {report['python_heap_growth_mb']:.1f} Mo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge des pages Streamlit avec des sessions concurrentes.")
+    parser.add_argument("--users", type=int, default=10, help="Nombre de sessions simultanées")
+    parser.add_argument("--iterations", type=int, default=3, help="Parcours complets par utilisateur")
+    parser.add_argument("--radiographs", help="Dossier d'images à envoyer (sinon images synthétiques)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause moyenne entre deux parcours (s)")
+    parser.add_argument("--timeout", type=float, default=60, help="Délai maximal d'un rerun (s)")
+    parser.add_argument("--trace-memory", action="store_true", help="Mesurer le tas Python (tracemalloc, ralentit)")
+    parser.add_argument("--keep-data", action="store_true", help="Conserver les comptes et historiques synthétiques")
+    parser.add_argument("--interactions", action="store_true",
+                        help="Mesurer les interactions ciblées (séquentiel, --iterations mesures chacune)")
+    parser.add_argument("--history-size", type=int, default=INTERACTION_HISTORY_SIZE,
+                        help="Entrées d'historique synthétiques pour --interactions")
+    parser.add_argument("--json", help="Écrire aussi le rapport dans ce fichier JSON")
+    args = parser.parse_args(argv)
+
+    radiograph_dir = os.path.abspath(args.radiographs) if args.radiographs else None
+    json_path = os.path.abspath(args.json) if args.json else None
+    # Les pages utilisent des chemins relatifs au dossier de l'application
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.interactions:
+        report = measure_interactions(args.iterations, radiograph_dir, args.history_size, args.timeout, args.keep_data)
+        _print_interactions(report)
+    else:
+        report = run(args.users, args.iterations, radiograph_dir, args.think_time, args.timeout,
+                     args.trace_memory, args.keep_data)
+        _print_report(report)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ TEXTS = {
         "welcome_title": "Bienvenue dans l'Application de Diagnostic Médical",
         "welcome_message": "Utilisez le menu à gauche pour naviguer entre les différentes fonctionnalités.",
         "sidebar_welcome": "Bienvenue",
+        "history_flush_warning": "Certaines analyses récentes n'ont pas encore pu être enregistrées ; une nouvelle tentative est en cours.",
         "sidebar_logout": "Déconnexion",
         "sidebar_title": "🩺 Diagnostic Médical",
         "sidebar_intro": """
@@ -42,7 +43,16 @@ TEXTS = {
         "radio_all_probabilities": "Détail des probabilités par maladie",
         "radio_details_expander": "Voir les détails et probabilités",
         "radio_download_pdf": "📄 Télécharger le rapport PDF",
+        "pdf_report_stats": "Rapport généré en {seconds:.2f} s ({kb:.0f} Ko).",
         "radio_analysis_done": "Analyse terminée. Pour un diagnostic définitif, veuillez consulter un professionnel de la santé.",
+        "radio_similar_title": "🔎 Cas similaires de votre historique",
+        "radio_similar_empty": "Aucun cas comparable dans votre historique pour le moment.",
+        "radio_similar_unavailable": "Cas similaires indisponibles pour cette analyse.",
+        "radio_similar_date": "Date",
+        "radio_similar_disease": "Maladie prédite",
+        "radio_similar_probability": "Probabilité",
+        "radio_similar_score": "Similarité",
+        "radio_similar_stats": "Recherche effectuée en {ms:.1f} ms.",
         "radio_xai_title": "💡 Explicabilité de l'IA (XAI)",
         "radio_xai_info": "Cette section peut montrer quelles parties de l'image ont le plus influencé la décision du modèle (via une 'carte de chaleur').",
         "radio_xai_button": "Générer la carte de chaleur (bientôt disponible)",
@@ -66,6 +76,9 @@ TEXTS = {
         "symptoms_next_button": "Suivant",
         "symptoms_back_button": "Précédent",
         "symptoms_start_new_button": "Commencer une nouvelle analyse",
+        "symptoms_urgent": "Certains symptômes décrits peuvent signaler une urgence : **{keywords}**. Appelez le 15 (ou le 112) ou rendez-vous aux urgences sans attendre.",
+        "symptoms_mild": "Symptômes relevés : **{keywords}**. Ils semblent bénins : reposez-vous, hydratez-vous et consultez un médecin s'ils persistent ou s'aggravent.",
+        "symptoms_severity_score": "Score de gravité : {score}",
         
         # --- Heart Disease Prediction ---
         "heart_disease_prediction_title": "Prédiction de Maladies Cardiaques",
@@ -141,6 +154,30 @@ TEXTS = {
         "dashboard_history_filter_radio": "Analyse Radiographique",
         "dashboard_history_filter_symptoms": "Analyse de Symptômes",
         "dashboard_history_filter_no_results": "Aucune analyse ne correspond aux critères de filtre.",
+        "dashboard_history_heart_expander": "Prédiction Cardiaque #{num} - {date}",
+        "dashboard_history_date_range": "Période",
+        "dashboard_history_sort_label": "Trier par date",
+        "dashboard_history_sort_newest": "Plus récentes d'abord",
+        "dashboard_history_sort_oldest": "Plus anciennes d'abord",
+        "dashboard_history_page_label": "Page",
+        "dashboard_history_page_info": "Analyses {start} à {end} sur {total}",
+        "history_export_title": "Exporter l'historique",
+        "history_export_format": "Format",
+        "history_export_prepare": "Préparer l'export",
+        "history_export_download": "📥 Télécharger l'export",
+        "history_search_text": "Rechercher (symptômes, mots-clés, maladie)",
+        "history_search_disease": "Maladie prédite",
+        "history_search_min_probability": "Probabilité minimale",
+        "history_archive_show": "Afficher les analyses archivées ({start} - {end})",
+        "history_archive_stats": "Base : {hot} analyses ({hot_kb:.1f} Ko) · Archives : {archived} analyses ({archived_kb:.1f} Ko, {segments} segments)",
+        "history_batch_title": "Rapports PDF groupés",
+        "history_batch_selection": "{count} analyses correspondent aux filtres (maximum {max}).",
+        "history_batch_archives_hint": "Les analyses archivées ne sont incluses que si l'affichage des archives est activé ci-dessus.",
+        "history_batch_mode": "Format",
+        "history_batch_merged": "Un seul PDF avec sommaire",
+        "history_batch_zip": "ZIP de PDF individuels",
+        "history_batch_generate": "Générer les rapports",
+        "history_batch_download": "📥 Télécharger les rapports",
                 "dashboard_clear_history_button": "Vider l'historique",
                 
                 "welcome_section_features_title": "Nos Fonctionnalités Clés",
@@ -163,6 +200,99 @@ TEXTS = {
                         "dashboard_chart_symptom_keywords_found": "Mots-clés trouvés",
                         "dashboard_chart_symptom_no_keywords": "Pas de mots-clés trouvés",
                         "dashboard_chart_symptom_empty": "Aucune analyse de symptômes pour afficher le graphique.",
+                        "dashboard_rebuild_rollups_button": "Recalculer les statistiques",
+                        "dashboard_ts_disease_title": "Analyses radiographiques par jour et par maladie",
+                        "dashboard_ts_heart_title": "Risque cardiaque moyen (moyenne mobile sur {days} jours)",
+                        "dashboard_ts_confidence_title": "Distribution de la confiance des prédictions",
+                        "dashboard_ts_date": "Date",
+                        "dashboard_ts_count": "Nombre d'analyses",
+                        "dashboard_ts_daily_mean": "Moyenne quotidienne",
+                        "dashboard_ts_rolling_mean": "Moyenne mobile",
+                        "dashboard_ts_probability": "Probabilité de maladie cardiaque",
+                        "dashboard_ts_heart_empty": "Aucune prédiction cardiaque pour afficher la tendance.",
+                        "dashboard_ts_confidence_empty": "Aucune prédiction pour afficher la distribution.",
+
+                        "admin_forbidden": "Cette page est réservée aux administrateurs.",
+                        "admin_title": "🏥 Statistiques de l'Établissement",
+                        "admin_intro": "Statistiques agrégées sur les analyses de tous les utilisateurs.",
+                        "admin_refresh_button": "Actualiser les utilisateurs modifiés",
+                        "admin_full_refresh_button": "Tout recalculer",
+                        "admin_refresh_spinner": "Analyse des historiques en cours...",
+                        "admin_refresh_done": "{users} utilisateur(s) analysé(s) en {seconds:.2f} s.",
+                        "admin_stale_users": "{count} utilisateur(s) ont de nouvelles analyses depuis la dernière actualisation.",
+                        "admin_total_analyses": "Analyses au total",
+                        "admin_active_users": "Utilisateurs actifs",
+                        "admin_per_user_title": "Analyses par utilisateur",
+                        "admin_no_data": "Aucune donnée agrégée pour le moment.",
+                        "metrics_title": "📊 Métriques de Performance",
+                        "metrics_disabled": "Les métriques sont désactivées (MEDAPP_METRICS=0).",
+                        "metrics_endpoint": "Format Prometheus disponible sur http://<serveur>:{port}/metrics",
+                        "metrics_refresh_button": "Actualiser",
+                        "metrics_latency_title": "Latences",
+                        "metrics_counters_title": "Compteurs",
+                        "metrics_gauges_title": "Opérations en cours",
+                        "metrics_spans_title": "Traces récentes",
+                        "metrics_prometheus_expander": "Export Prometheus (texte)",
+                        "metrics_no_data": "Aucune mesure pour le moment.",
+                        "metrics_col_name": "Métrique",
+                        "metrics_col_labels": "Libellés",
+                        "metrics_col_count": "Nombre",
+                        "metrics_col_mean_ms": "Moyenne (ms)",
+                        "metrics_col_p50_ms": "p50 ≤ (ms)",
+                        "metrics_col_p95_ms": "p95 ≤ (ms)",
+                        "metrics_col_value": "Valeur",
+                        "profiling_title": "🔬 Profilage des Pages",
+                        "profiling_intro": "Armez une page : le prochain rerun de cette page, par n'importe quel utilisateur, est exécuté sous cProfile et tracemalloc. Les résultats apparaissent ci-dessous.",
+                        "profiling_page_select": "Page à profiler",
+                        "profiling_arm_button": "Profiler le prochain rerun",
+                        "profiling_armed": "Profilage armé pour : {pages}",
+                        "profiling_disarm_button": "Annuler",
+                        "profiling_refresh_button": "Actualiser",
+                        "profiling_no_profiles": "Aucun profil enregistré pour le moment.",
+                        "profiling_select_profile": "Profil",
+                        "profiling_summary": "{page} par {username} le {created_at} : {seconds:.2f} s, pic mémoire {peak_mb:.1f} Mo.",
+                        "profiling_flame_title": "Graphe en flammes (temps cumulé)",
+                        "profiling_functions_title": "Fonctions les plus coûteuses",
+                        "profiling_allocations_title": "Principales allocations",
+                        "profiling_col_function": "Fonction",
+                        "profiling_col_calls": "Appels",
+                        "profiling_col_own_ms": "Temps propre (ms)",
+                        "profiling_col_cumulative_ms": "Temps cumulé (ms)",
+                        "profiling_col_location": "Emplacement",
+                        "profiling_col_size_kb": "Taille (Ko)",
+                        "profiling_col_count": "Blocs",
+                        "profiling_download_prof": "Télécharger le profil (.prof)",
+                        "profiling_download_alloc": "Télécharger les allocations (.txt)",
+                        "metrics_rerun_title": "Durée des reruns par page",
+                        "metrics_rerun_intro": "« page:… » : rerun complet de la page ; « fragment:… » : rerun limité à une section après une interaction.",
+                        "metrics_col_phase": "Phase",
+                        "drift_title": "📉 Dérive des Données",
+                        "drift_intro": "Compare la population récente (caractéristiques saisies, probabilités et classes prédites) au jeu d'entraînement du modèle cardiaque, à partir d'esquisses mises à jour à chaque prédiction.",
+                        "drift_window": "Fenêtre (jours)",
+                        "drift_refresh_button": "Actualiser",
+                        "drift_reference_missing": "Profil de référence absent ({path}) : les prédictions cardiaques ne sont pas surveillées. Lancez `python drift_monitor.py reference` sur le serveur.",
+                        "drift_window_info": "Fenêtre du {start} au {end} ; référence : {source} ({rows} lignes).",
+                        "drift_heart_probability": "Probabilité de maladie cardiaque",
+                        "drift_radio_class": "Classe radiographique prédite",
+                        "drift_col_sketch": "Variable",
+                        "drift_col_baseline": "Base de comparaison",
+                        "drift_col_samples": "Prédictions",
+                        "drift_col_psi": "PSI",
+                        "drift_col_ks": "KS",
+                        "drift_col_ks_critical": "Seuil KS (5 %)",
+                        "drift_col_status": "État",
+                        "drift_baseline_reference": "Référence (entraînement)",
+                        "drift_baseline_previous": "Fenêtre précédente",
+                        "drift_series_current": "Fenêtre courante",
+                        "drift_status_stable": "Stable",
+                        "drift_status_moderate": "Dérive modérée",
+                        "drift_status_significant": "Dérive importante",
+                        "drift_status_insufficient": "Données insuffisantes",
+                        "drift_thresholds": "PSI ≥ {moderate} : dérive modérée ; PSI ≥ {significant} : dérive importante ; au moins {min_samples} prédictions de part et d'autre. KS au-delà du seuil : distributions différentes au risque de 5 %.",
+                        "drift_detail_select": "Détail de la variable",
+                        "drift_no_data": "Aucune donnée pour cette variable dans la fenêtre.",
+                        "drift_quantiles": "Quantiles courants (estimés depuis l'esquisse) : Q1 {q1:.1f}, médiane {median:.1f}, Q3 {q3:.1f}.",
+                        "shell_timing_stats": "Coquille : {shell_ms:.1f} ms en moyenne (p95 {shell_p95_ms:.1f} ms), page : {page_ms:.1f} ms, sur {count} rerun(s).",
                         
                         "unauthenticated_error": "Veuillez vous connecter pour accéder à cette page."
                     },
@@ -171,6 +301,7 @@ TEXTS = {
                 "welcome_title": "Welcome to the Medical Diagnosis Application",
                 "welcome_message": "Use the menu on the left to navigate between the different features.",
                 "sidebar_welcome": "Welcome",
+                "history_flush_warning": "Some recent analyses could not be saved yet; saving is being retried.",
                 "sidebar_logout": "Logout",
                 "sidebar_title": "🩺 Medical Diagnosis",
                 "sidebar_intro": """
@@ -209,7 +340,16 @@ TEXTS = {
                 "radio_all_probabilities": "All Probabilities by Disease",
                 "radio_details_expander": "View details and probabilities",
                 "radio_download_pdf": "📄 Download PDF Report",
+                "pdf_report_stats": "Report rendered in {seconds:.2f} s ({kb:.0f} KB).",
                 "radio_analysis_done": "Analysis complete. For a definitive diagnosis, please consult a healthcare professional.",
+                "radio_similar_title": "🔎 Similar cases from your history",
+                "radio_similar_empty": "No comparable case in your history yet.",
+                "radio_similar_unavailable": "Similar cases are unavailable for this analysis.",
+                "radio_similar_date": "Date",
+                "radio_similar_disease": "Predicted disease",
+                "radio_similar_probability": "Probability",
+                "radio_similar_score": "Similarity",
+                "radio_similar_stats": "Search took {ms:.1f} ms.",
                 "radio_xai_title": "💡 AI Explainability (XAI)",
                 "radio_xai_info": "This section can show which parts of the image most influenced the model's decision (via a 'heatmap').",
                 "radio_xai_button": "Generate heatmap (coming soon)",
@@ -228,6 +368,15 @@ TEXTS = {
                 "symptoms_results_title": "Symptom Analysis Results:",
                 "symptoms_keywords_found": "You have mentioned the following symptoms that may require special attention: **{keywords}**. It is strongly recommended to consult a healthcare professional.",
                 "symptoms_no_keywords": "Based on your description, no major emergency symptoms were detected. Continue to monitor your condition and see a doctor if symptoms persist or worsen.",
+                "symptoms_step1_title": "1. Basic information",
+                "symptoms_step2_title": "2. Describe your symptoms",
+                "symptoms_next_button": "Next",
+                "symptoms_back_button": "Back",
+                "symptoms_start_new_button": "Start a new analysis",
+                "symptoms_urgent": "Some of the symptoms described may indicate an emergency: **{keywords}**. Call emergency services (112 / 911) or go to the emergency room without delay.",
+                "symptoms_mild": "Symptoms noted: **{keywords}**. They appear mild: rest, stay hydrated and see a doctor if they persist or worsen.",
+                "symptoms_severity_score": "Severity score: {score}",
+                "download_report": "Download report",
         
                 "dashboard_title": "📊 Unified Patient Record",
                 "dashboard_intro": "This page consolidates information from your latest analyses to provide an overview of your health status.",
@@ -248,6 +397,30 @@ TEXTS = {
                 "dashboard_history_filter_radio": "Radiography Analysis",
                 "dashboard_history_filter_symptoms": "Symptom Analysis",
                 "dashboard_history_filter_no_results": "No analyses match the filter criteria.",
+                "dashboard_history_heart_expander": "Heart Prediction #{num} - {date}",
+                "dashboard_history_date_range": "Date range",
+                "dashboard_history_sort_label": "Sort by date",
+                "dashboard_history_sort_newest": "Newest first",
+                "dashboard_history_sort_oldest": "Oldest first",
+                "dashboard_history_page_label": "Page",
+                "dashboard_history_page_info": "Analyses {start} to {end} of {total}",
+                "history_export_title": "Export history",
+                "history_export_format": "Format",
+                "history_export_prepare": "Prepare export",
+                "history_export_download": "📥 Download export",
+                "history_search_text": "Search (symptoms, keywords, disease)",
+                "history_search_disease": "Predicted disease",
+                "history_search_min_probability": "Minimum probability",
+                "history_archive_show": "Show archived analyses ({start} - {end})",
+                "history_archive_stats": "Database: {hot} analyses ({hot_kb:.1f} KB) · Archives: {archived} analyses ({archived_kb:.1f} KB, {segments} segments)",
+                "history_batch_title": "Batch PDF reports",
+                "history_batch_selection": "{count} analyses match the filters (maximum {max}).",
+                "history_batch_archives_hint": "Archived analyses are included only when the archive view above is turned on.",
+                "history_batch_mode": "Format",
+                "history_batch_merged": "Single PDF with table of contents",
+                "history_batch_zip": "ZIP of individual PDFs",
+                "history_batch_generate": "Generate reports",
+                "history_batch_download": "📥 Download reports",
                 "dashboard_clear_history_button": "Clear History",
         
                 "welcome_section_features_title": "Our Key Features",
@@ -270,6 +443,99 @@ TEXTS = {
         "dashboard_chart_symptom_keywords_found": "Keywords Found",
         "dashboard_chart_symptom_no_keywords": "No Keywords Found",
         "dashboard_chart_symptom_empty": "No symptom analysis to display chart.",
+        "dashboard_rebuild_rollups_button": "Recompute statistics",
+        "dashboard_ts_disease_title": "Radiography analyses per day and disease",
+        "dashboard_ts_heart_title": "Average heart risk ({days}-day rolling mean)",
+        "dashboard_ts_confidence_title": "Prediction confidence distribution",
+        "dashboard_ts_date": "Date",
+        "dashboard_ts_count": "Number of analyses",
+        "dashboard_ts_daily_mean": "Daily mean",
+        "dashboard_ts_rolling_mean": "Rolling mean",
+        "dashboard_ts_probability": "Heart disease probability",
+        "dashboard_ts_heart_empty": "No heart predictions to display the trend.",
+        "dashboard_ts_confidence_empty": "No predictions to display the distribution.",
+
+        "admin_forbidden": "This page is restricted to administrators.",
+        "admin_title": "🏥 Facility Statistics",
+        "admin_intro": "Aggregated statistics over the analyses of all users.",
+        "admin_refresh_button": "Refresh changed users",
+        "admin_full_refresh_button": "Recompute everything",
+        "admin_refresh_spinner": "Scanning histories...",
+        "admin_refresh_done": "{users} user(s) scanned in {seconds:.2f} s.",
+        "admin_stale_users": "{count} user(s) have new analyses since the last refresh.",
+        "admin_total_analyses": "Total analyses",
+        "admin_active_users": "Active users",
+        "admin_per_user_title": "Analyses per user",
+        "admin_no_data": "No aggregated data yet.",
+        "metrics_title": "📊 Performance Metrics",
+        "metrics_disabled": "Metrics are disabled (MEDAPP_METRICS=0).",
+        "metrics_endpoint": "Prometheus format available at http://<server>:{port}/metrics",
+        "metrics_refresh_button": "Refresh",
+        "metrics_latency_title": "Latencies",
+        "metrics_counters_title": "Counters",
+        "metrics_gauges_title": "In-flight operations",
+        "metrics_spans_title": "Recent traces",
+        "metrics_prometheus_expander": "Prometheus export (text)",
+        "metrics_no_data": "No measurements yet.",
+        "metrics_col_name": "Metric",
+        "metrics_col_labels": "Labels",
+        "metrics_col_count": "Count",
+        "metrics_col_mean_ms": "Mean (ms)",
+        "metrics_col_p50_ms": "p50 ≤ (ms)",
+        "metrics_col_p95_ms": "p95 ≤ (ms)",
+        "metrics_col_value": "Value",
+        "profiling_title": "🔬 Page Profiling",
+        "profiling_intro": "Arm a page: its next rerun, by any user, runs under cProfile and tracemalloc. Results appear below.",
+        "profiling_page_select": "Page to profile",
+        "profiling_arm_button": "Profile the next rerun",
+        "profiling_armed": "Profiling armed for: {pages}",
+        "profiling_disarm_button": "Cancel",
+        "profiling_refresh_button": "Refresh",
+        "profiling_no_profiles": "No profile recorded yet.",
+        "profiling_select_profile": "Profile",
+        "profiling_summary": "{page} by {username} on {created_at}: {seconds:.2f} s, peak memory {peak_mb:.1f} MB.",
+        "profiling_flame_title": "Flame graph (cumulative time)",
+        "profiling_functions_title": "Most expensive functions",
+        "profiling_allocations_title": "Top allocations",
+        "profiling_col_function": "Function",
+        "profiling_col_calls": "Calls",
+        "profiling_col_own_ms": "Own time (ms)",
+        "profiling_col_cumulative_ms": "Cumulative time (ms)",
+        "profiling_col_location": "Location",
+        "profiling_col_size_kb": "Size (KB)",
+        "profiling_col_count": "Blocks",
+        "profiling_download_prof": "Download profile (.prof)",
+        "profiling_download_alloc": "Download allocations (.txt)",
+        "metrics_rerun_title": "Rerun timings per page",
+        "metrics_rerun_intro": "\"page:…\": full page rerun; \"fragment:…\": rerun limited to one section after an interaction.",
+        "metrics_col_phase": "Phase",
+        "drift_title": "📉 Data Drift",
+        "drift_intro": "Compares the recent population (entered features, predicted probabilities and classes) with the heart model's training set, using sketches updated on every prediction.",
+        "drift_window": "Window (days)",
+        "drift_refresh_button": "Refresh",
+        "drift_reference_missing": "Reference profile missing ({path}): heart predictions are not monitored. Run `python drift_monitor.py reference` on the server.",
+        "drift_window_info": "Window from {start} to {end}; reference: {source} ({rows} rows).",
+        "drift_heart_probability": "Heart disease probability",
+        "drift_radio_class": "Predicted radiography class",
+        "drift_col_sketch": "Variable",
+        "drift_col_baseline": "Baseline",
+        "drift_col_samples": "Predictions",
+        "drift_col_psi": "PSI",
+        "drift_col_ks": "KS",
+        "drift_col_ks_critical": "KS threshold (5%)",
+        "drift_col_status": "Status",
+        "drift_baseline_reference": "Reference (training)",
+        "drift_baseline_previous": "Previous window",
+        "drift_series_current": "Current window",
+        "drift_status_stable": "Stable",
+        "drift_status_moderate": "Moderate drift",
+        "drift_status_significant": "Significant drift",
+        "drift_status_insufficient": "Not enough data",
+        "drift_thresholds": "PSI ≥ {moderate}: moderate drift; PSI ≥ {significant}: significant drift; at least {min_samples} predictions on each side. KS above the threshold: distributions differ at the 5% level.",
+        "drift_detail_select": "Variable detail",
+        "drift_no_data": "No data for this variable in the window.",
+        "drift_quantiles": "Current quantiles (estimated from the sketch): Q1 {q1:.1f}, median {median:.1f}, Q3 {q3:.1f}.",
+        "shell_timing_stats": "Shell: {shell_ms:.1f} ms on average (p95 {shell_p95_ms:.1f} ms), page: {page_ms:.1f} ms, over {count} rerun(s).",
         
         "unauthenticated_error": "Please log in to access this page."
             }
@@ -0,0 +1,236 @@
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentation des chemins critiques (chargement et prédiction des modèles, prétraitement,
+# rapports PDF, historique, authentification) : histogrammes de latence, compteurs, jauges
+# « en cours » et dernières traces, exposés au format texte Prometheus.
+# Désactivée avec MEDAPP_METRICS=0 : `track` renvoie alors un contexte vide partagé.
+
+# --- Constants ---
+ENABLED = os.environ.get("MEDAPP_METRICS", "1") != "0"
+HTTP_PORT = int(os.environ.get("MEDAPP_METRICS_PORT", "9464"))  # 0 : pas de point d'accès HTTP
+# Sans authentification : local par défaut ; "0.0.0.0" seulement derrière un pare-feu ou un proxy
+HTTP_HOST = os.environ.get("MEDAPP_METRICS_HOST", "127.0.0.1")
+PREFIX = "medapp_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SPANS = 200
+
+_lock = threading.Lock()
+_counters = {}  # (nom, labels) -> valeur
+_gauges = {}
+_histograms = {}  # (nom, labels) -> [comptes par intervalle (+Inf inclus), somme, nombre]
+_spans = deque(maxlen=RECENT_SPANS)
+_span_stack = threading.local()
+_server = None
+_server_attempted = False
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Incrémente un compteur."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Fixe la valeur d'une jauge."""
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def _add_gauge(key, delta):
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def observe(name, seconds, **labels):
+    """Ajoute une durée (secondes) à l'histogramme `name`."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+@contextlib.contextmanager
+def _track(name, labels):
+    key = _key(name, labels)
+    stack = getattr(_span_stack, "names", None)
+    if stack is None:
+        stack = _span_stack.names = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    _add_gauge((f"{name}_in_flight", key[1]), 1)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        _add_gauge((f"{name}_in_flight", key[1]), -1)
+        observe(f"{name}_seconds", duration, **labels)
+        inc(f"{name}_total", status=status, **labels)
+        with _lock:
+            _spans.append({
+                "name": name, "labels": dict(labels), "parent": parent, "status": status,
+                "start": time.time() - duration, "seconds": duration,
+                "thread": threading.current_thread().name,
+            })
+
+
+def track(name, **labels):
+    """Contexte mesurant une opération : latence, nombre (ok/erreur), opérations en cours et trace."""
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _track(name, labels)
+
+
+def timed(name, **labels):
+    """Décorateur équivalent à `track` ; la fonction est laissée intacte si les métriques sont désactivées."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _track(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Reading ---
+def _histogram_quantile(counts, total, quantile):
+    # Estimation au format Prometheus : borne supérieure de l'intervalle contenant le quantile
+    rank = quantile * total
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return float("inf")
+
+
+def snapshot():
+    """Copie des métriques pour l'affichage : compteurs, jauges, histogrammes résumés et traces récentes."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+        spans = list(_spans)
+    return {
+        "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(counters.items())],
+        "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(gauges.items())],
+        "histograms": [
+            {
+                "name": name, "labels": dict(labels), "count": count, "sum": total,
+                "mean": total / count if count else 0.0,
+                "p50": _histogram_quantile(counts, count, 0.5),
+                "p95": _histogram_quantile(counts, count, 0.95),
+            }
+            for (name, labels), (counts, total, count) in sorted(histograms.items())
+        ],
+        "spans": spans,
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """Toutes les métriques au format d'exposition texte de Prometheus (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items())
+    lines = []
+    typed = set()
+    for kind, items in (("counter", counters), ("gauge", gauges)):
+        for (name, labels), value in items:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                typed.add(name)
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+    for (name, labels), (counts, total, count) in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+            cumulative += bucket_count
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# --- HTTP endpoint ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port=HTTP_PORT, host=HTTP_HOST):
+    """Démarre (une fois par processus) le point d'accès GET /metrics dans un thread démon.
+
+    Retourne le port utilisé, ou None si les métriques ou le point d'accès sont désactivés
+    ou si le port est déjà pris (par exemple par un autre processus Streamlit).
+    """
+    global _server, _server_attempted
+    if not ENABLED or not port:
+        return None
+    with _lock:
+        if not _server_attempted:
+            _server_attempted = True
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                _server = None
+            else:
+                _server.daemon_threads = True
+                threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server.server_address[1] if _server else None
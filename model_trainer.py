@@ -2,6 +2,7 @@
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -88,3 +89,23 @@ print(f"Model trained with accuracy: {accuracy:.2f}")
 joblib.dump(model_pipeline, 'heart_disease_model.pkl')
 print("Model successfully saved as 'heart_disease_model.pkl'")
 
+# 7. Train the cascade's first stage
+# A linear model on the same preprocessed features answers the clearly low/high-risk patients;
+# only those in the uncertainty band go through the forest (see inference.HeartCascade)
+from inference import HEART_CASCADE_BAND, HEART_SCREEN_MODEL_PATH, HeartCascade, evaluate_cascade
+
+fitted_preprocessor = model_pipeline.named_steps['preprocessor']
+screen_model = LogisticRegression(max_iter=1000)
+screen_model.fit(fitted_preprocessor.transform(X_train), y_train)
+joblib.dump(screen_model, HEART_SCREEN_MODEL_PATH)
+print(f"Cascade first stage saved as '{HEART_SCREEN_MODEL_PATH}' (used only when MEDAPP_HEART_CASCADE sets a band)")
+
+# 8. Cascade report on the test set, for the configured band (MEDAPP_HEART_CASCADE) and a few alternatives
+bands = sorted({HEART_CASCADE_BAND or (0.15, 0.85), (0.1, 0.9), (0.25, 0.75)})
+print(f"{'band':<14}{'escalated':>10}{'agreement':>11}{'accuracy':>10}{'forest ms':>11}{'cascade ms':>12}{'saved':>8}")
+for band in bands:
+    report = evaluate_cascade(HeartCascade(model_pipeline, screen_model, band), X_test, y_test)
+    print(f"{band[0]:.2f}-{band[1]:.2f}{'':<5}{report['escalation_rate']:>10.1%}{report['agreement']:>11.1%}"
+          f"{report['cascade_accuracy']:>10.2f}{report['full_ms_per_patient']:>11.2f}"
+          f"{report['cascade_ms_per_patient']:>12.2f}{report['latency_saved']:>8.0%}")
+
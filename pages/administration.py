@@ -0,0 +1,64 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# --- Authentication Check ---
+if not st.session_state.get("authentication_status"):
+    st.error("Veuillez vous connecter pour accéder à cette page. / Please log in to access this page.")
+    st.stop()
+
+# --- Translation Setup (only if authenticated) ---
+from app import get_text, is_admin
+import admin_analytics
+T = get_text
+
+# --- Admin Check ---
+if not is_admin():
+    st.error(T("admin_forbidden"))
+    st.stop()
+
+st.title(T("admin_title"))
+st.markdown(T("admin_intro"))
+
+# --- Refresh (seuls les utilisateurs modifiés sont rescannés, en parallèle) ---
+col_refresh, col_full = st.columns(2)
+with col_refresh:
+    refresh_clicked = st.button(T("admin_refresh_button"))
+with col_full:
+    full_refresh_clicked = st.button(T("admin_full_refresh_button"))
+if refresh_clicked or full_refresh_clicked:
+    with st.spinner(T("admin_refresh_spinner")):
+        result = admin_analytics.refresh(full=full_refresh_clicked)
+    st.success(T("admin_refresh_done").format(users=result["scanned"], seconds=result["seconds"]))
+else:
+    stale_count = len(admin_analytics.stale_users())
+    if stale_count:
+        st.caption(T("admin_stale_users").format(count=stale_count))
+
+# --- Global rollups ---
+summary = admin_analytics.global_summary()
+col_total, col_users = st.columns(2)
+col_total.metric(T("admin_total_analyses"), summary["total"])
+col_users.metric(T("admin_active_users"), summary["users"])
+
+if summary["by_disease"]:
+    st.subheader(T("dashboard_chart_radio_title"))
+    disease_counts = pd.DataFrame(list(summary["by_disease"].items()), columns=['Maladie', 'Fréquence'])
+    chart_disease = alt.Chart(disease_counts).mark_bar().encode(
+        x=alt.X("Fréquence:Q"),
+        y=alt.Y("Maladie:N", sort="-x", title=T("dashboard_chart_radio_legend")),
+        tooltip=["Maladie", "Fréquence"]
+    )
+    st.altair_chart(chart_disease, use_container_width=True)
+
+# --- Per-user rollups ---
+st.subheader(T("admin_per_user_title"))
+user_rows = admin_analytics.user_summaries()
+if user_rows:
+    st.dataframe(pd.DataFrame(user_rows).fillna(0), use_container_width=True, hide_index=True)
+else:
+    st.info(T("admin_no_data"))
@@ -0,0 +1,98 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import drift_monitor
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# --- Authentication Check ---
+if not st.session_state.get("authentication_status"):
+    st.error("Veuillez vous connecter pour accéder à cette page. / Please log in to access this page.")
+    st.stop()
+
+# --- Translation Setup (only if authenticated) ---
+from app import get_text, is_admin
+T = get_text
+
+# --- Admin Check ---
+if not is_admin():
+    st.error(T("admin_forbidden"))
+    st.stop()
+
+STATUS_ICONS = {
+    drift_monitor.STATUS_STABLE: "🟢",
+    drift_monitor.STATUS_MODERATE: "🟠",
+    drift_monitor.STATUS_SIGNIFICANT: "🔴",
+    drift_monitor.STATUS_INSUFFICIENT: "⚪",
+}
+
+st.title(T("drift_title"))
+st.markdown(T("drift_intro"))
+
+window_days = st.slider(T("drift_window"), min_value=1, max_value=drift_monitor.WINDOW_DAYS, value=drift_monitor.WINDOW_DAYS)
+if st.button(T("drift_refresh_button")):
+    st.rerun()
+
+# Le profil de référence est calculé au déploiement, jamais pendant une prédiction
+if drift_monitor.load_reference() is None:
+    st.warning(T("drift_reference_missing").format(path=drift_monitor.REFERENCE_PATH))
+    st.stop()
+
+# Calculé depuis les esquisses uniquement (quelques centaines de lignes au plus), jamais depuis l'historique
+report = drift_monitor.report(window_days)
+st.caption(T("drift_window_info").format(
+    start=report["start"].strftime('%d/%m/%Y'), end=report["end"].strftime('%d/%m/%Y'),
+    source=report["reference_source"], rows=report["reference_rows"]
+))
+
+
+def _sketch_label(sketch):
+    return {
+        drift_monitor.HEART_PROBABILITY: T("drift_heart_probability"),
+        drift_monitor.RADIO_CLASS: T("drift_radio_class"),
+    }.get(sketch, sketch)
+
+
+st.dataframe(pd.DataFrame([
+    {
+        T("drift_col_sketch"): _sketch_label(item["sketch"]),
+        T("drift_col_baseline"): T(f"drift_baseline_{item['baseline']}"),
+        T("drift_col_samples"): item["samples"],
+        T("drift_col_psi"): round(item["psi"], 3) if item["psi"] is not None else None,
+        T("drift_col_ks"): round(item["ks"], 3) if item["ks"] is not None else None,
+        T("drift_col_ks_critical"): round(item["ks_critical"], 3) if item["ks_critical"] is not None else None,
+        T("drift_col_status"): f"{STATUS_ICONS[item['status']]} {T('drift_status_' + item['status'])}",
+    }
+    for item in report["items"]
+]), use_container_width=True, hide_index=True)
+st.caption(T("drift_thresholds").format(
+    moderate=drift_monitor.PSI_MODERATE, significant=drift_monitor.PSI_SIGNIFICANT, min_samples=drift_monitor.MIN_SAMPLES
+))
+
+# --- Detail of one sketch ---
+st.markdown("---")
+items = {item["sketch"]: item for item in report["items"]}
+sketch = st.selectbox(T("drift_detail_select"), options=list(items), format_func=_sketch_label)
+item = items[sketch]
+if not item["bins"]:
+    st.info(T("drift_no_data"))
+else:
+    detail = pd.DataFrame(item["bins"]).rename(columns={
+        "baseline": T(f"drift_baseline_{item['baseline']}"), "current": T("drift_series_current")
+    }).melt(id_vars="bin", var_name="series", value_name="proportion")
+    chart = alt.Chart(detail).mark_bar().encode(
+        x=alt.X("bin:N", sort=None, title=None),
+        xOffset="series:N",
+        y=alt.Y("proportion:Q", axis=alt.Axis(format="%"), title=None),
+        color=alt.Color("series:N", legend=alt.Legend(orient="bottom", title=None)),
+        tooltip=["bin", "series", alt.Tooltip("proportion:Q", format=".1%")],
+    )
+    st.altair_chart(chart, use_container_width=True)
+    if sketch in drift_monitor.NUMERIC_FEATURES:
+        current_quantiles = drift_monitor.quantiles(sketch, window_days=window_days)
+        if current_quantiles:
+            st.caption(T("drift_quantiles").format(
+                q1=current_quantiles[0.25], median=current_quantiles[0.5], q3=current_quantiles[0.75]
+            ))
@@ -1,4 +1,10 @@
 import streamlit as st
+import datetime
+import functools
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
 
 # --- Authentication Check ---
 if not st.session_state.get("authentication_status"):
@@ -7,8 +13,230 @@ if not st.session_state.get("authentication_status"):
 
 # --- Translation Setup (only if authenticated) ---
 from app import get_text
-from history_manager import clear_history
+from history_manager import clear_history, flush_history, get_current_username, new_session_file, read_session_file
+import history_store
+import history_export
+import analytics_rollup
+import history_archive
+import pdf_batch
+from app_shell import RerunTimer, timed_fragment
 T = get_text
+rerun_timer = RerunTimer()
+
+HISTORY_PAGE_SIZE = 20
+MAX_BATCH_REPORTS = 500
+EXPANDER_TITLES = {
+    history_store.TYPE_RADIO: "dashboard_history_radio_expander",
+    history_store.TYPE_SYMPTOMS: "dashboard_history_symptoms_expander",
+    history_store.TYPE_HEART: "dashboard_history_heart_expander",
+}
+
+
+def render_history_details(analysis):
+    """Affiche le détail d'une entrée d'historique (appelé uniquement à son ouverture)."""
+    # --- RADIOGRAPHY ANALYSIS HISTORY ---
+    if analysis['type'] == "Analyse Radiographique":
+        # Handle New Model Entry
+        if 'predicted_disease' in analysis:
+            st.write(f"**{T('radio_predicted_disease')}:** {analysis['predicted_disease']}")
+            st.write(f"**{T('radio_prediction_probability')}:** {analysis.get('prediction_probability', 0):.2%}")
+        # Handle Old Model Entry
+        elif 'disease_status' in analysis:
+            st.write(f"**{T('radio_disease_status')}:** {analysis['disease_status']}")
+            st.write(f"**{T('radio_predicted_age')}:** {analysis['age_pred_value']} ans")
+            st.write(f"**{T('radio_predicted_sex')}:** {analysis['sex_status']}")
+
+        # Les images ne sont pas persistées : seule la session courante les conserve
+        image = next((entry['image'] for entry in st.session_state.get('history', [])
+                      if entry.get('id') == analysis['id'] and 'image' in entry), None)
+        if image is not None:
+            st.image(image, width=150)
+        else:
+            st.caption(T("dashboard_history_no_image"))
+
+    # --- SYMPTOMS ANALYSIS HISTORY ---
+    elif analysis['type'] == "Analyse de Symptômes":
+        st.write(f"**{T('symptoms_age')}:** {analysis['age']}")
+        st.write(f"**{T('symptoms_description')}:** {analysis['symptoms'][:100]}...")
+        found_keywords = analysis.get('analysis', {}).get('found_keywords', [])
+        if found_keywords:
+            st.write(f"**{T('dashboard_history_keywords')}:** {', '.join(found_keywords)}")
+        else:
+            st.write(f"**{T('dashboard_history_keywords')}:** {T('dashboard_history_no_keywords')}")
+
+    # --- HEART DISEASE PREDICTION HISTORY ---
+    elif analysis['type'] == "heart_disease_prediction":
+        st.write(f"**{analysis['result_message']}**")
+        st.write(f"**{T('probability_of_disease')}:** {analysis['prediction_probability_positive']:.2%}")
+
+
+# Filtres, recherche, pagination et rapports : chaque interaction ne relance que cette section
+@timed_fragment("history_browser")
+def history_browser(username, archive_range):
+    st.write(T("dashboard_history_intro"))
+
+    # History Filter, date range and sort order (appliqués par SQLite)
+    col_filter, col_dates, col_sort = st.columns(3)
+    with col_filter:
+        filter_option = st.selectbox(
+            T("dashboard_history_filter_label"),
+            options=[
+                T("dashboard_history_filter_all"),
+                T("dashboard_history_filter_radio"),
+                T("dashboard_history_filter_symptoms")
+            ],
+            key="history_filter"
+        )
+    with col_dates:
+        date_range = st.date_input(T("dashboard_history_date_range"), value=(), key="history_date_range")
+    with col_sort:
+        sort_option = st.selectbox(
+            T("dashboard_history_sort_label"),
+            options=[T("dashboard_history_sort_newest"), T("dashboard_history_sort_oldest")],
+            key="history_sort"
+        )
+
+    FILTER_TYPES = {
+        T("dashboard_history_filter_all"): None,
+        T("dashboard_history_filter_radio"): [history_store.TYPE_RADIO],
+        T("dashboard_history_filter_symptoms"): [history_store.TYPE_SYMPTOMS],
+    }
+    filters = {"types": FILTER_TYPES.get(filter_option)}
+    if len(date_range) == 2:
+        filters["start"] = datetime.datetime.combine(date_range[0], datetime.time.min)
+        filters["end"] = datetime.datetime.combine(date_range[1] + datetime.timedelta(days=1), datetime.time.min)
+    order = "desc" if sort_option == T("dashboard_history_sort_newest") else "asc"
+
+    # --- Search (index inversé sur les symptômes/mots-clés, index triés sur maladie et probabilité) ---
+    col_text, col_disease, col_proba = st.columns(3)
+    with col_text:
+        search_text = st.text_input(T("history_search_text"), key="history_search_text")
+    with col_disease:
+        known_diseases = sorted(analytics_rollup.get_counts(history_store.get_connection(), username, analytics_rollup.DISEASE))
+        search_disease = st.selectbox(T("history_search_disease"), options=[T("dashboard_history_filter_all")] + known_diseases, key="history_search_disease")
+    with col_proba:
+        min_probability = st.slider(T("history_search_min_probability"), min_value=0, max_value=100, value=0, step=5, format="%d%%", key="history_search_min_probability")
+    if search_text.strip():
+        filters["text"] = search_text
+    if search_disease != T("dashboard_history_filter_all"):
+        filters["predicted_class"] = search_disease
+    if min_probability > 0:
+        filters["min_probability"] = min_probability / 100
+
+    filtered_total = history_store.count_entries(username, **filters)
+    if filtered_total == 0:
+        st.info(T("dashboard_history_filter_no_results"))
+    else:
+        page_count = (filtered_total - 1) // HISTORY_PAGE_SIZE + 1
+        page = st.number_input(T("dashboard_history_page_label"), min_value=1, max_value=page_count, value=1, step=1, key="history_page")
+        offset = (page - 1) * HISTORY_PAGE_SIZE
+
+        # Seuls les résumés de la page visible sont chargés ; le détail l'est à l'ouverture
+        summaries = history_store.query_summaries(username, order=order, limit=HISTORY_PAGE_SIZE, offset=offset, **filters)
+        st.caption(T("dashboard_history_page_info").format(start=offset + 1, end=offset + len(summaries), total=filtered_total))
+
+        for i, summary in enumerate(summaries):
+            num = filtered_total - offset - i if order == "desc" else offset + i + 1
+            title_key = EXPANDER_TITLES.get(summary['type'])
+            if title_key is None:
+                continue
+            title = T(title_key).format(num=num, date=summary['timestamp'].strftime('%d/%m/%Y %H:%M:%S'))
+            if st.toggle(title, key=f"history_open_{summary['id']}"):
+                with st.container(border=True):
+                    render_history_details(history_store.get_entry(username, summary['id']))
+
+    # --- Archived tier (segments compressés ouverts seulement si on y accède) ---
+    show_archives, archived_entries = False, []
+    if archive_range is not None:
+        st.markdown("---")
+        filter_reaches_archive = "start" in filters and filters["start"] <= archive_range[1]
+        show_archives = st.toggle(
+            T("history_archive_show").format(start=archive_range[0].strftime('%d/%m/%Y'), end=archive_range[1].strftime('%d/%m/%Y')),
+            value=filter_reaches_archive,
+            key="history_archive_show"
+        )
+        if show_archives:
+            archived_entries = history_archive.load_archived_entries(username, **filters)
+            if not archived_entries:
+                st.info(T("dashboard_history_filter_no_results"))
+            else:
+                archive_page_count = (len(archived_entries) - 1) // HISTORY_PAGE_SIZE + 1
+                archive_page = st.number_input(T("dashboard_history_page_label"), min_value=1, max_value=archive_page_count, value=1, step=1, key="history_archive_page")
+                archive_offset = (archive_page - 1) * HISTORY_PAGE_SIZE
+                for analysis in archived_entries[archive_offset:archive_offset + HISTORY_PAGE_SIZE]:
+                    title_key = EXPANDER_TITLES.get(analysis['type'])
+                    if title_key is None:
+                        continue
+                    title = T(title_key).format(num=analysis['id'], date=analysis['timestamp'].strftime('%d/%m/%Y %H:%M:%S'))
+                    if st.toggle(title, key=f"history_archive_open_{analysis['id']}"):
+                        with st.container(border=True):
+                            render_history_details(analysis)
+            stats = history_archive.archive_stats(username)
+            st.caption(T("history_archive_stats").format(
+                hot=stats["hot_entries"], hot_kb=stats["hot_bytes"] / 1024,
+                archived=stats["archived_entries"], archived_kb=stats["archived_bytes"] / 1024,
+                segments=stats["segments"]
+            ))
+
+    # --- Batch PDF reports (entrées correspondant aux filtres courants) ---
+    with st.expander(T("history_batch_title")):
+        # Les entrées archivées sont incluses quand les archives sont affichées (segments déjà chargés)
+        batch_total = min(filtered_total + len(archived_entries), MAX_BATCH_REPORTS)
+        st.caption(T("history_batch_selection").format(count=batch_total, max=MAX_BATCH_REPORTS))
+        if archive_range is not None and not show_archives:
+            st.caption(T("history_batch_archives_hint"))
+        batch_mode = st.radio(
+            T("history_batch_mode"),
+            options=[T("history_batch_merged"), T("history_batch_zip")],
+            horizontal=True,
+            key="history_batch_mode"
+        )
+        if st.button(T("history_batch_generate"), disabled=batch_total == 0):
+            batch_entries = (archived_entries[::-1] + history_store.query_entries(username, order="asc", limit=MAX_BATCH_REPORTS, **filters))[:MAX_BATCH_REPORTS]
+            progress_bar = st.progress(0.0)
+            def report_progress(done, total):
+                progress_bar.progress(done / total if total else 1.0)
+            merged = batch_mode == T("history_batch_merged")
+            # Remplace (et supprime) le lot généré précédemment
+            batch_path = new_session_file('history_batch_path', ".pdf" if merged else ".zip")
+            if merged:
+                pdf_batch.write_merged(batch_entries, batch_path, progress=report_progress)
+            else:
+                pdf_batch.write_zip(batch_entries, batch_path, progress=report_progress)
+        batch_path = st.session_state.get('history_batch_path')
+        if batch_path:
+            st.download_button(
+                label=T("history_batch_download"),
+                data=functools.partial(read_session_file, batch_path),
+                file_name=f"rapports_{username}{batch_path[batch_path.rfind('.'):]}",
+                mime="application/pdf" if batch_path.endswith(".pdf") else "application/zip",
+                on_click="ignore"
+            )
+
+
+# Export indépendant des filtres : préparer ou télécharger ne relance pas la liste
+@timed_fragment("history_export")
+def history_export_panel(username):
+    with st.expander(T("history_export_title")):
+        export_format = st.radio(T("history_export_format"), options=["CSV", "Parquet"], horizontal=True, key="history_export_format")
+        if st.button(T("history_export_prepare")):
+            suffix = ".parquet" if export_format == "Parquet" else ".csv"
+            # Remplace (et supprime) le fichier préparé précédemment
+            export_path = new_session_file('history_export_path', suffix)
+            if export_format == "Parquet":
+                history_export.export_parquet(username, export_path)
+            else:
+                with open(export_path, 'w', newline='', encoding='utf-8') as f:
+                    history_export.export_csv(username, f)
+        export_path = st.session_state.get('history_export_path')
+        if export_path:
+            st.download_button(
+                label=T("history_export_download"),
+                data=functools.partial(read_session_file, export_path),
+                file_name=f"historique_{username}{export_path[export_path.rfind('.'):]}",
+                mime="application/octet-stream",
+                on_click="ignore"
+            )
 
 
 st.title(T("dashboard_title"))
@@ -87,65 +315,14 @@ with st.container():
             st.session_state['history'] = []
             st.rerun()
             
-    if not st.session_state.get('history'):
+    username = get_current_username()
+    flush_history()
+
+    archive_range = history_archive.archived_range(username)
+    if history_store.count_entries(username) == 0 and archive_range is None:
         st.info(T("dashboard_history_empty"))
     else:
-        st.write(T("dashboard_history_intro"))
-
-        # History Filter
-        filter_option = st.selectbox(
-            T("dashboard_history_filter_label"),
-            options=[
-                T("dashboard_history_filter_all"),
-                T("dashboard_history_filter_radio"),
-                T("dashboard_history_filter_symptoms")
-            ],
-            key="history_filter"
-        )
-
-        filtered_history = []
-        for entry in st.session_state['history']:
-            if filter_option == T("dashboard_history_filter_all"):
-                filtered_history.append(entry)
-            elif filter_option == T("dashboard_history_filter_radio") and entry['type'] == "Analyse Radiographique":
-                filtered_history.append(entry)
-            elif filter_option == T("dashboard_history_filter_symptoms") and entry['type'] == "Analyse de Symptômes":
-                filtered_history.append(entry)
-        
-        if not filtered_history:
-            st.info(T("dashboard_history_filter_no_results"))
-        else:
-            for i, analysis in enumerate(reversed(filtered_history)):
-                # --- RADIOGRAPHY ANALYSIS HISTORY ---
-                if analysis['type'] == "Analyse Radiographique":
-                    expander_title = T("dashboard_history_radio_expander").format(num=len(st.session_state['history']) - i, date=analysis['timestamp'].strftime('%d/%m/%Y %H:%M:%S'))
-                    with st.expander(expander_title):
-                        # Handle New Model Entry
-                        if 'predicted_disease' in analysis:
-                            st.write(f"**{T('radio_predicted_disease')}:** {analysis['predicted_disease']}")
-                            st.write(f"**{T('radio_prediction_probability')}:** {analysis.get('prediction_probability', 0):.2%}")
-                        # Handle Old Model Entry
-                        elif 'disease_status' in analysis:
-                            st.write(f"**{T('radio_disease_status')}:** {analysis['disease_status']}")
-                            st.write(f"**{T('radio_predicted_age')}:** {analysis['age_pred_value']} ans")
-                            st.write(f"**{T('radio_predicted_sex')}:** {analysis['sex_status']}")
-
-                        if 'image' in analysis:
-                            st.image(analysis['image'], width=150)
-                        else:
-                            st.caption(T("dashboard_history_no_image"))
-                
-                # --- SYMPTOMS ANALYSIS HISTORY ---
-                elif analysis['type'] == "Analyse de Symptômes":
-                    expander_title = T("dashboard_history_symptoms_expander").format(num=len(st.session_state['history']) - i, date=analysis['timestamp'].strftime('%d/%m/%Y %H:%M:%S'))
-                    with st.expander(expander_title):
-                        st.write(f"**{T('symptoms_age')}:** {analysis['age']}")
-                        st.write(f"**{T('symptoms_description')}:** {analysis['symptoms'][:100]}...")
-                        found_keywords = analysis.get('analysis', {}).get('found_keywords', [])
-                        if found_keywords:
-                            st.write(f"**{T('dashboard_history_keywords')}:** {', '.join(found_keywords)}")
-                        else:
-                            st.write(f"**{T('dashboard_history_keywords')}:** {T('dashboard_history_no_keywords')}")
-
-
+        history_browser(username, archive_range)
+        history_export_panel(username)
 
+rerun_timer.lap("page:historique")
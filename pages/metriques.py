@@ -0,0 +1,106 @@
+import streamlit as st
+import pandas as pd
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# --- Authentication Check ---
+if not st.session_state.get("authentication_status"):
+    st.error("Veuillez vous connecter pour accéder à cette page. / Please log in to access this page.")
+    st.stop()
+
+# --- Translation Setup (only if authenticated) ---
+from app import get_text, is_admin
+from app_shell import timing_stats
+import metrics
+T = get_text
+
+# --- Admin Check ---
+if not is_admin():
+    st.error(T("admin_forbidden"))
+    st.stop()
+
+st.title(T("metrics_title"))
+
+# --- Rerun timings (page complète vs fragment, mesurés dans ce processus) ---
+rerun_stats = timing_stats()
+rerun_phases = sorted(phase for phase in rerun_stats if phase.startswith(("page:", "fragment:")))
+if rerun_phases:
+    st.subheader(T("metrics_rerun_title"))
+    st.caption(T("metrics_rerun_intro"))
+    st.dataframe(pd.DataFrame([
+        {
+            T("metrics_col_phase"): phase,
+            T("metrics_col_count"): rerun_stats[phase]["count"],
+            T("metrics_col_mean_ms"): round(rerun_stats[phase]["mean_ms"], 2),
+            T("metrics_col_p95_ms"): round(rerun_stats[phase]["p95_ms"], 2),
+        }
+        for phase in rerun_phases
+    ]), use_container_width=True, hide_index=True)
+
+if not metrics.ENABLED:
+    st.info(T("metrics_disabled"))
+    st.stop()
+
+port = metrics.start_http_server()
+if port:
+    st.caption(T("metrics_endpoint").format(port=port))
+if st.button(T("metrics_refresh_button")):
+    st.rerun()
+
+snapshot = metrics.snapshot()
+
+
+def _labels_text(labels):
+    return ", ".join(f"{key}={value}" for key, value in labels.items())
+
+
+# --- Latency histograms ---
+st.subheader(T("metrics_latency_title"))
+if snapshot["histograms"]:
+    st.dataframe(pd.DataFrame([
+        {
+            T("metrics_col_name"): h["name"],
+            T("metrics_col_labels"): _labels_text(h["labels"]),
+            T("metrics_col_count"): h["count"],
+            T("metrics_col_mean_ms"): round(h["mean"] * 1000, 2),
+            # Quantiles estimés : borne supérieure de l'intervalle de l'histogramme
+            T("metrics_col_p50_ms"): h["p50"] * 1000,
+            T("metrics_col_p95_ms"): h["p95"] * 1000,
+        }
+        for h in snapshot["histograms"]
+    ]), use_container_width=True, hide_index=True)
+else:
+    st.info(T("metrics_no_data"))
+
+# --- Counters and in-flight gauges ---
+col_counters, col_gauges = st.columns(2)
+with col_counters:
+    st.subheader(T("metrics_counters_title"))
+    st.dataframe(pd.DataFrame(
+        [{T("metrics_col_name"): c["name"], T("metrics_col_labels"): _labels_text(c["labels"]), T("metrics_col_value"): c["value"]}
+         for c in snapshot["counters"]],
+        columns=[T("metrics_col_name"), T("metrics_col_labels"), T("metrics_col_value")]
+    ), use_container_width=True, hide_index=True)
+with col_gauges:
+    st.subheader(T("metrics_gauges_title"))
+    st.dataframe(pd.DataFrame(
+        [{T("metrics_col_name"): g["name"], T("metrics_col_labels"): _labels_text(g["labels"]), T("metrics_col_value"): g["value"]}
+         for g in snapshot["gauges"]],
+        columns=[T("metrics_col_name"), T("metrics_col_labels"), T("metrics_col_value")]
+    ), use_container_width=True, hide_index=True)
+
+# --- Recent traces (les plus lentes d'abord) ---
+st.subheader(T("metrics_spans_title"))
+if snapshot["spans"]:
+    spans = pd.DataFrame(snapshot["spans"])
+    spans["start"] = pd.to_datetime(spans["start"], unit="s")
+    spans["ms"] = (spans.pop("seconds") * 1000).round(2)
+    spans["labels"] = spans["labels"].map(_labels_text)
+    st.dataframe(spans.sort_values("ms", ascending=False), use_container_width=True, hide_index=True)
+else:
+    st.info(T("metrics_no_data"))
+
+with st.expander(T("metrics_prometheus_expander")):
+    st.code(metrics.render_prometheus(), language="text")
@@ -1,11 +1,18 @@
 import streamlit as st
 from PIL import Image
-import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-import datetime
-from pdf_generator import generate_pdf_report
-from history_manager import save_history
+import functools
+import hashlib
+import time
+from app_shell import RerunTimer, timed_fragment
+from pdf_generator import get_pdf_report, get_report_stats
+from history_manager import save_history, get_current_username
+import inference
+import metrics
+import similar_cases
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
 
 # --- Authentication Check ---
 if not st.session_state.get("authentication_status"):
@@ -15,19 +22,118 @@ if not st.session_state.get("authentication_status"):
 # --- Translation Setup (only if authenticated) ---
 from app import get_text
 T = get_text
+rerun_timer = RerunTimer()
 
 
 # --- Model Loading ---
 @st.cache_resource
 def load_my_model():
     try:
-       
-        model = load_model('model_diagnostic_medical.h5')
-        return model
+        return inference.load_radiography_model()
     except Exception as e:
         st.error(T("radio_model_error").format(e=e))
         return None
 
+
+def upload_key(uploaded_file):
+    """Identifie un envoi : l'analyse n'est refaite que pour une nouvelle image."""
+    return getattr(uploaded_file, "file_id", None) or hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+
+def analyze_upload(model, image, key):
+    """Prédiction, sauvegarde et recherche de cas similaires, une seule fois par image envoyée."""
+    # Preprocess, predict, interpret (partagé avec le service HTTP, voir inference.py)
+    # L'embedding de l'avant-dernière couche sort de la même passe (recherche de cas similaires)
+    analysis_entries, embeddings = inference.predict_radiographs(model, [image], with_embeddings=True)
+    analysis_data = analysis_entries[0]
+    st.session_state['last_radio_analysis'] = analysis_data
+    st.session_state['history'].append(analysis_data)
+    save_history()
+
+    # Le résultat est enregistré avant la recherche : un échec de celle-ci ne doit pas relancer l'analyse
+    result = {"upload": key, "analysis": analysis_data, "similar": [], "search_ms": None, "similar_failed": False}
+    st.session_state['radio_result'] = result
+    if analysis_data["predicted_disease"] != inference.NON_RADIOGRAPH_CLASS:
+        # Recherche avant l'ajout du cas courant à l'index ; un index incompatible (changement de modèle)
+        # ou une erreur disque ne fait jamais échouer l'analyse
+        try:
+            search_start = time.perf_counter()
+            with metrics.track("similar_cases_search"):
+                result["similar"] = similar_cases.search(embeddings[0], username=get_current_username())
+            result["search_ms"] = (time.perf_counter() - search_start) * 1000
+            similar_cases.add_cases(get_current_username(), [analysis_data], embeddings)
+        except Exception:
+            metrics.inc("similar_cases_failures_total")
+            result["similar_failed"] = True
+
+
+def render_results(result):
+    analysis_data = result["analysis"]
+    predicted_disease = analysis_data["predicted_disease"]
+    prediction_probability = analysis_data["prediction_probability"]
+
+    # Display results
+    if predicted_disease == inference.NON_RADIOGRAPH_CLASS:
+        st.error("Cette image n'est pas une image radiographie. Veuillez entrer une nouvelle image.")
+        # Optionally, prevent saving this specific analysis to history or PDF generation
+        # For now, it will be saved but with the error message shown prominently.
+        return
+    st.subheader(T("radio_predicted_disease"))
+    if predicted_disease == "Normal":
+        st.success(f"**{predicted_disease}**")
+    else:
+        st.warning(f"**{predicted_disease}**")
+
+    st.metric(label=T("radio_prediction_probability"), value=f"{prediction_probability:.2%}")
+
+    with st.expander(T("radio_details_expander")):
+        st.write(T("radio_all_probabilities"))
+        # Create a dictionary of disease: probability for display
+        prob_dict = {inference.DISEASE_MAP.get(i, "Unknown"): prob for i, prob in enumerate(analysis_data["all_predictions"])}
+        st.json(prob_dict)
+
+    # Le rapport n'est rendu qu'au clic sur le bouton, puis mis en cache ; le clic ne relance pas la page
+    st.download_button(
+        label=T("radio_download_pdf"),
+        data=functools.partial(get_pdf_report, analysis_data),
+        file_name=f"rapport_radiographie_{analysis_data['timestamp'].strftime('%Y%m%d_%H%M%S')}.pdf",
+        mime="application/pdf",
+        on_click="ignore"
+    )
+    report_stats = get_report_stats(analysis_data)
+    if report_stats:
+        st.caption(T("pdf_report_stats").format(seconds=report_stats["render_seconds"], kb=report_stats["size_bytes"] / 1024))
+
+    # --- Similar past cases ---
+    similar = result["similar"]
+    with st.expander(T("radio_similar_title"), expanded=bool(similar)):
+        if result["similar_failed"]:
+            st.warning(T("radio_similar_unavailable"))
+        elif similar:
+            st.dataframe([
+                {
+                    T("radio_similar_date"): case["timestamp"][:16].replace("T", " "),
+                    T("radio_similar_disease"): case["predicted_disease"],
+                    T("radio_similar_probability"): f"{case['prediction_probability']:.2%}",
+                    T("radio_similar_score"): f"{case['similarity']:.3f}",
+                }
+                for case in similar
+            ], hide_index=True)
+        else:
+            st.info(T("radio_similar_empty"))
+        if result["search_ms"] is not None:
+            st.caption(T("radio_similar_stats").format(ms=result["search_ms"]))
+
+
+# XAI : un clic ne relance que cette section, pas l'analyse
+@timed_fragment("radio_xai")
+def render_xai():
+    st.subheader(T("radio_xai_title"))
+    st.info(T("radio_xai_info"))
+    if st.button(T("radio_xai_button")):
+        st.warning(T("radio_xai_in_dev"))
+
+
 # --- Page Content ---
 st.title(T("radio_title"))
 st.markdown(T("radio_intro"))
@@ -44,70 +150,18 @@ with st.container():
     with col2:
         if uploaded_file is not None:
             st.subheader(T("radio_results_title"))
-            with st.spinner(T("radio_spinner")):
-                model = load_my_model()
-
-                if model is None:
-                    st.warning(T("radio_model_not_loaded"))
-                else:
-                    # --- New Model Logic ---
-                    DISEASE_MAP = {
-                        0: "Atelectasis", 1: "COVID19", 2: "Cardiomegaly", 3: "Consolidation",
-                        4: "Edema", 5: "Effusion", 6: "Emphysema", 7: "Fibrosis", 8:"Image_Nom_radiographique",
-                        9: "Infiltration", 10: "Mass", 11: "Nodule", 12: "Normal",
-                        13: "Pleural_Thickening", 14: "Pneumonia", 15: "Pneumothorax", 16: "Tuberculosis"
-                    }
-
-                    # Preprocess, predict, interpret...
-                    img_array = np.array(image.convert('RGB').resize((224, 224)))
-                    img_array = img_array / 255.0
-                    img_array = np.expand_dims(img_array, axis=0)
-                    
-                    predictions = model.predict(img_array)
-                    
-                    predicted_class_index = np.argmax(predictions, axis=1)[0]
-                    predicted_disease = DISEASE_MAP.get(predicted_class_index, "Unknown")
-                    prediction_probability = predictions[0][predicted_class_index]
-
-                    analysis_data = {
-                        "type": "Analyse Radiographique",
-                        "image": image,
-                        "predicted_disease": predicted_disease,
-                        "prediction_probability": float(prediction_probability),
-                        "all_predictions": predictions[0].tolist(),
-                        "timestamp": datetime.datetime.now()
-                    }
-                    st.session_state['last_radio_analysis'] = analysis_data
-                    st.session_state['history'].append(analysis_data)
-                    save_history()
-
-                    # Display results
-                    if predicted_disease == "Image_Nom_radiographique":
-                        st.error("Cette image n'est pas une image radiographie. Veuillez entrer une nouvelle image.")
-                        # Optionally, prevent saving this specific analysis to history or PDF generation
-                        # For now, it will be saved but with the error message shown prominently.
+            key = upload_key(uploaded_file)
+            result = st.session_state.get('radio_result')
+            if result is None or result["upload"] != key:
+                with st.spinner(T("radio_spinner")):
+                    model = load_my_model()
+                    if model is None:
+                        st.warning(T("radio_model_not_loaded"))
                     else:
-                        st.subheader(T("radio_predicted_disease"))
-                        if predicted_disease == "Normal":
-                            st.success(f"**{predicted_disease}**")
-                        else:
-                            st.warning(f"**{predicted_disease}**")
-                        
-                        st.metric(label=T("radio_prediction_probability"), value=f"{prediction_probability:.2%}")
-
-                        with st.expander(T("radio_details_expander")):
-                            st.write(T("radio_all_probabilities"))
-                            # Create a dictionary of disease: probability for display
-                            prob_dict = {DISEASE_MAP.get(i, "Unknown"): prob for i, prob in enumerate(predictions[0])}
-                            st.json(prob_dict)
-
-                        pdf_bytes = generate_pdf_report(analysis_data)
-                        st.download_button(
-                            label=T("radio_download_pdf"),
-                            data=pdf_bytes,
-                            file_name=f"rapport_radiographie_{analysis_data['timestamp'].strftime('%Y%m%d_%H%M%S')}.pdf",
-                            mime="application/pdf"
-                        )
+                        analyze_upload(model, image, key)
+                        result = st.session_state['radio_result']
+            if result is not None and result["upload"] == key:
+                render_results(result)
 
             st.info(T("radio_analysis_done"))
 
@@ -115,7 +169,6 @@ with st.container():
 if uploaded_file is not None: # Only show XAI if an image was uploaded
     st.markdown("---")
     with st.container():
-        st.subheader(T("radio_xai_title"))
-        st.info(T("radio_xai_info"))
-        if st.button(T("radio_xai_button")):
-            st.warning(T("radio_xai_in_dev"))
\ No newline at end of file
+        render_xai()
+
+rerun_timer.lap("page:page1")
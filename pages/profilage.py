@@ -0,0 +1,112 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# --- Authentication Check ---
+if not st.session_state.get("authentication_status"):
+    st.error("Veuillez vous connecter pour accéder à cette page. / Please log in to access this page.")
+    st.stop()
+
+# --- Translation Setup (only if authenticated) ---
+from app import get_text, is_admin
+T = get_text
+
+# --- Admin Check ---
+if not is_admin():
+    st.error(T("admin_forbidden"))
+    st.stop()
+
+st.title(T("profiling_title"))
+st.markdown(T("profiling_intro"))
+
+# --- Arm a page ---
+col_page, col_arm = st.columns([0.6, 0.4])
+with col_page:
+    page = st.selectbox(T("profiling_page_select"), options=profiling.profilable_pages())
+with col_arm:
+    st.write("")
+    if st.button(T("profiling_arm_button")):
+        profiling.arm(page, st.session_state.get("username"))
+
+armed = profiling.armed_pages()
+if armed:
+    st.info(T("profiling_armed").format(pages=", ".join(sorted(armed))))
+    if st.button(T("profiling_disarm_button")):
+        for armed_page in armed:
+            profiling.disarm(armed_page)
+        st.rerun()
+if st.button(T("profiling_refresh_button")):
+    st.rerun()
+
+st.markdown("---")
+
+# --- Recorded profiles ---
+profiles = profiling.list_profiles()
+if not profiles:
+    st.info(T("profiling_no_profiles"))
+    st.stop()
+
+profile = st.selectbox(
+    T("profiling_select_profile"), options=profiles,
+    format_func=lambda p: f"{p['created_at']} - {p['page']} - {p['username']} ({p['wall_seconds']:.2f} s)"
+)
+st.markdown(T("profiling_summary").format(
+    page=profile["page"], username=profile["username"], created_at=profile["created_at"],
+    seconds=profile["wall_seconds"], peak_mb=profile["peak_memory_mb"]
+))
+
+if profile["flame"]:
+    st.subheader(T("profiling_flame_title"))
+    flame = pd.DataFrame(profile["flame"])
+    flame["ms"] = (flame["seconds"] * 1000).round(2)
+    chart = alt.Chart(flame).mark_rect(stroke="white").encode(
+        x=alt.X("start:Q", axis=None, scale=alt.Scale(domain=[0, 1])),
+        x2="end:Q",
+        y=alt.Y("depth:O", axis=None, sort="descending"),
+        color=alt.Color("file:N", legend=alt.Legend(orient="bottom", columns=4)),
+        tooltip=["function", "file", "ms"],
+    ).properties(height=22 * (flame["depth"].max() + 1))
+    st.altair_chart(chart, use_container_width=True)
+
+col_functions, col_allocations = st.columns([0.6, 0.4])
+with col_functions:
+    st.subheader(T("profiling_functions_title"))
+    st.dataframe(pd.DataFrame([
+        {
+            T("profiling_col_function"): f["function"],
+            T("profiling_col_calls"): f["calls"],
+            T("profiling_col_own_ms"): round(f["own_seconds"] * 1000, 2),
+            T("profiling_col_cumulative_ms"): round(f["cumulative_seconds"] * 1000, 2),
+        }
+        for f in profile["functions"]
+    ]), use_container_width=True, hide_index=True)
+with col_allocations:
+    st.subheader(T("profiling_allocations_title"))
+    st.dataframe(pd.DataFrame([
+        {
+            T("profiling_col_location"): a["location"],
+            T("profiling_col_size_kb"): round(a["size_kb"], 1),
+            T("profiling_col_count"): a["count"],
+        }
+        for a in profile["allocations"]
+    ]), use_container_width=True, hide_index=True)
+
+col_prof, col_alloc = st.columns(2)
+with col_prof:
+    st.download_button(
+        label=T("profiling_download_prof"),
+        data=profiling.profile_file(profile["id"], ".prof"),
+        file_name=f"{profile['id']}.prof",
+        mime="application/octet-stream"
+    )
+with col_alloc:
+    st.download_button(
+        label=T("profiling_download_alloc"),
+        data=profiling.profile_file(profile["id"], ".alloc.txt"),
+        file_name=f"{profile['id']}.alloc.txt",
+        mime="text/plain"
+    )
@@ -0,0 +1,106 @@
+import streamlit as st
+import datetime
+import functools
+import uuid
+from app_shell import RerunTimer
+from pdf_generator import get_pdf_report
+from history_manager import save_history
+import history_store
+import metrics
+import symptom_engine
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
+
+# --- Authentication Check ---
+if not st.session_state.get("authentication_status"):
+    st.error("Veuillez vous connecter pour accéder à cette page. / Please log in to access this page.")
+    st.stop()
+
+# --- Translation Setup (only if authenticated) ---
+from app import get_text
+T = get_text
+rerun_timer = RerunTimer()
+
+st.title(T("symptoms_title"))
+st.markdown(T("symptoms_intro"))
+
+if 'symptoms_step' not in st.session_state:
+    st.session_state['symptoms_step'] = 1
+
+# --- Step 1: informations de base ---
+if st.session_state['symptoms_step'] == 1:
+    st.subheader(T("symptoms_step1_title"))
+    st.session_state['symptoms_age'] = st.number_input(
+        T("symptoms_age"), min_value=0, max_value=120, value=st.session_state.get('symptoms_age', 30), help=T("symptoms_age_help")
+    )
+    st.session_state['symptoms_weight'] = st.number_input(
+        T("symptoms_weight"), min_value=1.0, max_value=300.0, value=float(st.session_state.get('symptoms_weight', 70.0)),
+        step=0.5, help=T("symptoms_weight_help")
+    )
+    if st.button(T("symptoms_next_button")):
+        st.session_state['symptoms_step'] = 2
+        st.rerun()
+
+# --- Step 2: description et analyse ---
+else:
+    st.subheader(T("symptoms_step2_title"))
+    with st.form("symptoms_form"):
+        description = st.text_area(
+            T("symptoms_description"), value=st.session_state.get('symptoms_description', ""),
+            height=150, help=T("symptoms_description_help")
+        )
+        submit_button = st.form_submit_button(label=T("symptoms_submit_button"))
+    if st.button(T("symptoms_back_button")):
+        st.session_state['symptoms_step'] = 1
+        st.rerun()
+
+    if submit_button and description.strip():
+        st.session_state['symptoms_description'] = description
+        with metrics.track("symptom_analysis"):
+            analysis = symptom_engine.analyze(description, st.session_state.get('lang', 'fr'))
+        analysis_data = {
+            "analysis_id": uuid.uuid4().hex,
+            "type": history_store.TYPE_SYMPTOMS,
+            "age": st.session_state.get('symptoms_age'),
+            "weight": st.session_state.get('symptoms_weight'),
+            "symptoms": description,
+            "analysis": analysis,
+            "timestamp": datetime.datetime.now(),
+        }
+        st.session_state['last_symptom_analysis'] = analysis_data
+        if 'history' not in st.session_state:
+            st.session_state['history'] = []
+        st.session_state['history'].append(analysis_data)
+        save_history()
+
+    analysis_data = st.session_state.get('last_symptom_analysis')
+    if analysis_data and analysis_data.get('symptoms') == st.session_state.get('symptoms_description'):
+        analysis = analysis_data['analysis']
+        st.subheader(T("symptoms_results_title"))
+        show = {
+            symptom_engine.LEVEL_URGENT: st.error,
+            symptom_engine.LEVEL_CONSULT: st.warning,
+            symptom_engine.LEVEL_MILD: st.info,
+        }.get(analysis.get('level'), st.success)
+        show(analysis['recommendation'])
+        if analysis.get('severity_score'):
+            st.caption(T("symptoms_severity_score").format(score=analysis['severity_score']))
+
+        # Le rapport n'est rendu qu'au clic sur le bouton, puis mis en cache ; le clic ne relance pas la page
+        st.download_button(
+            label=T("download_report"),
+            data=functools.partial(get_pdf_report, analysis_data),
+            file_name=f"rapport_symptomes_{analysis_data['timestamp'].strftime('%Y%m%d_%H%M%S')}.pdf",
+            mime="application/pdf",
+            on_click="ignore"
+        )
+
+        st.markdown("---")
+        if st.button(T("symptoms_start_new_button")):
+            for key in ('symptoms_step', 'symptoms_age', 'symptoms_weight', 'symptoms_description'):
+                st.session_state.pop(key, None)
+            st.rerun()
+
+rerun_timer.lap("page:symptomes")
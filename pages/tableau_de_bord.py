@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
+import profiling
+
+# --- On-demand profiling (armé depuis la page Profilage, voir profiling.py) ---
+profiling.profile_rerun(__file__, globals())
 
 # --- Authentication Check ---
 if not st.session_state.get("authentication_status"):
@@ -9,24 +13,44 @@ if not st.session_state.get("authentication_status"):
 
 # --- Translation Setup (only if authenticated) ---
 from app import get_text
+from history_manager import flush_history, get_current_username
+import history_store
+import analytics_rollup
+import history_archive
+import analytics_timeseries
 T = get_text
 
 st.title(T("dashboard_analytics_title"))
 st.markdown(T("dashboard_analytics_intro"))
 
-if not st.session_state.get('history'):
+# --- Prepare data (agrégats précalculés, mis à jour à chaque nouvelle analyse) ---
+username = get_current_username()
+flush_history()
+conn = history_store.get_connection()
+
+rollups_missing = analytics_rollup.get_total(conn, username) is None and history_store.count_entries(username) > 0
+# Agrégats créés avant l'ajout de la dimension jour x maladie
+rollups_outdated = bool(analytics_rollup.get_counts(conn, username, analytics_rollup.DISEASE)) and not analytics_rollup.get_counts(conn, username, analytics_rollup.DAY_DISEASE)
+# Cohérence du total (base + archives) vérifiée une fois par version de l'historique, pas à chaque rerun
+generation = history_store.get_generation(username)
+rollups_inconsistent = False
+if st.session_state.get('rollups_checked_generation') != (username, generation):
+    archived_count = sum(segment['count'] for segment in history_archive.complete_segments(username))
+    rollups_inconsistent = not analytics_rollup.is_consistent(conn, username, archived_count)
+if st.button(T("dashboard_rebuild_rollups_button")) or rollups_missing or rollups_outdated or rollups_inconsistent:
+    # Reconstruction complète uniquement à la demande ou si les agrégats manquent / sont incohérents
+    analytics_rollup.rebuild(conn, username, history_archive.rollup_rows(username))
+st.session_state['rollups_checked_generation'] = (username, generation)
+
+if not analytics_rollup.get_total(conn, username):
     st.info(T("dashboard_history_empty"))
 else:
-    # --- Prepare data ---
-    df_history = pd.DataFrame(st.session_state['history'])
+    radio_counts = analytics_rollup.get_counts(conn, username, analytics_rollup.DISEASE)
+    symptom_counts = analytics_rollup.get_counts(conn, username, analytics_rollup.OUTCOME)
 
     # --- Radiography Analysis Chart ---
-    radio_analysis_df = df_history[df_history['type'] == "Analyse Radiographique"]
-    
-    if not radio_analysis_df.empty:
-        # Fill NaN values in 'predicted_disease' with 'Unknown' for charting
-        disease_counts = radio_analysis_df['predicted_disease'].fillna('Inconnu').value_counts().reset_index()
-        disease_counts.columns = ['Maladie', 'Fréquence']
+    if radio_counts:
+        disease_counts = pd.DataFrame(list(radio_counts.items()), columns=['Maladie', 'Fréquence'])
 
         st.subheader(T("dashboard_chart_radio_title"))
 
@@ -51,15 +75,16 @@ else:
     st.markdown("---")
 
     # --- Symptom Analysis Chart ---
-    symptom_analysis_df = df_history[df_history['type'] == "Analyse de Symptômes"]
-    
-    if not symptom_analysis_df.empty:
+    if symptom_counts.get("keywords_found") or symptom_counts.get("no_keywords"):
         # Determine outcome: 'Keywords Found' vs 'No Keywords Found'
-        # Need to handle potential nested dict for 'analysis' key and 'found_keywords'
-        outcome_counts = symptom_analysis_df['analysis'].apply(
-            lambda x: T("dashboard_chart_symptom_keywords_found") if x and x.get('found_keywords') else T("dashboard_chart_symptom_no_keywords")
-        ).value_counts().reset_index()
-        outcome_counts.columns = ['Résultat', 'Fréquence']
+        outcome_counts = pd.DataFrame(
+            [
+                (T("dashboard_chart_symptom_keywords_found"), symptom_counts.get("keywords_found", 0)),
+                (T("dashboard_chart_symptom_no_keywords"), symptom_counts.get("no_keywords", 0)),
+            ],
+            columns=['Résultat', 'Fréquence']
+        )
+        outcome_counts = outcome_counts[outcome_counts['Fréquence'] > 0]
 
         st.subheader(T("dashboard_chart_symptom_title"))
 
@@ -81,3 +106,47 @@ else:
     else:
         st.info(T("dashboard_chart_symptom_empty"))
 
+    st.markdown("---")
+
+    # --- Time series (calculées et sous-échantillonnées côté serveur) ---
+    st.subheader(T("dashboard_ts_disease_title"))
+    disease_series = analytics_timeseries.daily_counts_by_disease(conn, username)
+    if not disease_series.empty:
+        chart_disease_series = alt.Chart(disease_series).mark_bar().encode(
+            x=alt.X("date:T", title=T("dashboard_ts_date")),
+            y=alt.Y("count:Q", stack=True, title=T("dashboard_ts_count")),
+            color=alt.Color("disease:N", title=T("dashboard_chart_radio_legend")),
+            tooltip=["date:T", "disease:N", "count:Q"]
+        )
+        st.altair_chart(chart_disease_series, use_container_width=True)
+    else:
+        st.info(T("dashboard_chart_radio_empty"))
+
+    st.subheader(T("dashboard_ts_heart_title").format(days=analytics_timeseries.HEART_ROLLING_DAYS))
+    heart_trend = analytics_timeseries.heart_risk_trend(username)
+    if not heart_trend.empty:
+        heart_long = heart_trend.melt(id_vars="date", value_vars=["daily_mean", "rolling_mean"], var_name="serie", value_name="probability")
+        heart_long["serie"] = heart_long["serie"].map({"daily_mean": T("dashboard_ts_daily_mean"), "rolling_mean": T("dashboard_ts_rolling_mean")})
+        chart_heart = alt.Chart(heart_long).mark_line(point=True).encode(
+            x=alt.X("date:T", title=T("dashboard_ts_date")),
+            y=alt.Y("probability:Q", axis=alt.Axis(format="%"), scale=alt.Scale(domain=[0, 1]), title=T("dashboard_ts_probability")),
+            color=alt.Color("serie:N", title=""),
+            tooltip=["date:T", "serie:N", alt.Tooltip("probability:Q", format=".1%")]
+        )
+        st.altair_chart(chart_heart, use_container_width=True)
+    else:
+        st.info(T("dashboard_ts_heart_empty"))
+
+    st.subheader(T("dashboard_ts_confidence_title"))
+    confidence = analytics_timeseries.confidence_distribution(username)
+    if not confidence.empty:
+        chart_confidence = alt.Chart(confidence).mark_bar(opacity=0.7).encode(
+            x=alt.X("bin_start:Q", bin="binned", axis=alt.Axis(format="%"), title=T("radio_prediction_probability")),
+            x2="bin_end:Q",
+            y=alt.Y("count:Q", stack=None, title=T("dashboard_ts_count")),
+            color=alt.Color("type:N", title=""),
+            tooltip=["type:N", alt.Tooltip("bin_start:Q", format=".0%"), alt.Tooltip("bin_end:Q", format=".0%"), "count:Q"]
+        )
+        st.altair_chart(chart_confidence, use_container_width=True)
+    else:
+        st.info(T("dashboard_ts_confidence_empty"))
@@ -0,0 +1,130 @@
+import contextlib
+import multiprocessing
+import os
+import sys
+import threading
+import types
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pdf_generator import PDF, generate_pdf_report, render_analysis
+
+# Génération de rapports PDF en lot à partir d'entrées d'historique.
+# - ZIP : un PDF par analyse, rendus en parallèle dans des processus et écrits dans l'archive au fil de l'eau.
+# - Document fusionné : un seul PDF multi-pages avec table des matières, rendu dans un processus séparé
+#   (fpdf2 ne sait pas fusionner des PDF déjà produits, un document ne peut donc pas être réparti).
+
+# --- Constants ---
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_IN_FLIGHT_PER_WORKER = 2  # borne la mémoire : au plus N rapports rendus en attente d'écriture
+
+_main_lock = threading.Lock()
+
+TYPE_TITLES = {
+    'Analyse Radiographique': "Analyse Radiographique",
+    'Analyse de Symptômes': "Analyse de Symptômes",
+    'heart_disease_prediction': "Prédiction de Maladies Cardiaques",
+}
+
+
+def report_file_name(index, entry):
+    """Nom du fichier PDF d'une entrée dans l'archive ZIP."""
+    timestamp = entry.get('timestamp')
+    stamp = timestamp.strftime('%Y%m%d_%H%M%S') if timestamp else "sans_date"
+    kind = {'Analyse Radiographique': "radiographie", 'Analyse de Symptômes': "symptomes"}.get(entry['type'], "maladie_cardiaque")
+    return f"{index + 1:04d}_rapport_{kind}_{stamp}.pdf"
+
+
+def _strip_entry(entry):
+    # Les images ne sont pas envoyées aux processus de rendu (coût de sérialisation)
+    return {key: value for key, value in entry.items() if key != 'image'}
+
+
+@contextlib.contextmanager
+def _process_pool(max_workers):
+    """Pool de processus « spawn » dont les workers ne ré-exécutent pas la page Streamlit en cours.
+
+    Jamais de fork : le serveur est multithreadé (écriture différée, SQLite, TensorFlow, verrou des métriques).
+    Mais Streamlit remplace `__main__` par la page exécutée, que « spawn » relancerait dans chaque worker,
+    hors contexte Streamlit (où elle échoue à l'import). Tous les workers sont donc démarrés d'emblée
+    avec un `__main__` neutre, sans `__file__`, puis la page est rétablie.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        with _main_lock:
+            page_main = sys.modules['__main__']
+            neutral_main = types.ModuleType('__main__')
+            sys.modules['__main__'] = neutral_main
+            try:
+                # Chaque soumission sans worker libre en démarre un : les N premières lancent tout le pool
+                for _ in range(max_workers):
+                    executor.submit(os.getpid)
+            finally:
+                # Une autre session a pu installer sa propre page entre-temps : elle n'est pas écrasée
+                if sys.modules['__main__'] is neutral_main:
+                    sys.modules['__main__'] = page_main
+        yield executor
+
+
+def _render_one(entry):
+    return generate_pdf_report(entry)
+
+
+def write_zip(entries, output_path, progress=None, max_workers=MAX_WORKERS):
+    """Rend chaque entrée en PDF dans un pool de processus et les écrit dans un ZIP au fur et à mesure.
+
+    `progress(fait, total)` est appelé après chaque rapport écrit. Retourne le nombre de rapports.
+    """
+    total = len(entries)
+    done = 0
+    max_in_flight = max_workers * MAX_IN_FLIGHT_PER_WORKER
+    with _process_pool(max_workers) as executor, \
+            zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        pending = {}
+        next_index = 0
+        while next_index < total or pending:
+            while next_index < total and len(pending) < max_in_flight:
+                future = executor.submit(_render_one, _strip_entry(entries[next_index]))
+                pending[future] = next_index
+                next_index += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                archive.writestr(report_file_name(index, entries[index]), future.result())
+                done += 1
+                if progress:
+                    progress(done, total)
+    return done
+
+
+def _render_toc(pdf, outline):
+    pdf.section_title("Table des matières")
+    pdf.set_font('Arial', '', 10)
+    for section in outline:
+        pdf.cell(pdf.w - pdf.l_margin - pdf.r_margin - 20, 7, section.name, 0, 0, 'L', link=pdf.add_link(page=section.page_number))
+        pdf.cell(20, 7, str(section.page_number), 0, 1, 'R')
+
+
+def _render_merged(entries):
+    pdf = PDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    # Environ 30 lignes par page de sommaire
+    pdf.insert_toc_placeholder(_render_toc, pages=max(1, (len(entries) + 29) // 30))
+    for entry in entries:
+        timestamp = entry.get('timestamp')
+        date = timestamp.strftime('%d/%m/%Y %H:%M') if timestamp else ""
+        render_analysis(pdf, entry, section_name=f"{TYPE_TITLES.get(entry['type'], entry['type'])} - {date}")
+    return bytes(pdf.output())
+
+
+def write_merged(entries, output_path, progress=None):
+    """Rend toutes les entrées dans un seul PDF avec table des matières, hors du thread Streamlit."""
+    if progress:
+        progress(0, len(entries))
+    with _process_pool(1) as executor:
+        pdf_bytes = executor.submit(_render_merged, [_strip_entry(entry) for entry in entries]).result()
+    with open(output_path, 'wb') as f:
+        f.write(pdf_bytes)
+    if progress:
+        progress(len(entries), len(entries))
+    return len(entries)
@@ -1,11 +1,20 @@
 from fpdf import FPDF
-from PIL import Image
+from collections import OrderedDict
 import io
+import threading
+import time
+import metrics
 
 # --- Constants ---
 PRIMARY_COLOR = (70, 130, 180)  # SteelBlue
 SECONDARY_COLOR = (220, 220, 220) # Gainsboro
 
+# À incrémenter à chaque changement de mise en page : invalide les rapports en cache
+REPORT_TEMPLATE_VERSION = 2
+REPORT_CACHE_SIZE = 64
+REPORT_IMAGE_MAX_SIZE = (800, 800)  # ~80 mm à 250 dpi, largement suffisant pour le rapport
+REPORT_IMAGE_QUALITY = 85
+
 class PDF(FPDF):
     def header(self):
         self.set_font('Arial', 'B', 16)
@@ -32,11 +41,31 @@ class PDF(FPDF):
         self.line(self.l_margin, self.get_y(), self.w - self.r_margin, self.get_y())
         self.ln(5)
 
+def prepare_report_image(image):
+    """Réduit l'image et l'encode une seule fois en JPEG. Retourne (tampon JPEG, (largeur, hauteur))."""
+    report_image = image.convert('RGB') if image.mode not in ('RGB', 'L') else image.copy()
+    report_image.thumbnail(REPORT_IMAGE_MAX_SIZE)
+    buffer = io.BytesIO()
+    report_image.save(buffer, format='JPEG', quality=REPORT_IMAGE_QUALITY, optimize=True)
+    buffer.seek(0)
+    return buffer, report_image.size
+
+@metrics.timed("pdf_report")
 def generate_pdf_report(analysis_data):
     pdf = PDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    render_analysis(pdf, analysis_data)
+    return bytes(pdf.output())
+
+def render_analysis(pdf, analysis_data, section_name=None):
+    """Ajoute au document une nouvelle page contenant le rapport d'une analyse.
+
+    `section_name` ajoute une entrée au sommaire du document (rapports groupés).
+    """
     pdf.add_page()
+    if section_name:
+        pdf.start_section(section_name)
     pdf.set_font('Arial', '', 11)
-    pdf.set_auto_page_break(auto=True, margin=15)
 
     page_width = pdf.w - pdf.l_margin - pdf.r_margin
 
@@ -55,13 +84,8 @@ def generate_pdf_report(analysis_data):
 
         # --- Main Results & Image ---
         if 'image' in analysis_data:
-            # Save image to buffer to get its properties and display it
-            img_buffer = io.BytesIO()
-            analysis_data['image'].save(img_buffer, format='PNG')
-            img_buffer.seek(0)
-            
-            with Image.open(img_buffer) as img:
-                width, height = img.size
+            # Downscaled JPEG stream, embedded as-is by fpdf2 (no lossless re-encode)
+            img_buffer, (width, height) = prepare_report_image(analysis_data['image'])
             
             aspect_ratio = height / width
             image_w = 80 # Define a fixed width for the image
@@ -69,9 +93,10 @@ def generate_pdf_report(analysis_data):
             
             # Draw image on the left
             img_y_pos = pdf.get_y()
-            pdf.image(img_buffer, x=pdf.l_margin, y=img_y_pos, w=image_w, h=image_h, type='PNG')
+            pdf.image(img_buffer, x=pdf.l_margin, y=img_y_pos, w=image_w, h=image_h)
         else:
             image_h = 0
+            img_y_pos = pdf.get_y()
 
         # --- Results on the right ---
         results_x_pos = pdf.l_margin + image_w + 10 if 'image' in analysis_data else pdf.l_margin
@@ -163,4 +188,35 @@ def generate_pdf_report(analysis_data):
         pdf.multi_cell(page_width, 7, f"Probabilité de maladie cardiaque : {analysis_data['prediction_probability_positive']:.2%}")
         pdf.multi_cell(page_width, 7, f"Probabilité de non-maladie cardiaque : {analysis_data['prediction_probability_negative']:.2%}")
 
-    return bytes(pdf.output())
\ No newline at end of file
+# --- Report cache ---
+_report_cache = OrderedDict()  # (clé d'analyse, version du modèle) -> (octets, secondes de rendu)
+_report_cache_lock = threading.Lock()
+
+def _report_key(analysis_data):
+    timestamp = analysis_data.get('timestamp')
+    analysis_key = analysis_data.get('analysis_id') or (analysis_data['type'], str(timestamp))
+    return analysis_key, REPORT_TEMPLATE_VERSION
+
+def get_pdf_report(analysis_data):
+    """Retourne le rapport PDF d'une analyse, rendu au premier appel puis servi depuis le cache."""
+    key = _report_key(analysis_data)
+    with _report_cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key][0]
+    start = time.perf_counter()
+    pdf_bytes = generate_pdf_report(analysis_data)
+    render_seconds = time.perf_counter() - start
+    with _report_cache_lock:
+        _report_cache[key] = (pdf_bytes, render_seconds)
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return pdf_bytes
+
+def get_report_stats(analysis_data):
+    """Retourne {'render_seconds', 'size_bytes'} si le rapport a déjà été rendu, sinon None."""
+    with _report_cache_lock:
+        cached = _report_cache.get(_report_key(analysis_data))
+    if cached is None:
+        return None
+    return {"render_seconds": cached[1], "size_bytes": len(cached[0])}
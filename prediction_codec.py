@@ -0,0 +1,25 @@
+import numpy as np
+
+# --- Constants ---
+# Le premier octet du blob identifie le type des valeurs qui suivent (little-endian)
+DTYPE_CODES = {
+    1: np.dtype('<f4'),  # float32 : 4 octets par probabilité (défaut)
+    2: np.dtype('<f2'),  # float16 : 2 octets, précision ~1e-3, suffisante pour l'affichage
+}
+DEFAULT_DTYPE_CODE = 1
+
+
+def encode_vector(values, dtype_code=DEFAULT_DTYPE_CODE):
+    """Encode un vecteur de probabilités en octets compacts (en-tête d'un octet + valeurs brutes)."""
+    array = np.asarray(values, dtype=DTYPE_CODES[dtype_code])
+    return bytes([dtype_code]) + array.tobytes()
+
+
+def decode_vector(blob):
+    """Décode un blob produit par `encode_vector` directement en tableau NumPy (sans flottants Python)."""
+    if blob is None:
+        return None
+    dtype = DTYPE_CODES.get(blob[0])
+    if dtype is None:
+        raise ValueError(f"Code de type inconnu pour un vecteur de prédictions : {blob[0]}")
+    return np.frombuffer(blob, dtype=dtype, offset=1)
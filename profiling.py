@@ -0,0 +1,204 @@
+import cProfile
+import datetime
+import glob
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+# Profilage à la demande d'un rerun de page, activé par un administrateur (page « Profilage »)
+# sans redéploiement. Chaque page appelle `profile_rerun(__file__, globals())` en tête : si la page
+# est armée, ce rerun (celui du prochain utilisateur qui l'affiche) est rejoué sous cProfile
+# et tracemalloc, puis le reste du script d'origine est ignoré.
+# Résultats dans PROFILES_DIR : <id>.prof (pstats, lisible par snakeviz), <id>.alloc.txt
+# (principales allocations) et <id>.json (résumé affiché dans l'application, avec le graphe en flammes).
+
+# --- Constants ---
+PROFILES_DIR = "profiles"
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+MAX_PROFILES = 50
+FLAME_MAX_DEPTH = 14
+FLAME_MIN_FRACTION = 0.005  # les appels de moins de 0,5 % du rerun ne sont pas dessinés
+
+_lock = threading.Lock()
+_armed = {}  # nom du script -> {'requested_by', 'requested_at'}
+_local = threading.local()
+
+
+def page_name(path):
+    return os.path.basename(path)
+
+
+def profilable_pages():
+    """Scripts de l'application : app.py puis les pages."""
+    return ["app.py"] + sorted(page_name(path) for path in glob.glob(os.path.join("pages", "*.py")))
+
+
+def arm(page, requested_by):
+    """Profile le prochain rerun de `page`, quelle que soit la session qui l'exécute."""
+    with _lock:
+        _armed[page] = {"requested_by": requested_by, "requested_at": time.time()}
+
+
+def disarm(page):
+    with _lock:
+        _armed.pop(page, None)
+
+
+def armed_pages():
+    with _lock:
+        return dict(_armed)
+
+
+def _take_request(page):
+    with _lock:
+        return _armed.pop(page, None)
+
+
+def profile_rerun(path, script_globals):
+    """Point d'accroche en tête de script : rejoue ce rerun sous profilage si la page est armée.
+
+    Le rerun profilé est exécuté en entier ici ; `st.stop()` termine ensuite le script d'origine.
+    """
+    # Seuls les scripts lancés par Streamlit comptent (pas `from app import ...` depuis une page)
+    if getattr(_local, "active", False) or not _armed or script_globals.get("__name__") != "__main__":
+        return
+    page = page_name(path)
+    request = _take_request(page)
+    if request is None:
+        return
+    with open(path, encoding="utf-8") as f:
+        code = compile(f.read(), path, "exec")
+    _local.active = True
+    profiler = cProfile.Profile()
+    # tracemalloc est global : les allocations des autres sessions pendant ce rerun sont aussi comptées
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        exec(code, script_globals)
+    finally:
+        profiler.disable()
+        wall_seconds = time.perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if not was_tracing:
+            tracemalloc.stop()
+        _local.active = False
+        _save(page, path, request, profiler, before, after, wall_seconds, peak)
+    st.stop()
+
+
+# --- Reports ---
+def _function_label(func):
+    filename, line, name = func
+    if filename == "~":  # fonction native
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def _flame_rects(stats, root):
+    """Rectangles d'un graphe en flammes reconstruit depuis le graphe d'appels de cProfile.
+
+    cProfile ne garde que les paires appelant -> appelé : la largeur d'un nœud est le temps cumulé
+    de cette arête, ce qui suffit à repérer les branches coûteuses.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    total = stats.stats[root][3] or 1e-9
+    rects = []
+
+    def walk(func, start, width, depth, path):
+        rects.append({
+            "function": _function_label(func), "file": os.path.basename(func[0]),
+            "depth": depth, "start": start / total, "end": (start + width) / total, "seconds": width,
+        })
+        if depth >= FLAME_MAX_DEPTH:
+            return
+        offset = start
+        for child, seconds in sorted(callees.get(func, []), key=lambda item: -item[1]):
+            seconds = min(seconds, start + width - offset)
+            if seconds < total * FLAME_MIN_FRACTION or child in path:
+                continue
+            walk(child, offset, seconds, depth + 1, path | {child})
+            offset += seconds
+
+    walk(root, 0.0, total, 0, {root})
+    return rects
+
+
+def _save(page, path, request, profiler, before, after, wall_seconds, peak):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    username = st.session_state.get("username") or "anonymous"
+    profile_id = f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{os.path.splitext(page)[0]}_{username}"
+    base = os.path.join(PROFILES_DIR, profile_id)
+    profiler.dump_stats(f"{base}.prof")
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+    root = next((func for func in stats.stats if func[0] == path and func[2] == "<module>"), None)
+
+    allocations = after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+    with open(f"{base}.alloc.txt", "w", encoding="utf-8") as f:
+        f.write(f"{page} - {username} - pic {peak / (1024 * 1024):.1f} Mo\n")
+        for stat in allocations:
+            f.write(f"{stat}\n")
+
+    summary = {
+        "id": profile_id,
+        "page": page,
+        "username": username,
+        "requested_by": request["requested_by"],
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": wall_seconds,
+        "peak_memory_mb": peak / (1024 * 1024),
+        "functions": [
+            {"function": _function_label(func), "calls": nc, "own_seconds": tt, "cumulative_seconds": ct}
+            for func, (_, nc, tt, ct, _) in functions
+        ],
+        "allocations": [
+            {"location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+             "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+            for stat in allocations
+        ],
+        "flame": _flame_rects(stats, root) if root else [],
+    }
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+    _prune()
+
+
+def _prune():
+    summaries = sorted(glob.glob(os.path.join(PROFILES_DIR, "*.json")))
+    for summary_path in summaries[:-MAX_PROFILES]:
+        base = summary_path[:-len(".json")]
+        for suffix in (".json", ".prof", ".alloc.txt"):
+            if os.path.exists(base + suffix):
+                os.remove(base + suffix)
+
+
+def list_profiles():
+    """Résumés des profils enregistrés, du plus récent au plus ancien."""
+    profiles = []
+    for summary_path in sorted(glob.glob(os.path.join(PROFILES_DIR, "*.json")), reverse=True):
+        with open(summary_path, encoding="utf-8") as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def profile_file(profile_id, suffix):
+    """Contenu brut d'un fichier de profil ('.prof' ou '.alloc.txt'), pour téléchargement."""
+    with open(os.path.join(PROFILES_DIR, f"{os.path.basename(profile_id)}{suffix}"), "rb") as f:
+        return f.read()
@@ -0,0 +1,300 @@
+import argparse
+import glob
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import inference
+
+# Banc d'essai du modèle de radiographie (model_diagnostic_medical.h5) sur la machine courante.
+# Mesure de bout en bout, des octets du fichier aux probabilités : décodage + redimensionnement,
+# mise en lot, prédiction. Pour chaque réglage de threads TensorFlow (intra-op / inter-op, fixés au
+# démarrage du runtime : un processus par réglage), chaque moteur disponible, chaque chemin de
+# décodage et chaque taille de lot : images/s et percentiles de latence d'un lot.
+# Chaque combinaison est comparée au chemin de production (Keras + PIL) : part de classes identiques.
+# Usage : python radio_benchmark.py [--images dossier/] [--batch-sizes 1 4 16] [--json bench.json]
+# Seuls les réglages du chemin de production (Keras + PIL, lots d'au plus MAX_BATCH["radiography"] du
+# service HTTP) peuvent être recommandés : les autres moteurs et décodages sont mesurés à titre indicatif
+# et marqués « non déployable ». Le réglage recommandé s'applique avec MEDAPP_TF_INTRA_THREADS /
+# MEDAPP_TF_INTER_THREADS (voir inference.py).
+
+# --- Constants ---
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+DEFAULT_ITERATIONS = 20  # lots mesurés par combinaison
+WARMUP_BATCHES = 3
+SYNTHETIC_IMAGES = 16
+PERCENTILES = (50, 90, 99)
+MIN_AGREEMENT = 0.99  # un réglage qui change les classes prédites n'est pas recommandé
+BACKENDS = ("keras-predict", "keras-call", "tflite", "onnxruntime")
+DECODERS = ("pil", "pil-draft", "opencv")
+# Chemin effectivement utilisé par les pages et le service HTTP (voir inference.predict_radiographs)
+PRODUCTION_BACKEND = "keras-predict"
+PRODUCTION_DECODER = "pil"
+PRODUCTION_MAX_BATCH = 16  # MAX_BATCH["radiography"] dans inference_api.py
+
+
+# --- Inputs ---
+def load_samples(directory=None, count=SYNTHETIC_IMAGES):
+    """Octets des images du dossier (.png/.jpg), ou radiographies synthétiques en JPEG et PNG."""
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.png")) + glob.glob(os.path.join(directory, "*.jp*g")))
+        if not paths:
+            raise SystemExit(f"Aucune image .png/.jpg dans {directory}")
+        samples = []
+        for path in paths:
+            with open(path, "rb") as f:
+                samples.append(f.read())
+        return samples
+    rng = np.random.default_rng(0)
+    samples = []
+    for i in range(count):
+        # Dégradé + bruit à la taille d'une radiographie numérisée (un JPEG compressé comme un vrai cliché)
+        gradient = np.linspace(0, 200, 1024, dtype=np.float32)[None, :] + rng.normal(0, 20, (1024, 1024))
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(gradient, 0, 255).astype(np.uint8)).save(buffer, format="JPEG" if i % 2 else "PNG", quality=90)
+        samples.append(buffer.getvalue())
+    return samples
+
+
+def _decode_pil(data):
+    # Chemin de production (pages et service HTTP)
+    return inference.preprocess_radiograph(Image.open(io.BytesIO(data)))
+
+
+def _decode_pil_draft(data):
+    # JPEG : décodage directement à une échelle réduite (1/2, 1/4, 1/8) avant le redimensionnement
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", inference.RADIO_IMAGE_SIZE)
+    return inference.preprocess_radiograph(image)
+
+
+def _decode_opencv(data):
+    import cv2
+    array = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    array = cv2.cvtColor(array, cv2.COLOR_BGR2RGB)
+    return cv2.resize(array, inference.RADIO_IMAGE_SIZE, interpolation=cv2.INTER_LINEAR).astype(np.float32) / 255.0
+
+
+_DECODE = {"pil": _decode_pil, "pil-draft": _decode_pil_draft, "opencv": _decode_opencv}
+
+
+def available_decoders():
+    return [name for name in DECODERS if name != "opencv" or importlib.util.find_spec("cv2")]
+
+
+def available_backends():
+    backends = []
+    if importlib.util.find_spec("tensorflow"):
+        backends += ["keras-predict", "keras-call", "tflite"]
+        if importlib.util.find_spec("tf2onnx") and importlib.util.find_spec("onnxruntime"):
+            backends.append("onnxruntime")
+    return backends
+
+
+# --- Backends (construits dans le processus de mesure) ---
+def _make_backend(name, model, intra, inter):
+    if name == "keras-predict":
+        return lambda batch: model.predict(batch, verbose=0)
+    if name == "keras-call":
+        # Appel direct : évite la mise en place de model.predict, coûteuse pour les petits lots
+        return lambda batch: model(batch, training=False).numpy()
+    if name == "tflite":
+        import tensorflow as tf
+        interpreter = tf.lite.Interpreter(
+            model_content=tf.lite.TFLiteConverter.from_keras_model(model).convert(),
+            num_threads=intra or None
+        )
+        input_index = interpreter.get_input_details()[0]["index"]
+        output_index = interpreter.get_output_details()[0]["index"]
+        allocated = {"shape": None}
+
+        def predict(batch):
+            if allocated["shape"] != batch.shape:
+                interpreter.resize_tensor_input(input_index, batch.shape)
+                interpreter.allocate_tensors()
+                allocated["shape"] = batch.shape
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)
+        return predict
+    if name == "onnxruntime":
+        import onnxruntime
+        import tf2onnx
+        proto, _ = tf2onnx.convert.from_keras(model)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra
+        options.inter_op_num_threads = inter
+        session = onnxruntime.InferenceSession(proto.SerializeToString(), options, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        return lambda batch: session.run(None, {input_name: batch})[0]
+    raise ValueError(f"Moteur inconnu : {name}")
+
+
+def _batches(samples, batch_size):
+    index = 0
+    while True:
+        yield [samples[(index + i) % len(samples)] for i in range(batch_size)]
+        index += batch_size
+
+
+def _measure(predict, decode, samples, batch_size, iterations):
+    batches = _batches(samples, batch_size)
+    for _ in range(WARMUP_BATCHES):
+        predict(np.stack([decode(data) for data in next(batches)]))
+    latencies = []
+    for _ in range(iterations):
+        files = next(batches)
+        start = time.perf_counter()
+        np.asarray(predict(np.stack([decode(data) for data in files])))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _run_thread_setting(model_path, samples, intra, inter, backends, decoders, batch_sizes, iterations):
+    """Processus de mesure pour un réglage de threads (0 : valeur par défaut de TensorFlow)."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+    model = tf.keras.models.load_model(model_path)
+    reference_batch = np.stack([_decode_pil(data) for data in samples])
+    reference = np.argmax(model.predict(reference_batch, verbose=0), axis=1)
+
+    results = []
+    for backend in backends:
+        try:
+            predict = _make_backend(backend, model, intra, inter)
+        except Exception as e:
+            results.append({"intra_op": intra, "inter_op": inter, "backend": backend, "skipped": str(e)})
+            continue
+        for decoder in decoders:
+            decode = _DECODE[decoder]
+            agreement = float(np.mean(
+                np.argmax(np.asarray(predict(np.stack([decode(data) for data in samples]))), axis=1) == reference
+            ))
+            for batch_size in batch_sizes:
+                latencies = _measure(predict, decode, samples, batch_size, iterations)
+                results.append({
+                    "intra_op": intra, "inter_op": inter, "backend": backend, "decoder": decoder,
+                    "batch_size": batch_size, "deployable": is_deployable(backend, decoder, batch_size),
+                    "images_per_second": batch_size * len(latencies) / sum(latencies),
+                    **{f"p{p}_ms": float(np.percentile(latencies, p)) * 1000 for p in PERCENTILES},
+                    "agreement": agreement,
+                })
+    return results
+
+
+# --- Report ---
+def host_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "usable_cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def is_deployable(backend, decoder, batch_size):
+    """Combinaison que la production exécute réellement (seuls les threads TensorFlow sont réglables)."""
+    return backend == PRODUCTION_BACKEND and decoder == PRODUCTION_DECODER and batch_size <= PRODUCTION_MAX_BATCH
+
+
+def recommend(results):
+    """Meilleur réglage interactif (p90 au lot de 1) et meilleur débit, parmi les combinaisons déployables
+    qui ne changent pas les classes."""
+    valid = [r for r in results if "skipped" not in r and r["deployable"] and r["agreement"] >= MIN_AGREEMENT]
+    interactive = [r for r in valid if r["batch_size"] == 1]
+    recommended = {}
+    if interactive:
+        recommended["interactive"] = min(interactive, key=lambda r: r["p90_ms"])
+    if valid:
+        recommended["throughput"] = max(valid, key=lambda r: r["images_per_second"])
+    for config in recommended.values():
+        config["environment"] = {
+            "MEDAPP_TF_INTRA_THREADS": str(config["intra_op"]),
+            "MEDAPP_TF_INTER_THREADS": str(config["inter_op"]),
+        }
+    return recommended
+
+
+def run(model_path=inference.RADIO_MODEL_PATH, images=None, batch_sizes=DEFAULT_BATCH_SIZES, intra_threads=None,
+        inter_threads=(0, 1, 2), backends=None, decoders=None, iterations=DEFAULT_ITERATIONS):
+    """Lance toutes les combinaisons et retourne le rapport (dictionnaire sérialisable en JSON)."""
+    if not os.path.exists(model_path):
+        raise SystemExit(f"Modèle introuvable : {model_path}")
+    backends = backends or available_backends()
+    if not backends:
+        raise SystemExit("Aucun moteur disponible : TensorFlow n'est pas installé.")
+    decoders = decoders or available_decoders()
+    cpus = host_info()["usable_cpus"] or 1
+    intra_threads = intra_threads or sorted({0, 1, max(1, cpus // 2), cpus})
+    samples = load_samples(images)
+    results = []
+    # Un processus neuf par réglage : TensorFlow fige ses pools de threads à l'initialisation
+    context = multiprocessing.get_context("spawn")
+    for intra in intra_threads:
+        for inter in inter_threads:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results += executor.submit(
+                    _run_thread_setting, model_path, samples, intra, inter, backends, decoders, batch_sizes, iterations
+                ).result()
+    return {
+        "host": host_info(),
+        "model": model_path,
+        "samples": len(samples),
+        "source": images or "synthetic",
+        "results": results,
+        "recommended": recommend(results),
+    }
+
+
+def _print_report(report):
+    print(f"{report['host']['processor']} - {report['host']['usable_cpus']} CPU - {report['samples']} image(s) ({report['source']})")
+    header = (f"{'intra':>6}{'inter':>6}  {'moteur':<14}{'décodage':<10}{'lot':>5}{'img/s':>9}"
+              f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'accord':>8}  déployable")
+    print(header)
+    print("-" * len(header))
+    for r in report["results"]:
+        if "skipped" in r:
+            print(f"{r['intra_op']:>6}{r['inter_op']:>6}  {r['backend']:<14}ignoré : {r['skipped'][:60]}")
+            continue
+        print(f"{r['intra_op']:>6}{r['inter_op']:>6}  {r['backend']:<14}{r['decoder']:<10}{r['batch_size']:>5}"
+              f"{r['images_per_second']:>9.1f}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['agreement']:>8.0%}  "
+              f"{'oui' if r['deployable'] else 'non'}")
+    for use, config in report["recommended"].items():
+        print(f"Recommandé ({use}) : {config['backend']}, décodage {config['decoder']}, lot de {config['batch_size']}, "
+              f"threads intra {config['intra_op']} / inter {config['inter_op']} "
+              f"({config['images_per_second']:.1f} img/s, p90 {config['p90_ms']:.1f} ms)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du modèle de radiographie sur cette machine.")
+    parser.add_argument("--model", default=inference.RADIO_MODEL_PATH)
+    parser.add_argument("--images", help="Dossier d'images .png/.jpg (sinon images synthétiques)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--intra-threads", type=int, nargs="+", help="Threads intra-op à essayer (0 : défaut TensorFlow)")
+    parser.add_argument("--inter-threads", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS)
+    parser.add_argument("--decoders", nargs="+", choices=DECODERS)
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--json", help="Écrire le rapport dans ce fichier JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args.model, args.images, args.batch_sizes, args.intra_threads, args.inter_threads,
+                 args.backends, args.decoders, args.iterations)
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+import history_store
+from history_writer import InterProcessLock
+
+# Recherche de cas similaires parmi les radiographies déjà analysées.
+# Chaque analyse ajoute l'embedding de l'avant-dernière couche du modèle (calculé pendant la même passe
+# que la prédiction, voir inference.predict_radiographs) à une matrice float32 sur disque, en ajout seul,
+# lue par np.memmap : rien n'est chargé en mémoire au-delà des lignes parcourues. Les métadonnées
+# (utilisateur, maladie prédite, probabilité, date) sont dans la table `radio_embeddings` de history.db.
+# Recherche exacte (produits scalaires vectorisés sur des vecteurs normalisés) ; au-delà de
+# EXACT_SEARCH_LIMIT candidats, recherche approchée par listes inversées (k-moyennes sphériques) :
+# seules les IVF_PROBES listes les plus proches de la requête sont parcourues.
+# Usage : python similar_cases.py stats | build-ivf | benchmark --rows 200000
+
+# --- Constants ---
+INDEX_DIR = "embeddings"
+VECTORS_PATH = os.path.join(INDEX_DIR, "radiographs.f32")
+CENTROIDS_PATH = os.path.join(INDEX_DIR, "radiographs.centroids.npy")
+LOCK_PATH = os.path.join(INDEX_DIR, "radiographs.lock")
+DEFAULT_TOP_K = 5
+EXACT_SEARCH_LIMIT = 50_000
+IVF_PROBES = 8
+IVF_TRAINING_SAMPLE = 20_000
+IVF_ITERATIONS = 10
+ASSIGN_CHUNK_ROWS = 65_536
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS radio_embeddings (
+    row INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    analysis_id TEXT,
+    predicted_disease TEXT,
+    probability REAL,
+    timestamp TEXT,
+    list_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_radio_embeddings_user_list ON radio_embeddings(username, list_id, row);
+CREATE INDEX IF NOT EXISTS idx_radio_embeddings_list ON radio_embeddings(list_id, row);
+"""
+
+_local = threading.local()
+_matrix_lock = threading.Lock()
+_matrix = {"rows": 0, "dim": None, "file": None, "array": None}
+_centroids = {"mtime": None, "array": None}
+
+
+def get_connection():
+    """Connexion à history.db du thread courant, avec la table des embeddings."""
+    conn = history_store.get_connection()
+    if getattr(_local, "conn", None) is not conn:
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def normalize_rows(vectors):
+    """Vecteurs (n, d) en float32 de norme 1 : le produit scalaire devient la similarité cosinus."""
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# --- Storage ---
+def _matrix_view(dim):
+    """Matrice des embeddings en memmap, rouverte quand le fichier a changé (ajout, ou remplacement après `reset`)."""
+    try:
+        stat = os.stat(VECTORS_PATH)
+        size, file_version = stat.st_size, (stat.st_ino, stat.st_mtime_ns)
+    except FileNotFoundError:
+        size, file_version = 0, None
+    rows = size // (dim * 4)
+    with _matrix_lock:
+        if (_matrix["array"] is None or _matrix["rows"] != rows or _matrix["dim"] != dim
+                or _matrix["file"] != file_version):
+            array = np.memmap(VECTORS_PATH, dtype=np.float32, mode='r', shape=(rows, dim)) if rows else np.empty((0, dim), np.float32)
+            _matrix.update(rows=rows, dim=dim, file=file_version, array=array)
+        return _matrix["array"]
+
+
+def _drop_matrix_view():
+    # Le fichier mappé peut être supprimé ou réécrit : la vue n'est plus jamais servie
+    with _matrix_lock:
+        _matrix.update(rows=0, dim=None, file=None, array=None)
+
+
+def _centroid_view():
+    """Centroïdes des listes inversées (None tant que l'index approché n'a pas été construit)."""
+    if not os.path.exists(CENTROIDS_PATH):
+        return None
+    mtime = os.stat(CENTROIDS_PATH).st_mtime_ns
+    with _matrix_lock:
+        if _centroids["mtime"] != mtime:
+            _centroids.update(mtime=mtime, array=np.load(CENTROIDS_PATH))
+        return _centroids["array"]
+
+
+def add_cases(username, entries, embeddings):
+    """Ajoute des analyses radiographiques et leurs embeddings (insertion incrémentale).
+
+    Lève ValueError si la dimension ne correspond pas à celle de l'index (modèle changé : voir `reset`).
+    Retourne les numéros de ligne attribués.
+    """
+    vectors = normalize_rows(embeddings)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    conn = get_connection()
+    with InterProcessLock(LOCK_PATH):
+        dim = _meta(conn, "radio_embedding_dim")
+        if dim is None:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('radio_embedding_dim', ?)", (str(vectors.shape[1]),))
+        elif int(dim) != vectors.shape[1]:
+            raise ValueError(f"Dimension d'embedding {vectors.shape[1]} différente de celle de l'index ({dim})")
+        centroids = _centroid_view()
+        list_ids = np.argmax(vectors @ centroids.T, axis=1).tolist() if centroids is not None else [None] * len(vectors)
+        # Le numéro de ligne découle de la taille du fichier : une ligne écrite sans métadonnées
+        # (arrêt entre les deux écritures) n'est jamais renvoyée et ne décale pas les suivantes
+        first_row = (os.path.getsize(VECTORS_PATH) if os.path.exists(VECTORS_PATH) else 0) // (vectors.shape[1] * 4)
+        with open(VECTORS_PATH, 'ab') as f:
+            f.write(vectors.tobytes())
+        rows = list(range(first_row, first_row + len(vectors)))
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO radio_embeddings (row, username, analysis_id, predicted_disease, probability, "
+                "timestamp, list_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(row, username, entry.get('analysis_id'), entry.get('predicted_disease'), entry.get('prediction_probability'),
+                  history_store.serialize_entry(entry)['timestamp'], list_id)
+                 for row, entry, list_id in zip(rows, entries, list_ids)]
+            )
+    return rows
+
+
+def forget(username):
+    """Retire les cas d'un utilisateur (les vecteurs restent dans le fichier mais ne sont plus jamais renvoyés)."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM radio_embeddings WHERE username = ?", (username,))
+    _drop_matrix_view()
+
+
+def reset():
+    """Vide l'index (changement de modèle)."""
+    conn = get_connection()
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with InterProcessLock(LOCK_PATH):
+        with conn:
+            conn.execute("DELETE FROM radio_embeddings")
+            conn.execute("DELETE FROM meta WHERE key IN ('radio_embedding_dim', 'radio_ivf_rows')")
+        for path in (VECTORS_PATH, CENTROIDS_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+        _drop_matrix_view()
+
+
+# --- Search ---
+def _candidate_rows(conn, username, list_ids=None):
+    clauses, params = [], []
+    if username is not None:
+        clauses.append("username = ?")
+        params.append(username)
+    if list_ids is not None:
+        clauses.append(f"list_id IN ({', '.join('?' * len(list_ids))})")
+        params.extend(list_ids)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    cursor = conn.execute(f"SELECT row FROM radio_embeddings{where}", params)
+    return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+
+def _count(conn, username):
+    if username is None:
+        return conn.execute("SELECT COUNT(*) FROM radio_embeddings").fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM radio_embeddings WHERE username = ?", (username,)).fetchone()[0]
+
+
+def _top_k(matrix, rows, query, k):
+    # Produits scalaires par blocs de lignes triées : lecture séquentielle du memmap
+    rows = np.sort(rows[rows < len(matrix)])
+    if not len(rows):
+        return rows, np.empty(0, np.float32)
+    scores = np.concatenate([matrix[rows[i:i + ASSIGN_CHUNK_ROWS]] @ query for i in range(0, len(rows), ASSIGN_CHUNK_ROWS)])
+    k = min(k, len(rows))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return rows[best], scores[best]
+
+
+def search(embedding, username=None, k=DEFAULT_TOP_K, exclude_analysis_id=None, exact=None):
+    """Les `k` analyses passées les plus proches d'un embedding (similarité cosinus décroissante).
+
+    `username` restreint aux cas d'un utilisateur (None : tous). `exact` force la recherche exacte
+    (True) ou approchée (False) ; par défaut, approchée seulement au-delà de EXACT_SEARCH_LIMIT candidats
+    et si l'index IVF existe. Retourne une liste de dictionnaires (métadonnées + 'similarity').
+    """
+    conn = get_connection()
+    dim = _meta(conn, "radio_embedding_dim")
+    if dim is None:
+        return []
+    query = normalize_rows([embedding])[0]
+    if len(query) != int(dim):
+        raise ValueError(f"Dimension d'embedding {len(query)} différente de celle de l'index ({dim})")
+    matrix = _matrix_view(int(dim))
+    centroids = _centroid_view()
+    # Un cas de plus que demandé si l'analyse courante est déjà indexée
+    wanted = k + (1 if exclude_analysis_id else 0)
+    rows = None
+    if exact is not True and centroids is not None:
+        if exact is False or _count(conn, username) > EXACT_SEARCH_LIMIT:
+            probes = np.argsort(-(centroids @ query))[:IVF_PROBES]
+            rows = _candidate_rows(conn, username, [int(p) for p in probes])
+            # Les lignes indexées avant la construction des centroïdes sont dans la liste NULL
+            rows = np.concatenate([rows, _unassigned_rows(conn, username)])
+    if rows is None:
+        rows = _candidate_rows(conn, username)
+    best_rows, scores = _top_k(matrix, rows, query, wanted)
+    if not len(best_rows):
+        return []
+    by_row = {
+        row['row']: row for row in conn.execute(
+            f"SELECT row, username, analysis_id, predicted_disease, probability, timestamp FROM radio_embeddings "
+            f"WHERE row IN ({', '.join('?' * len(best_rows))})", [int(r) for r in best_rows]
+        )
+    }
+    results = []
+    for row, score in zip(best_rows, scores):
+        meta = by_row.get(int(row))
+        if meta is None or (exclude_analysis_id and meta['analysis_id'] == exclude_analysis_id):
+            continue
+        results.append({
+            "analysis_id": meta['analysis_id'],
+            "username": meta['username'],
+            "predicted_disease": meta['predicted_disease'],
+            "prediction_probability": meta['probability'],
+            "timestamp": meta['timestamp'],
+            "similarity": float(score),
+        })
+    return results[:k]
+
+
+def _unassigned_rows(conn, username):
+    if username is None:
+        cursor = conn.execute("SELECT row FROM radio_embeddings WHERE list_id IS NULL")
+    else:
+        cursor = conn.execute("SELECT row FROM radio_embeddings WHERE username = ? AND list_id IS NULL", (username,))
+    return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+
+# --- Approximate index ---
+def build_ivf(lists=None, seed=0):
+    """Construit (ou reconstruit) les listes inversées : k-moyennes sphériques sur un échantillon,
+    puis affectation de chaque cas à son centroïde le plus proche. Retourne le nombre de listes."""
+    conn = get_connection()
+    dim = _meta(conn, "radio_embedding_dim")
+    if dim is None:
+        return 0
+    with InterProcessLock(LOCK_PATH):
+        matrix = _matrix_view(int(dim))
+        rows = _candidate_rows(conn, None)
+        rows = np.sort(rows[rows < len(matrix)])
+        if not len(rows):
+            return 0
+        lists = lists or int(np.clip(np.sqrt(len(rows)), 16, 1024))
+        lists = min(lists, len(rows))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, min(len(rows), IVF_TRAINING_SAMPLE), replace=False))])
+        centroids = sample[rng.choice(len(sample), lists, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            # Un centroïde sans cas est relancé sur un cas tiré au hasard
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        updates = []
+        for i in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+            chunk = rows[i:i + ASSIGN_CHUNK_ROWS]
+            updates.extend(zip(np.argmax(matrix[chunk] @ centroids.T, axis=1).tolist(), chunk.tolist()))
+        with conn:
+            conn.executemany("UPDATE radio_embeddings SET list_id = ? WHERE row = ?", updates)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('radio_ivf_rows', ?)", (str(len(rows)),))
+        tmp_path = f"{CENTROIDS_PATH}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, centroids.astype(np.float32))
+        os.replace(tmp_path, CENTROIDS_PATH)
+    return lists
+
+
+def stats():
+    """Taille de l'index et état de l'index approché."""
+    conn = get_connection()
+    dim = _meta(conn, "radio_embedding_dim")
+    centroids = _centroid_view()
+    return {
+        "cases": conn.execute("SELECT COUNT(*) FROM radio_embeddings").fetchone()[0],
+        "dim": int(dim) if dim else None,
+        "vector_file_mb": os.path.getsize(VECTORS_PATH) / (1024 * 1024) if os.path.exists(VECTORS_PATH) else 0.0,
+        "ivf_lists": len(centroids) if centroids is not None else 0,
+        "ivf_built_on": int(_meta(conn, "radio_ivf_rows") or 0),
+    }
+
+
+# --- Benchmark ---
+def benchmark(rows=200_000, dim=256, queries=50, k=DEFAULT_TOP_K):
+    """Index synthétique dans un dossier temporaire : latence exacte / approchée et rappel de l'approché."""
+    import tempfile
+    global INDEX_DIR, VECTORS_PATH, CENTROIDS_PATH, LOCK_PATH
+    saved = (history_store.DB_PATH, INDEX_DIR, VECTORS_PATH, CENTROIDS_PATH, LOCK_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        history_store.DB_PATH = os.path.join(tmp, "history.db")
+        INDEX_DIR = tmp
+        VECTORS_PATH = os.path.join(tmp, "radiographs.f32")
+        CENTROIDS_PATH = os.path.join(tmp, "radiographs.centroids.npy")
+        LOCK_PATH = os.path.join(tmp, "radiographs.lock")
+        history_store._local.__dict__.clear()
+        try:
+            rng = np.random.default_rng(0)
+            # Données groupées, comme des radiographies d'une même affection
+            centers = normalize_rows(rng.standard_normal((64, dim)))
+            start = time.perf_counter()
+            for i in range(0, rows, 10_000):
+                n = min(10_000, rows - i)
+                vectors = centers[rng.integers(0, 64, n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+                add_cases("benchmark", [{"analysis_id": str(i + j)} for j in range(n)], vectors)
+            insert_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            build_ivf()
+            build_seconds = time.perf_counter() - start
+            query_vectors = centers[rng.integers(0, 64, queries)] + 0.3 * rng.standard_normal((queries, dim)) / np.sqrt(dim)
+            timings = {True: 0.0, False: 0.0}
+            recall = 0
+            for query in query_vectors:
+                found = {}
+                for exact in (True, False):
+                    start = time.perf_counter()
+                    found[exact] = {r["analysis_id"] for r in search(query, k=k, exact=exact)}
+                    timings[exact] += time.perf_counter() - start
+                recall += len(found[True] & found[False])
+            return {
+                "rows": rows, "dim": dim,
+                "insert_ms_per_case": insert_seconds / rows * 1000,
+                "ivf_build_seconds": build_seconds,
+                "exact_ms": timings[True] / queries * 1000,
+                "approximate_ms": timings[False] / queries * 1000,
+                "recall_at_k": recall / (queries * k),
+            }
+        finally:
+            history_store.get_connection().close()
+            history_store._local.__dict__.clear()
+            _local.__dict__.clear()
+            _matrix.update(rows=0, dim=None, array=None)
+            _centroids.update(mtime=None, array=None)
+            history_store.DB_PATH, INDEX_DIR, VECTORS_PATH, CENTROIDS_PATH, LOCK_PATH = saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index des cas radiographiques similaires.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Taille et état de l'index")
+    ivf_parser = subparsers.add_parser("build-ivf", help="Construire l'index approché (listes inversées)")
+    ivf_parser.add_argument("--lists", type=int)
+    subparsers.add_parser("reset", help="Vider l'index (après un changement de modèle)")
+    benchmark_parser = subparsers.add_parser("benchmark", help="Mesurer sur un index synthétique")
+    benchmark_parser.add_argument("--rows", type=int, default=200_000)
+    benchmark_parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        for key, value in stats().items():
+            print(f"{key}: {value}")
+    elif args.command == "build-ivf":
+        print(f"{build_ivf(args.lists)} liste(s) construite(s)")
+    elif args.command == "reset":
+        reset()
+        print("Index vidé.")
+    else:
+        for key, value in benchmark(args.rows, args.dim).items():
+            print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
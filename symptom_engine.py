@@ -0,0 +1,348 @@
+import argparse
+import functools
+import random
+import re
+import sys
+import time
+from collections import deque
+
+from history_search import normalize
+from locales import TEXTS
+
+# Analyse de symptômes en texte libre (français / anglais).
+# Le lexique est compilé une fois en automate d'Aho-Corasick sur les mots normalisés (minuscules,
+# sans accents, pluriel en -s retiré) : un seul passage sur le texte, quelle que soit sa longueur
+# et le nombre d'expressions. Un terme terminé par '*' reconnaît tout mot qui commence par ce radical
+# ('essouffl*' : essoufflé, essoufflement) ; il ne peut compter qu'un seul mot.
+# Les concepts reconnus sont pondérés par gravité pour choisir la recommandation.
+# Usage : python symptom_engine.py analyze "J'ai une douleur thoracique"   (ou --file, une description par ligne)
+#         python symptom_engine.py benchmark --words 200000
+
+# --- Constants ---
+SEVERITY_MILD, SEVERITY_MODERATE, SEVERITY_SEVERE = 1, 2, 3
+URGENT_SCORE = 6  # plusieurs symptômes modérés cumulés valent une urgence
+CONSULT_SCORE = 2
+LEVEL_URGENT, LEVEL_CONSULT, LEVEL_MILD, LEVEL_NONE = "urgent", "consult", "mild", "none"
+STEM_CACHE_SIZE = 100_000
+
+# concept -> (libellé fr, libellé en, gravité, termes)
+SYMPTOM_LEXICON = {
+    "chest_pain": ("Douleur thoracique", "Chest pain", SEVERITY_SEVERE, [
+        "douleur thoracique", "douleur a la poitrine", "douleur dans la poitrine", "mal a la poitrine",
+        "oppression thoracique", "serrement a la poitrine", "poitrine serree",
+        "chest pain", "pain in the chest", "pain in my chest", "chest tightness", "tight chest",
+    ]),
+    "breathing_difficulty": ("Difficultés respiratoires", "Breathing difficulty", SEVERITY_SEVERE, [
+        "difficulte a respirer", "difficulte respiratoire", "essouffl*", "dyspne*", "manque d air",
+        "souffle court", "etouff*",
+        "shortness of breath", "short of breath", "difficulty breathing", "trouble breathing",
+        "breathless*", "can t breathe", "cannot breathe",
+    ]),
+    "loss_of_consciousness": ("Perte de connaissance", "Loss of consciousness", SEVERITY_SEVERE, [
+        "perte de connaissance", "evanoui*", "syncop*", "malaise avec chute",
+        "fainted", "fainting", "passed out", "loss of consciousness", "unconscious",
+    ]),
+    "stroke_signs": ("Signes neurologiques (AVC)", "Neurological signs (stroke)", SEVERITY_SEVERE, [
+        "paralysie", "paralyse", "difficulte a parler", "trouble de la parole", "bouche de travers",
+        "engourdissement d un cote", "perte de la vue",
+        "paralysis", "paralyzed", "slurred speech", "face drooping", "facial droop",
+        "numbness on one side", "loss of vision",
+    ]),
+    "bleeding": ("Saignement important", "Severe bleeding", SEVERITY_SEVERE, [
+        "crache du sang", "cracher du sang", "vomi du sang", "sang dans le selle", "hemorragi*",
+        "saignement abondant",
+        "coughing blood", "coughing up blood", "vomiting blood", "blood in stool", "blood in my stool",
+        "hemorrhag*", "haemorrhag*", "heavy bleeding",
+    ]),
+    "seizure": ("Convulsions", "Seizure", SEVERITY_SEVERE, [
+        "convulsion", "crise d epilepsie", "seizure", "convulsing",
+    ]),
+    "confusion": ("Confusion", "Confusion", SEVERITY_MODERATE, [
+        "confusion", "desorient*", "confused", "disoriented",
+    ]),
+    "fever": ("Fièvre", "Fever", SEVERITY_MODERATE, [
+        "fievre", "febri*", "temperature elevee", "fever", "feverish", "high temperature",
+    ]),
+    "cough": ("Toux", "Cough", SEVERITY_MODERATE, [
+        "toux", "touss*", "cough*",
+    ]),
+    "palpitations": ("Palpitations", "Palpitations", SEVERITY_MODERATE, [
+        "palpitation", "coeur qui bat vite", "tachycardi*", "battement irregulier", "coeur irregulier",
+        "racing heart", "heart racing", "irregular heartbeat", "heart pounding",
+    ]),
+    "vomiting": ("Vomissements", "Vomiting", SEVERITY_MODERATE, [
+        "vomi*", "vomit*", "throwing up",
+    ]),
+    "abdominal_pain": ("Douleur abdominale", "Abdominal pain", SEVERITY_MODERATE, [
+        "douleur abdominale", "mal au ventre", "douleur au ventre", "crampe abdominale",
+        "abdominal pain", "stomach pain", "stomach ache", "stomachache", "belly pain",
+    ]),
+    "dizziness": ("Vertiges", "Dizziness", SEVERITY_MODERATE, [
+        "vertige", "etourdi*", "tete qui tourne", "dizz*", "vertigo", "lightheaded", "light headed",
+    ]),
+    "leg_swelling": ("Jambes gonflées", "Leg swelling", SEVERITY_MODERATE, [
+        "jambe enflee", "jambe gonflee", "cheville gonflee", "oedeme",
+        "swollen leg", "leg swelling", "swollen ankle", "edema", "oedema",
+    ]),
+    "headache": ("Maux de tête", "Headache", SEVERITY_MILD, [
+        "mal de tete", "maux de tete", "cephalee", "migraine", "headache", "head ache",
+    ]),
+    "nausea": ("Nausées", "Nausea", SEVERITY_MILD, [
+        "nausee", "envie de vomir", "nausea", "nauseou*",
+    ]),
+    "fatigue": ("Fatigue", "Fatigue", SEVERITY_MILD, [
+        "fatigu*", "epuise*", "tired", "tiredness", "exhaust*",
+    ]),
+    "sore_throat": ("Mal de gorge", "Sore throat", SEVERITY_MILD, [
+        "mal de gorge", "maux de gorge", "gorge irritee", "sore throat",
+    ]),
+    "runny_nose": ("Nez qui coule", "Runny nose", SEVERITY_MILD, [
+        "nez qui coule", "nez bouche", "rhume", "congestion nasale", "runny nose", "stuffy nose",
+        "nasal congestion",
+    ]),
+    "muscle_pain": ("Douleurs musculaires", "Muscle pain", SEVERITY_MILD, [
+        "courbature", "douleur musculaire", "muscle pain", "muscle ache", "body ache",
+    ]),
+    "diarrhea": ("Diarrhée", "Diarrhea", SEVERITY_MILD, [
+        "diarrhee", "diarrh*",
+    ]),
+    "rash": ("Éruption cutanée", "Rash", SEVERITY_MILD, [
+        "eruption cutanee", "plaque rouge", "demangeaison", "rash", "hive", "itching",
+    ]),
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    # Pluriel régulier : 'douleurs' -> 'douleur', 'headaches' -> 'headache' ('stress', 'tous' sont conservés)
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Mots normalisés (minuscules, sans accents, pluriel retiré) d'un texte."""
+    return [_stem(word) for word in _WORD_RE.findall(normalize(text))]
+
+
+class SymptomMatcher:
+    """Automate d'Aho-Corasick sur les mots, plus une table des radicaux (termes en '*')."""
+
+    def __init__(self, lexicon=SYMPTOM_LEXICON):
+        self.lexicon = lexicon
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # concepts reconnus en arrivant sur ce nœud (suffixes compris)
+        self._stems = {}  # radical -> concepts
+        self._stem_cache = {}
+        for concept, (_, _, _, terms) in lexicon.items():
+            for term in terms:
+                self._add_term(concept, term)
+        self._build_failure_links()
+
+    def _add_term(self, concept, term):
+        if term.endswith("*"):
+            words = _WORD_RE.findall(normalize(term[:-1]))
+            if len(words) != 1:
+                raise ValueError(f"Un radical '*' ne peut compter qu'un seul mot : {term!r}")
+            self._stems.setdefault(words[0], []).append(concept)
+            return
+        node = 0
+        for word in tokenize(term):
+            next_node = self._goto[node].get(word)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][word] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(concept)
+
+    def _build_failure_links(self):
+        # Parcours en largeur : le lien d'échec d'un nœud pointe vers un nœud moins profond, déjà traité
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0) if node else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _stem_concepts(self, word):
+        concepts = self._stem_cache.get(word)
+        if concepts is None:
+            concepts = [c for stem, stem_concepts in self._stems.items() if word.startswith(stem) for c in stem_concepts]
+            if len(self._stem_cache) >= STEM_CACHE_SIZE:
+                self._stem_cache.clear()
+            self._stem_cache[word] = concepts
+        return concepts
+
+    def match_words(self, words):
+        """Nombre d'occurrences de chaque concept dans une suite de mots normalisés (un seul passage)."""
+        counts = {}
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for word in words:
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            for concept in output[node]:
+                counts[concept] = counts.get(concept, 0) + 1
+            for concept in self._stem_concepts(word):
+                counts[concept] = counts.get(concept, 0) + 1
+        return counts
+
+    def match(self, text):
+        return self.match_words(tokenize(text))
+
+
+@functools.lru_cache(maxsize=1)
+def get_matcher():
+    """Automate compilé une seule fois par processus."""
+    return SymptomMatcher()
+
+
+def naive_match(text, lexicon=SYMPTOM_LEXICON):
+    """Référence pour le banc d'essai : une recherche de sous-chaîne par terme du lexique."""
+    padded = " " + " ".join(tokenize(text)) + " "
+    counts = {}
+    for concept, (_, _, _, terms) in lexicon.items():
+        for term in terms:
+            if term.endswith("*"):
+                needle = " " + _WORD_RE.findall(normalize(term[:-1]))[0]
+            else:
+                needle = " " + " ".join(tokenize(term)) + " "
+            start = padded.find(needle)
+            while start != -1:
+                counts[concept] = counts.get(concept, 0) + 1
+                # Les mots se chevauchent : on repart sur l'espace final de l'occurrence
+                start = padded.find(needle, start + len(needle) - 1 if needle.endswith(" ") else start + 1)
+    return counts
+
+
+# --- Analysis ---
+def _recommendation(level, keywords, texts):
+    if level == LEVEL_URGENT:
+        return texts["symptoms_urgent"].format(keywords=keywords)
+    if level == LEVEL_CONSULT:
+        return texts["symptoms_keywords_found"].format(keywords=keywords)
+    if level == LEVEL_MILD:
+        return texts["symptoms_mild"].format(keywords=keywords)
+    return texts["symptoms_no_keywords"]
+
+
+def analyze_counts(counts, lang='fr'):
+    """Concepts reconnus -> {'found_keywords', 'recommendation', 'severity_score', 'level'}."""
+    texts = TEXTS.get(lang, TEXTS['fr'])
+    label_index = 1 if lang == 'en' else 0
+    concepts = sorted(counts, key=lambda c: (-SYMPTOM_LEXICON[c][2], SYMPTOM_LEXICON[c][label_index]))
+    score = sum(SYMPTOM_LEXICON[c][2] for c in concepts)
+    max_severity = max((SYMPTOM_LEXICON[c][2] for c in concepts), default=0)
+    if max_severity == SEVERITY_SEVERE or score >= URGENT_SCORE:
+        level = LEVEL_URGENT
+    elif score >= CONSULT_SCORE:
+        level = LEVEL_CONSULT
+    elif score:
+        level = LEVEL_MILD
+    else:
+        level = LEVEL_NONE
+    keywords = [SYMPTOM_LEXICON[c][label_index] for c in concepts]
+    return {
+        "found_keywords": keywords,
+        "recommendation": _recommendation(level, ", ".join(keywords), texts),
+        "severity_score": score,
+        "level": level,
+    }
+
+
+def analyze(text, lang='fr'):
+    """Analyse une description de symptômes (structure `analysis` des entrées d'historique)."""
+    return analyze_counts(get_matcher().match(text), lang)
+
+
+def analyze_batch(texts, lang='fr'):
+    """Analyse un lot de descriptions avec le même automate."""
+    matcher = get_matcher()
+    return [analyze_counts(matcher.match(text), lang) for text in texts]
+
+
+# --- Benchmark ---
+def _synthetic_text(word_count, seed=0):
+    rng = random.Random(seed)
+    filler = ("je me sens pas tres bien depuis hier soir avec parfois et aussi un peu le matin "
+              "i have been feeling unwell since yesterday and sometimes in the morning").split()
+    phrases = [term.rstrip("*") for _, _, _, terms in SYMPTOM_LEXICON.values() for term in terms]
+    words = []
+    while len(words) < word_count:
+        words.extend(rng.sample(filler, 8))
+        if rng.random() < 0.1:
+            words.extend(rng.choice(phrases).split())
+    return " ".join(words[:word_count])
+
+
+def benchmark(word_count=200_000, lexicon_copies=(1, 10), repeat=3):
+    """Compare l'automate et la recherche naïve sur un texte synthétique.
+
+    Le lexique peut être dupliqué (`lexicon_copies`) pour montrer l'effet de sa taille :
+    le coût naïf croît avec le nombre de termes, celui de l'automate reste celui du passage sur le texte.
+    """
+    text = _synthetic_text(word_count)
+    results = []
+    for copies in lexicon_copies:
+        lexicon = {f"{concept}#{i}": value for i in range(copies) for concept, value in SYMPTOM_LEXICON.items()}
+        start = time.perf_counter()
+        matcher = SymptomMatcher(lexicon)
+        build_seconds = time.perf_counter() - start
+        automaton = naive = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            automaton_counts = matcher.match(text)
+            automaton = min(automaton, time.perf_counter() - start)
+            start = time.perf_counter()
+            naive_counts = naive_match(text, lexicon)
+            naive = min(naive, time.perf_counter() - start)
+        results.append({
+            "terms": sum(len(terms) for _, _, _, terms in lexicon.values()),
+            "words": word_count,
+            "build_seconds": build_seconds,
+            "automaton_seconds": automaton,
+            "naive_seconds": naive,
+            "same_matches": automaton_counts == naive_counts,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse de symptômes (automate d'Aho-Corasick).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    analyze_parser = subparsers.add_parser("analyze", help="Analyser une description ou un fichier (une par ligne)")
+    analyze_parser.add_argument("text", nargs="?")
+    analyze_parser.add_argument("--file")
+    analyze_parser.add_argument("--lang", default="fr", choices=["fr", "en"])
+    benchmark_parser = subparsers.add_parser("benchmark", help="Comparer avec la recherche naïve")
+    benchmark_parser.add_argument("--words", type=int, default=200_000)
+    benchmark_parser.add_argument("--lexicon-copies", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args(argv)
+
+    if args.command == "analyze":
+        if args.file:
+            with open(args.file, encoding="utf-8") as f:
+                texts = [line.strip() for line in f if line.strip()]
+        else:
+            texts = [args.text if args.text is not None else sys.stdin.read()]
+        for text, result in zip(texts, analyze_batch(texts, args.lang)):
+            print(f"[{result['level']}] {', '.join(result['found_keywords']) or '-'} :: {text[:80]}")
+    else:
+        print(f"{'termes':>8}{'mots':>10}{'compil. ms':>12}{'automate ms':>13}{'naïf ms':>10}{'identique':>11}")
+        for row in benchmark(args.words, tuple(args.lexicon_copies)):
+            print(f"{row['terms']:>8}{row['words']:>10}{row['build_seconds'] * 1000:>12.1f}"
+                  f"{row['automaton_seconds'] * 1000:>13.1f}{row['naive_seconds'] * 1000:>10.1f}{str(row['same_matches']):>11}")
+
+
+if __name__ == "__main__":
+    main()
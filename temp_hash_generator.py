@@ -1,15 +1,14 @@
-import streamlit_authenticator as stauth
+from credential_store import hash_password
 
-# The Hasher class was moved in later versions. This handles both cases.
-try:
-    from streamlit_authenticator.hasher import Hasher
-except ImportError:
-    # For older versions
-    Hasher = stauth.Hasher
+# Les comptes sont désormais gérés dans credentials.db :
+#   python credential_store.py add-user <username> --email <email> --name "<nom>"
+#   python credential_store.py set-password <username>
+# Ce script reste utilisable pour hacher des mots de passe à coller dans config.yaml :
+# les utilisateurs de config.yaml absents de la base y sont importés au démarrage de l'application.
 
 passwords_to_hash = ['admin123', 'user456']
-hashed_passwords = Hasher(passwords_to_hash).generate()
+hashed_passwords = [hash_password(password) for password in passwords_to_hash]
 
 print("Please copy these hashed passwords into your config.yaml file:")
 for i, hashed_pw in enumerate(hashed_passwords):
-    print(f"  User {i+1}: {hashed_pw}")
\ No newline at end of file
+    print(f"  User {i+1}: {hashed_pw}")